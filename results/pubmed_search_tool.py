@@ -2,332 +2,4129 @@
 PubMed Search Tool for OpenWebUI
 
 This tool enables LLM-driven literature searches on PubMed with advanced filtering.
-It uses NCBI E-utilities API (esearch + efetch) to search and retrieve article data
-including abstracts.
+It uses NCBI E-utilities API (esearch + efetch/esummary/elink) to search and retrieve
+article data including abstracts, and adds citation expansion, PMC full text,
+saved searches, resumable exports, facet counts and local semantic search.
 
 Author: ZuiLuo1116 using K-Dense Framework
-Version: 1.0.0
+Version: 2.0.0
 """
 
-import requests
 import xml.etree.ElementTree as ET
+import contextvars
+import gzip
+import hashlib
+import importlib
+import importlib.util
+import itertools
+import json
+import math
+import mmap
+import os
+import re
+import secrets
+import shutil
+import sqlite3
+import tempfile
+import threading
 import time
-from typing import Optional, List, Dict, Any
-from datetime import datetime
+import zlib
+from array import array
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List, Dict, Any, Iterable, Tuple, Union, Literal
+from datetime import date, datetime, timedelta
 from pydantic import BaseModel, Field
 
 
+class _LazyModule:
+    """
+    Module proxy that defers the actual import until first attribute access.
+
+    Keeps loading this file (and constructing Tools) fast in cold OpenWebUI
+    workers; heavy dependencies are only paid for by the code paths that use
+    them, or up front by Tools._warm_up.
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr: str):
+        return getattr(self._load(), attr)
+
+
+def _lazy_import(name: str, package: Optional[str] = None) -> Optional[_LazyModule]:
+    """Lazy proxy for a module, or None if it is not installed (checked without importing)."""
+    if importlib.util.find_spec(package or name) is None:
+        return None
+    return _LazyModule(name)
+
+
+requests = _lazy_import("requests")
+np = _lazy_import("numpy")  # Optional: vectorized near-duplicate signatures and ranking
+sparse = _lazy_import("scipy.sparse", package="scipy")  # Optional: sparse-matrix BM25 re-ranking
+zstandard = _lazy_import("zstandard")  # Optional: faster compression for the response cache
+sentence_transformers = _lazy_import("sentence_transformers")  # Optional: local embedding model
+redis = _lazy_import("redis")  # Optional: Redis-compatible coordination backend
+fcntl = _lazy_import("fcntl")  # Unix only: cross-process locking of the semantic index files
+
+
+class _ResponseCache:
+    """
+    Byte-capped LRU cache of compressed raw E-utilities responses.
+
+    Bodies are stored compressed (zstd when the optional zstandard package is
+    installed, gzip otherwise) together with their HTTP validators, so stale
+    entries can be revalidated with a conditional request instead of being
+    downloaded again.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(url: str, params: Dict[str, Any]) -> str:
+        """Build a cache key from the URL and normalized request parameters."""
+        normalized = sorted(
+            (str(name), str(value).strip())
+            for name, value in params.items()
+            # Credentials don't change the response, so they must not split entries
+            if name not in ("api_key", "email") and value is not None
+        )
+        raw = json.dumps([url, normalized], separators=(",", ":"))
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the cache entry for a key (refreshing its LRU position), or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    @staticmethod
+    def compress(body: bytes, headers: Dict[str, str]) -> Dict[str, Any]:
+        """Build a cache entry (compressed body plus HTTP validators) for a response."""
+        if zstandard is not None:
+            codec, data = "zstd", zstandard.ZstdCompressor(level=3).compress(body)
+        else:
+            codec, data = "gzip", gzip.compress(body, compresslevel=6, mtime=0)
+        return _ResponseCache.make_entry(codec, data, headers)
+
+    @staticmethod
+    def make_entry(codec: str, data: bytes, headers: Dict[str, str]) -> Dict[str, Any]:
+        """Cache entry for already compressed data."""
+        return {
+            "data": data,
+            "codec": codec,
+            "etag": headers.get("ETag", ""),
+            "last_modified": headers.get("Last-Modified", ""),
+            "stored": time.time(),
+        }
+
+    @staticmethod
+    def compressor() -> Tuple[str, Any]:
+        """Incremental compressor (codec name, object with compress/flush) for streamed bodies."""
+        if zstandard is not None:
+            return "zstd", zstandard.ZstdCompressor(level=3).compressobj()
+        return "gzip", zlib.compressobj(6, zlib.DEFLATED, 31)
+
+    def put(self, key: str, body: bytes, headers: Dict[str, str]) -> Dict[str, Any]:
+        """Compress and store a response body; returns the new entry."""
+        entry = self.compress(body, headers)
+        self.put_entry(key, entry)
+        return entry
+
+    def put_entry(self, key: str, entry: Dict[str, Any]):
+        """Store a ready-made entry, evicting old entries over the byte cap."""
+        data = entry["data"]
+        if len(data) > self.max_bytes:
+            return
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.total_bytes -= len(previous["data"])
+            self._entries[key] = entry
+            self.total_bytes += len(data)
+            self._evict()
+
+    def _evict(self):
+        """Drop least recently used entries until the cache fits its byte cap (lock held)."""
+        while self.total_bytes > self.max_bytes and self._entries:
+            _, evicted = self._entries.popitem(last=False)
+            self.total_bytes -= len(evicted["data"])
+            self.evictions += 1
+
+    def resize(self, max_bytes: int):
+        """Change the byte cap, evicting entries if the cache no longer fits."""
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def compact(self, ttl: float) -> int:
+        """
+        Drop stale entries that cannot be revalidated.
+
+        Entries older than ttl without an ETag or Last-Modified validator
+        would be downloaded again in full on their next use anyway.
+
+        Returns:
+            Number of entries removed
+        """
+        cutoff = time.time() - ttl
+        with self._lock:
+            stale = [
+                key for key, entry in self._entries.items()
+                if entry["stored"] < cutoff and not entry["etag"] and not entry["last_modified"]
+            ]
+            for key in stale:
+                self.total_bytes -= len(self._entries.pop(key)["data"])
+        return len(stale)
+
+    def clear(self) -> int:
+        """Remove all entries; returns how many there were."""
+        with self._lock:
+            count = len(self._entries)
+            self._entries.clear()
+            self.total_bytes = 0
+        return count
+
+    def stats(self) -> Dict[str, Any]:
+        """Entry count, compressed bytes, hit ratio and age of the oldest entry."""
+        with self._lock:
+            oldest = min((entry["stored"] for entry in self._entries.values()), default=None)
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "revalidations": self.revalidations,
+                "evictions": self.evictions,
+                "oldest_age": time.time() - oldest if oldest is not None else None,
+            }
+
+    def count(self, counter: str):
+        """Increment a statistics counter ("hits", "misses" or "revalidations")."""
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def touch(self, key: str):
+        """Mark an entry as fresh after a successful revalidation (304)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry["stored"] = time.time()
+
+    @staticmethod
+    def decompress(entry: Dict[str, Any]) -> bytes:
+        """Return the raw response body stored in an entry."""
+        return b"".join(_ResponseCache.iter_decompress(entry))
+
+    @staticmethod
+    def iter_decompress(entry: Dict[str, Any], chunk_size: int = 65536):
+        """Yield the raw response body of an entry in chunks, without building it in memory."""
+        data = memoryview(entry["data"])
+        if entry["codec"] == "zstd":
+            # Streamed frames carry no content size, so always decompress incrementally
+            yield from zstandard.ZstdDecompressor().read_to_iter(data, read_size=chunk_size, write_size=chunk_size)
+            return
+        decompressor = zlib.decompressobj(31)
+        while data:
+            chunk = decompressor.decompress(data, chunk_size)
+            data = decompressor.unconsumed_tail
+            if chunk:
+                yield chunk
+        tail = decompressor.flush()
+        if tail:
+            yield tail
+
+    @staticmethod
+    def pack(entry: Dict[str, Any]) -> bytes:
+        """Serialize an entry for a shared coordination backend."""
+        header = {name: entry[name] for name in ("codec", "etag", "last_modified", "stored")}
+        return json.dumps(header).encode("utf-8") + b"\n" + entry["data"]
+
+    @staticmethod
+    def unpack(blob: bytes) -> Dict[str, Any]:
+        """Inverse of pack."""
+        header, _, data = blob.partition(b"\n")
+        entry = json.loads(header)
+        entry["data"] = data
+        return entry
+
+
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from in is it of on or that the to was were with".split()
+)
+
+
+def _bm25_scores(
+    query_terms: List[str],
+    documents: List[str],
+    k1: float = 1.2,
+    b: float = 0.75
+) -> List[float]:
+    """
+    Okapi BM25 scores of documents against a bag of query terms.
+
+    With NumPy and SciPy the documents are tokenized once into a sparse
+    document-term matrix and all scores are computed with array operations;
+    otherwise a pure-Python implementation is used.
+
+    Args:
+        query_terms: Normalized query words (duplicates ignored)
+        documents: Document texts
+        k1: Term-frequency saturation
+        b: Length normalization
+
+    Returns:
+        One score per document, in document order
+    """
+    tokenized = [re.findall(r"[a-z0-9]+", document.lower()) for document in documents]
+    query_terms = list(dict.fromkeys(query_terms))
+    n_docs = len(tokenized)
+    if not n_docs or not query_terms:
+        return [0.0] * n_docs
+
+    if np is not None and sparse is not None:
+        vocabulary: Dict[str, int] = {}
+        indices = np.fromiter(
+            (vocabulary.setdefault(token, len(vocabulary)) for tokens in tokenized for token in tokens),
+            dtype=np.int64
+        )
+        lengths = np.array([len(tokens) for tokens in tokenized], dtype=np.float64)
+        indptr = np.concatenate(([0], np.cumsum(lengths).astype(np.int64)))
+        tf = sparse.csr_matrix(
+            (np.ones(len(indices), dtype=np.float64), indices, indptr),
+            shape=(n_docs, max(len(vocabulary), 1))
+        )
+        tf.sum_duplicates()
+
+        columns = [vocabulary[term] for term in query_terms if term in vocabulary]
+        if not columns:
+            return [0.0] * n_docs
+        query_tf = tf[:, columns].toarray()
+        df = np.count_nonzero(query_tf, axis=0)
+        idf = np.log1p((n_docs - df + 0.5) / (df + 0.5))
+        norm = k1 * (1 - b + b * lengths / max(lengths.mean(), 1.0))
+        scores = (query_tf * (k1 + 1) / (query_tf + norm[:, None])) @ idf
+        return scores.tolist()
+
+    counts = []
+    df_counts = {term: 0 for term in query_terms}
+    for tokens in tokenized:
+        doc_counts: Dict[str, int] = {}
+        for token in tokens:
+            if token in df_counts:
+                doc_counts[token] = doc_counts.get(token, 0) + 1
+        for term in doc_counts:
+            df_counts[term] += 1
+        counts.append(doc_counts)
+
+    avg_length = max(sum(len(tokens) for tokens in tokenized) / n_docs, 1.0)
+    idf = {term: math.log1p((n_docs - df + 0.5) / (df + 0.5)) for term, df in df_counts.items()}
+    scores = []
+    for tokens, doc_counts in zip(tokenized, counts):
+        norm = k1 * (1 - b + b * len(tokens) / avg_length)
+        scores.append(sum(
+            idf[term] * count * (k1 + 1) / (count + norm)
+            for term, count in doc_counts.items()
+        ))
+    return scores
+
+
+class _TextEmbedder:
+    """
+    Turns article text into L2-normalized float32 vectors.
+
+    Uses a local sentence-transformers model when one is configured and the
+    package is installed; otherwise falls back to signed feature hashing of
+    word unigrams and bigrams, which needs only NumPy.
+    """
+
+    def __init__(self, model_name: str = "", dim: int = 256):
+        self.model = None
+        if model_name and sentence_transformers is not None:
+            self.model = sentence_transformers.SentenceTransformer(model_name, device="cpu")
+            self.dim = self.model.get_sentence_embedding_dimension()
+            self.name = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+        else:
+            self.dim = dim
+            self.name = f"hashed{dim}"
+
+    def embed(self, texts: List[str]) -> "np.ndarray":
+        """Embed texts into an (n, dim) float32 array of unit vectors."""
+        if self.model is not None:
+            vectors = self.model.encode(texts, normalize_embeddings=True, convert_to_numpy=True)
+            return np.asarray(vectors, dtype=np.float32)
+
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            words = [word for word in re.findall(r"[a-z0-9]+", text.lower()) if word not in _STOPWORDS]
+            features: Dict[int, int] = {}
+            for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+                h = _word_hash(feature)
+                features[h] = features.get(h, 0) + 1
+            if not features:
+                continue
+            hashes = np.fromiter(features.keys(), dtype=np.uint64, count=len(features))
+            counts = np.fromiter(features.values(), dtype=np.float32, count=len(features))
+            signs = np.where((hashes >> np.uint64(63)) == 0, 1.0, -1.0).astype(np.float32)
+            np.add.at(vectors[row], (hashes % np.uint64(self.dim)).astype(np.int64), signs * (1 + np.log(counts)))
+
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+
+class _VectorIndex:
+    """
+    Append-only, memory-mapped vector store with a random-hyperplane LSH index.
+
+    Vectors live in a raw float32 file (one row per PMID, mapped read-only for
+    queries) next to a PMID list and a JSONL file of display metadata. Each of
+    the LSH tables hashes a vector to a bucket by the signs of its projections
+    on fixed random hyperplanes; queries probe their bucket and all buckets one
+    bit away, then rank the candidates by exact cosine similarity.
+
+    Worker processes share the files: appends hold an exclusive flock and
+    first pick up rows other processes appended, so row numbers always
+    follow the files on disk rather than this process's view of them.
+    """
+
+    def __init__(self, directory: str, dim: int, tables: int = 16, bits: int = 10):
+        self.directory = directory
+        self.dim = dim
+        self.tables = tables
+        self.bits = bits
+        self._vectors_path = os.path.join(directory, "vectors.f32")
+        self._ids_path = os.path.join(directory, "pmids.txt")
+        self._meta_path = os.path.join(directory, "records.jsonl")
+        self._lock_path = os.path.join(directory, "append.lock")
+        self._ids_offset = 0  # Bytes of pmids.txt / records.jsonl already read
+        self._meta_offset = 0
+        self._lock = threading.Lock()
+        self._planes = np.random.default_rng(20240101).standard_normal((tables * bits, dim)).astype(np.float32)
+        self._weights = (1 << np.arange(bits)).astype(np.int64)
+        self._buckets: List[Dict[int, List[int]]] = [{} for _ in range(tables)]
+        self._rows: Dict[str, int] = {}
+        self._pmids: List[str] = []
+        self._metadata: Dict[str, Dict[str, Any]] = {}
+        self._matrix = None
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._pmids)
+
+    def __contains__(self, pmid: str) -> bool:
+        return pmid in self._rows
+
+    def _load(self):
+        """Rebuild the in-memory LSH tables from the files on disk."""
+        self._sync()
+
+    @staticmethod
+    def _read_lines(path: str, offset: int) -> List[bytes]:
+        """Complete lines (with their newline) of a file from a byte offset on."""
+        if not os.path.exists(path):
+            return []
+        with open(path, "rb") as handle:
+            handle.seek(offset)
+            data = handle.read()
+        return data[:data.rfind(b"\n") + 1].splitlines(keepends=True)
+
+    def _sync(self):
+        """
+        Index the rows appended to the files since they were last read.
+
+        Only rows present in both the vector file and the PMID list count; a
+        partially written tail is ignored here and cut off by the next add.
+        """
+        stored_rows = os.path.getsize(self._vectors_path) // (4 * self.dim) if os.path.exists(self._vectors_path) else 0
+        lines = self._read_lines(self._ids_path, self._ids_offset)[:max(0, stored_rows - len(self._pmids))]
+        first_row = len(self._pmids)
+        for line in lines:
+            self._ids_offset += len(line)
+            pmid = line.decode("utf-8").strip()
+            self._rows.setdefault(pmid, len(self._pmids))
+            self._pmids.append(pmid)
+        if lines:
+            matrix = self._mapped()
+            for start in range(first_row, len(self._pmids), 65536):
+                self._insert_codes(self._codes(matrix[start:start + 65536]), start)
+
+        for line in self._read_lines(self._meta_path, self._meta_offset):
+            self._meta_offset += len(line)
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            self._metadata[record.get("pmid", "")] = record
+
+    @contextmanager
+    def _file_lock(self):
+        """Exclusive lock on the index files across processes (thread lock only without fcntl)."""
+        with open(self._lock_path, "a") as handle:
+            if fcntl is not None:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+
+    def _mapped(self) -> "np.ndarray":
+        """Read-only memory map of all stored vectors."""
+        if self._matrix is None or len(self._matrix) != len(self._pmids):
+            if not self._pmids:
+                return np.zeros((0, self.dim), dtype=np.float32)
+            self._matrix = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(len(self._pmids), self.dim))
+        return self._matrix
+
+    def _codes(self, vectors: "np.ndarray") -> "np.ndarray":
+        """LSH bucket code of each vector in each table: shape (n, tables)."""
+        signs = (np.asarray(vectors, dtype=np.float32) @ self._planes.T) > 0
+        return signs.reshape(len(vectors), self.tables, self.bits) @ self._weights
+
+    def _insert_codes(self, codes: "np.ndarray", first_row: int):
+        for offset, row_codes in enumerate(codes.tolist()):
+            for table, code in enumerate(row_codes):
+                self._buckets[table].setdefault(code, []).append(first_row + offset)
+
+    def add(self, pmids: List[str], vectors: "np.ndarray", metadata: List[Dict[str, Any]]):
+        """Append new vectors (PMIDs already indexed, here or by another process, are skipped)."""
+        with self._lock, self._file_lock():
+            self._sync()
+            keep = [i for i, pmid in enumerate(pmids) if pmid not in self._rows]
+            keep = list({pmids[i]: i for i in keep}.values())
+            if not keep:
+                return
+            new_vectors = np.ascontiguousarray(vectors[keep], dtype=np.float32)
+            new_pmids = [pmids[i] for i in keep]
+
+            # Rows start right after the last complete row on disk; cut off any torn tail first
+            first_row = len(self._pmids)
+            with open(self._vectors_path, "ab") as handle:
+                handle.truncate(first_row * 4 * self.dim)
+                handle.write(new_vectors.tobytes())
+            ids = "".join(f"{pmid}\n" for pmid in new_pmids).encode("utf-8")
+            with open(self._ids_path, "ab") as handle:
+                handle.truncate(self._ids_offset)
+                handle.write(ids)
+            self._ids_offset += len(ids)
+            lines = "".join(json.dumps(metadata[i], ensure_ascii=False) + "\n" for i in keep).encode("utf-8")
+            with open(self._meta_path, "ab") as handle:
+                handle.truncate(self._meta_offset)
+                handle.write(lines)
+            self._meta_offset += len(lines)
+            for i in keep:
+                self._metadata[pmids[i]] = metadata[i]
+
+            for offset, pmid in enumerate(new_pmids):
+                self._rows[pmid] = first_row + offset
+            self._pmids.extend(new_pmids)
+            self._insert_codes(self._codes(new_vectors), first_row)
+
+    def vector(self, pmid: str) -> Optional["np.ndarray"]:
+        """Stored vector of a PMID, or None."""
+        row = self._rows.get(pmid)
+        return None if row is None else np.array(self._mapped()[row])
+
+    def metadata(self, pmid: str) -> Optional[Dict[str, Any]]:
+        """Stored display metadata of a PMID, or None."""
+        return self._metadata.get(pmid)
+
+    def search(self, query: "np.ndarray", k: int, exclude: Tuple[str, ...] = ()) -> List[Tuple[str, float]]:
+        """
+        Approximate k nearest neighbours of a unit query vector by cosine similarity.
+
+        Falls back to an exact scan when the probed buckets hold fewer than k
+        candidates (typical for small stores).
+        """
+        with self._lock:
+            matrix = self._mapped()
+            if not len(matrix):
+                return []
+
+            candidates = set()
+            for table, code in enumerate(self._codes(query[None, :])[0].tolist()):
+                buckets = self._buckets[table]
+                for probe in [code] + [code ^ (1 << bit) for bit in range(self.bits)]:
+                    candidates.update(buckets.get(probe, ()))
+            candidates.difference_update(self._rows[pmid] for pmid in exclude if pmid in self._rows)
+
+            if len(candidates) >= k:
+                rows = np.fromiter(sorted(candidates), dtype=np.int64, count=len(candidates))
+                scores = matrix[rows] @ query
+            else:
+                rows = np.arange(len(matrix))
+                scores = np.concatenate([
+                    matrix[start:start + 65536] @ query for start in range(0, len(matrix), 65536)
+                ])
+                excluded = [self._rows[pmid] for pmid in exclude if pmid in self._rows]
+                scores[excluded] = -np.inf
+
+            top = np.argsort(-scores)[:k]
+            return [(self._pmids[rows[i]], float(scores[i])) for i in top if np.isfinite(scores[i])]
+
+
+class _ColumnarStoreWriter:
+    """
+    Streams parsed article dictionaries into a columnar store directory.
+
+    Layout (all little-endian):
+        pmid.u4                  fixed-width uint32 PMIDs
+        year.u2                  fixed-width uint16 publication years (0 = unknown)
+        journal.u4               uint32 codes into journals.json (dictionary encoding)
+        <field>.off / <field>.heap
+                                 uint64 offsets (n + 1) into a UTF-8 byte heap, for
+                                 title, abstract, authors, pub_date and doi
+        meta.json                row count, columns and journal dictionary size
+
+    Columns are appended chunk by chunk; meta.json is written last, so readers
+    never see rows from an unfinished write.
+    """
+
+    STRING_FIELDS = ("title", "abstract", "authors", "pub_date", "doi")
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._meta_path = os.path.join(directory, "meta.json")
+        self._journals_path = os.path.join(directory, "journals.json")
+        self.count = 0
+        self._journals: List[str] = []
+        self._heap_sizes = {name: 0 for name in self.STRING_FIELDS}
+
+        if os.path.exists(self._meta_path):
+            # Continue an existing store: truncate anything written after the last commit
+            with open(self._meta_path, "r", encoding="utf-8") as handle:
+                meta = json.load(handle)
+            with open(self._journals_path, "r", encoding="utf-8") as handle:
+                self._journals = json.load(handle)[:meta["journals"]]
+            self.count = meta["count"]
+            self._truncate("pmid.u4", 4 * self.count)
+            self._truncate("year.u2", 2 * self.count)
+            self._truncate("journal.u4", 4 * self.count)
+            for name in self.STRING_FIELDS:
+                offsets = np.fromfile(self._path(f"{name}.off"), dtype="<u8", count=self.count + 1)
+                self._heap_sizes[name] = int(offsets[-1])
+                self._truncate(f"{name}.off", 8 * (self.count + 1))
+                self._truncate(f"{name}.heap", self._heap_sizes[name])
+        else:
+            for name in self.STRING_FIELDS:
+                np.zeros(1, dtype="<u8").tofile(self._path(f"{name}.off"))
+                open(self._path(f"{name}.heap"), "wb").close()
+            for name in ("pmid.u4", "year.u2", "journal.u4"):
+                open(self._path(name), "wb").close()
+        self._journal_codes = {journal: code for code, journal in enumerate(self._journals)}
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _truncate(self, name: str, size: int):
+        with open(self._path(name), "r+b") as handle:
+            handle.truncate(size)
+
+    @staticmethod
+    def year_of(pub_date: str) -> int:
+        """First four-digit year in a PubMed date string (0 if none)."""
+        match = re.search(r"\b(1[5-9]\d\d|2\d\d\d)\b", pub_date or "")
+        return int(match.group(1)) if match else 0
+
+    def add(self, articles: List[Dict[str, Any]]):
+        """Append a chunk of parsed articles."""
+        if not articles:
+            return
+        pmids = np.array([int(article.get("pmid") or 0) for article in articles], dtype="<u4")
+        years = np.array([self.year_of(article.get("pub_date", "")) for article in articles], dtype="<u2")
+        codes = []
+        for article in articles:
+            journal = article.get("journal") or ""
+            if journal not in self._journal_codes:
+                self._journal_codes[journal] = len(self._journals)
+                self._journals.append(journal)
+            codes.append(self._journal_codes[journal])
+
+        with open(self._path("pmid.u4"), "ab") as handle:
+            handle.write(pmids.tobytes())
+        with open(self._path("year.u2"), "ab") as handle:
+            handle.write(years.tobytes())
+        with open(self._path("journal.u4"), "ab") as handle:
+            handle.write(np.array(codes, dtype="<u4").tobytes())
+
+        for name in self.STRING_FIELDS:
+            values = []
+            for article in articles:
+                value = article.get(name) or ""
+                if isinstance(value, list):
+                    value = "; ".join(value)
+                values.append(value.encode("utf-8"))
+            ends = self._heap_sizes[name] + np.cumsum([len(value) for value in values], dtype=np.uint64)
+            with open(self._path(f"{name}.heap"), "ab") as handle:
+                handle.write(b"".join(values))
+            with open(self._path(f"{name}.off"), "ab") as handle:
+                handle.write(ends.astype("<u8").tobytes())
+            self._heap_sizes[name] = int(ends[-1])
+
+        self.count += len(articles)
+
+    def commit(self):
+        """Publish all rows appended so far to readers."""
+        with open(self._journals_path, "w", encoding="utf-8") as handle:
+            json.dump(self._journals, handle, ensure_ascii=False)
+        meta = {
+            "version": 1,
+            "count": self.count,
+            "journals": len(self._journals),
+            "string_fields": list(self.STRING_FIELDS),
+        }
+        temp_path = self._meta_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as handle:
+            json.dump(meta, handle)
+        os.replace(temp_path, self._meta_path)
+
+
+class _ColumnarStore:
+    """
+    Read-only, memory-mapped view of a store written by _ColumnarStoreWriter.
+
+    All columns are mapped with mode "r", so worker processes opening the same
+    directory share one copy through the OS page cache. Year and journal
+    filters are vectorized scans over the fixed-width columns; strings are
+    decoded only for the rows that are actually materialized.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        with open(os.path.join(directory, "meta.json"), "r", encoding="utf-8") as handle:
+            meta = json.load(handle)
+        with open(os.path.join(directory, "journals.json"), "r", encoding="utf-8") as handle:
+            self.journals: List[str] = json.load(handle)[:meta["journals"]]
+        self.count = meta["count"]
+        self.pmids = self._map("pmid.u4", "<u4", self.count)
+        self.years = self._map("year.u2", "<u2", self.count)
+        self.journal_codes = self._map("journal.u4", "<u4", self.count)
+        self._strings = {
+            name: (self._map(f"{name}.off", "<u8", self.count + 1), self._map(f"{name}.heap", "u1", None))
+            for name in meta["string_fields"]
+        }
+        self._pmid_order = None
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _map(self, name: str, dtype: str, count: Optional[int]) -> "np.ndarray":
+        path = os.path.join(self.directory, name)
+        if count == 0 or os.path.getsize(path) == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode="r", shape=(count,) if count is not None else None)
+
+    def string(self, name: str, row: int) -> str:
+        """Decode one string cell."""
+        offsets, heap = self._strings[name]
+        return bytes(heap[int(offsets[row]):int(offsets[row + 1])]).decode("utf-8")
+
+    def record(self, row: int) -> Dict[str, Any]:
+        """Materialize one row as an article dictionary."""
+        pmid = str(int(self.pmids[row]))
+        article = {name: self.string(name, row) for name in self._strings}
+        article["authors"] = [name for name in article.get("authors", "").split("; ") if name]
+        article["pmid"] = pmid
+        article["journal"] = self.journals[int(self.journal_codes[row])]
+        article["url"] = f"https://pubmed.ncbi.nlm.nih.gov/{pmid}/"
+        return article
+
+    def journal_mask(self, journals: List[str]) -> "np.ndarray":
+        """Boolean row mask for journals matching any of the given names (case-insensitive)."""
+        wanted = {journal.lower() for journal in journals}
+        codes = [code for code, journal in enumerate(self.journals) if journal.lower() in wanted]
+        return np.isin(self.journal_codes, np.array(codes, dtype="<u4"))
+
+    def filter(
+        self,
+        year_from: Optional[int] = None,
+        year_to: Optional[int] = None,
+        journals: Optional[List[str]] = None
+    ) -> "np.ndarray":
+        """Row indices matching a year range and/or a journal set."""
+        mask = np.ones(self.count, dtype=bool)
+        if year_from is not None:
+            mask &= self.years >= year_from
+        if year_to is not None:
+            mask &= (self.years <= year_to) & (self.years > 0)
+        if journals:
+            mask &= self.journal_mask(journals)
+        return np.nonzero(mask)[0]
+
+    def year_counts(self, rows: Optional["np.ndarray"] = None) -> Dict[int, int]:
+        """Number of rows per publication year (unknown years omitted)."""
+        years = self.years if rows is None else self.years[rows]
+        counts = np.bincount(years)
+        return {int(year): int(counts[year]) for year in np.nonzero(counts)[0] if year}
+
+    def journal_counts(self, rows: Optional["np.ndarray"] = None) -> Dict[str, int]:
+        """Number of rows per journal."""
+        codes = self.journal_codes if rows is None else self.journal_codes[rows]
+        counts = np.bincount(codes, minlength=len(self.journals))
+        return {self.journals[int(code)]: int(counts[code]) for code in np.nonzero(counts)[0]}
+
+    def rows_for_pmids(self, pmids: List[str]) -> List[int]:
+        """Row indices of the given PMIDs (missing PMIDs skipped)."""
+        if self._pmid_order is None:
+            self._pmid_order = np.argsort(self.pmids, kind="stable")
+        wanted = np.array([int(pmid) for pmid in pmids], dtype="<u4")
+        positions = np.searchsorted(self.pmids, wanted, sorter=self._pmid_order)
+        rows = []
+        for pmid, position in zip(wanted, positions):
+            if position < self.count and self.pmids[self._pmid_order[position]] == pmid:
+                rows.append(int(self._pmid_order[position]))
+        return rows
+
+
+class _PubMedRecord(dict):
+    """
+    Parsed efetch record whose extended fields are extracted on first use.
+
+    The core fields (pmid, title, authors, journal, pub_date, abstract, doi,
+    url) are parsed eagerly. The record also keeps the raw bytes of its own
+    <PubmedArticle> element; the first read of any of the LAZY_FIELDS (item
+    access or .get) parses that slice once and stores all of them as
+    ordinary keys. Callers that never read them pay only for the byte slice,
+    and callers that do never trigger a second download.
+
+    Lazy fields:
+        all_authors: Every author as {"name", "affiliations", "orcid"}
+        affiliations: Unique affiliations in author order
+        mesh_terms: {"descriptor", "ui", "major", "qualifiers"} per MeSH heading
+        keywords: Author keywords
+        publication_types: PubMed publication types
+        grants: {"grant_id", "agency", "country"} per grant
+    """
+
+    LAZY_FIELDS = ("all_authors", "affiliations", "mesh_terms", "keywords", "publication_types", "grants")
+    _versions = itertools.count(1)
+
+    def __init__(self, fields: Dict[str, Any], source: bytes = b""):
+        super().__init__(fields)
+        self.source = source
+        self.version = next(self._versions)  # Unique per parsed copy; keys derived caches such as Markdown fragments
+
+    def __missing__(self, key: str):
+        if key not in self.LAZY_FIELDS:
+            raise KeyError(key)
+        self.update(self.extract(self.source))
+        return dict.__getitem__(self, key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key in self.LAZY_FIELDS:
+            return self[key]
+        return super().get(key, default)
+
+    def to_json(self) -> Dict[str, Any]:
+        """JSON-serializable form that keeps the XML slice for lazy extraction."""
+        return dict(self, _source=self.source.decode("utf-8"))
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "_PubMedRecord":
+        """Inverse of to_json."""
+        data = dict(data)
+        return cls(data, data.pop("_source", "").encode("utf-8"))
+
+    @staticmethod
+    def extract(source: bytes) -> Dict[str, Any]:
+        """Parse every lazy field from a <PubmedArticle> XML slice."""
+        fields: Dict[str, Any] = {name: [] for name in _PubMedRecord.LAZY_FIELDS}
+        if not source:
+            return fields
+        article = ET.fromstring(source)
+
+        for author in article.iterfind(".//AuthorList/Author"):
+            lastname, forename = author.findtext("LastName"), author.findtext("ForeName")
+            name = f"{lastname} {forename}" if lastname and forename else lastname or author.findtext("CollectiveName") or ""
+            affiliations = [
+                "".join(affiliation.itertext()).strip()
+                for affiliation in author.iterfind("AffiliationInfo/Affiliation")
+            ]
+            orcid = next(
+                (identifier.text.strip() for identifier in author.iterfind("Identifier")
+                 if identifier.get("Source") == "ORCID" and identifier.text),
+                ""
+            )
+            fields["all_authors"].append({"name": name, "affiliations": affiliations, "orcid": orcid})
+            fields["affiliations"].extend(affiliations)
+        fields["affiliations"] = list(dict.fromkeys(fields["affiliations"]))
+
+        for heading in article.iterfind(".//MeshHeadingList/MeshHeading"):
+            descriptor = heading.find("DescriptorName")
+            if descriptor is None:
+                continue
+            qualifiers = heading.findall("QualifierName")
+            fields["mesh_terms"].append({
+                "descriptor": descriptor.text or "",
+                "ui": descriptor.get("UI", ""),
+                "major": descriptor.get("MajorTopicYN") == "Y" or any(q.get("MajorTopicYN") == "Y" for q in qualifiers),
+                "qualifiers": [q.text or "" for q in qualifiers],
+            })
+
+        fields["keywords"] = ["".join(keyword.itertext()).strip() for keyword in article.iterfind(".//KeywordList/Keyword")]
+        fields["publication_types"] = [
+            publication_type.text or "" for publication_type in article.iterfind(".//PublicationTypeList/PublicationType")
+        ]
+        fields["grants"] = [
+            {
+                "grant_id": grant.findtext("GrantID") or "",
+                "agency": grant.findtext("Agency") or "",
+                "country": grant.findtext("Country") or "",
+            }
+            for grant in article.iterfind(".//GrantList/Grant")
+        ]
+        return fields
+
+
+class _PubMedStreamParser:
+    """
+    Incremental efetch parser fed with raw byte chunks as they arrive.
+
+    Complete <PubmedArticle> elements are located in a small rolling buffer
+    by plain substring search; the complete articles of each chunk are
+    parsed together and turned into records right away, so memory stays
+    bounded by about one chunk instead of the whole document and its
+    element tree. Each record keeps the raw byte slice of its own element
+    for lazy field extraction (no re-serialization), and no str copy of the
+    document is ever made. Everything outside the articles (prolog, root
+    element) goes through an XMLPullParser, which keeps document-level
+    syntax errors visible and catches article elements the substring search
+    cannot match.
+    """
+
+    START_TAG = b"<PubmedArticle>"
+    END_TAG = b"</PubmedArticle>"
+    CHUNK_SIZE = 65536
+
+    def __init__(self, build):
+        """
+        Args:
+            build: Callable (article element, source bytes) -> record
+        """
+        self.records: List[Dict[str, Any]] = []
+        self._build = build
+        self._skeleton = ET.XMLPullParser(events=("end",))
+        self._pending = bytearray()  # Bytes not yet parsed
+
+    def feed(self, chunk: bytes):
+        """Parse the next chunk of the response body."""
+        pending = self._pending
+        pending += chunk
+        first = pending.find(self.START_TAG)
+        if first < 0:
+            # Keep a possible partial start tag for the next chunk
+            self._feed_skeleton(max(0, len(pending) - len(self.START_TAG) + 1))
+            return
+        self._feed_skeleton(first)
+        last = pending.rfind(self.END_TAG)
+        if last < 0:
+            return
+        self._parse_articles(last + len(self.END_TAG))
+
+    def feed_all(self, content: bytes):
+        """Parse a complete body in CHUNK_SIZE pieces."""
+        with memoryview(content) as view:
+            for offset in range(0, len(view), self.CHUNK_SIZE):
+                self.feed(view[offset:offset + self.CHUNK_SIZE])
+
+    def close(self) -> List[Dict[str, Any]]:
+        """Finish parsing and return the records in document order."""
+        self._feed_skeleton(len(self._pending))
+        self._skeleton.close()
+        self._drain()
+        return self.records
+
+    def _parse_articles(self, length: int):
+        """Parse the complete articles in the first length bytes of the buffer."""
+        pending = self._pending
+        offsets = []
+        start = 0
+        while start >= 0:
+            end = pending.find(self.END_TAG, start, length) + len(self.END_TAG)
+            offsets.append((start, end))
+            start = pending.find(self.START_TAG, end, length)
+
+        parser = ET.XMLParser()
+        parser.feed(b"<PubmedArticleSet>")
+        with memoryview(pending) as view:
+            parser.feed(view[:length])
+        parser.feed(b"</PubmedArticleSet>")
+        elements = parser.close().findall("PubmedArticle")
+
+        if len(elements) == len(offsets):
+            sources = [bytes(pending[start:end]) for start, end in offsets]
+        else:
+            # Article markup the substring search did not match (e.g. attributes on the tag)
+            sources = [ET.tostring(element) for element in elements]
+        self.records.extend(self._build(element, source) for element, source in zip(elements, sources))
+        del pending[:length]
+
+    def _feed_skeleton(self, length: int):
+        if length:
+            self._skeleton.feed(bytes(self._pending[:length]))
+            del self._pending[:length]
+            self._drain()
+
+    def _drain(self):
+        for _, element in self._skeleton.read_events():
+            if element.tag == "PubmedArticle":
+                self.records.append(self._build(element, ET.tostring(element)))
+                element.clear()
+
+
+class _PMCStreamParser:
+    """
+    Bounded-memory parser for PMC full-text (JATS) efetch XML.
+
+    Full-text documents are often several MB, so the body is consumed as an
+    event stream: front matter is read once its <front> element closes,
+    body paragraphs are collected (up to max_chars per article) as their
+    <p> elements close, and every finished element is cleared immediately.
+    Figures, tables, formulas, supplementary material and back matter are
+    skipped. Memory is bounded by the largest open section, not by the
+    document.
+    """
+
+    SKIPPED = frozenset(("fig", "table-wrap", "disp-formula", "supplementary-material", "back"))
+
+    def __init__(self, max_chars: int = 20000):
+        """
+        Args:
+            max_chars: Maximum body text kept per article
+        """
+        self.records: List[Dict[str, Any]] = []
+        self.max_chars = max_chars
+        self._parser = ET.XMLPullParser(events=("start", "end"))
+        self._record: Optional[Dict[str, Any]] = None
+        self._in_body = False
+        self._skip_depth = 0
+        self._section_depth = 0
+        self._chars = 0
+
+    def feed(self, chunk: bytes):
+        """Parse the next chunk of the response body."""
+        self._parser.feed(chunk)
+        self._drain()
+
+    def close(self) -> List[Dict[str, Any]]:
+        """Finish parsing and return one record per article."""
+        self._parser.close()
+        self._drain()
+        return self.records
+
+    @staticmethod
+    def _text(element: Optional[ET.Element]) -> str:
+        return " ".join("".join(element.itertext()).split()) if element is not None else ""
+
+    def _drain(self):
+        for event, element in self._parser.read_events():
+            tag = element.tag
+            if event == "start":
+                if tag == "article":
+                    self._record = {
+                        "pmcid": "", "pmid": "", "doi": "", "title": "", "journal": "", "year": "",
+                        "abstract": "", "sections": [], "truncated": False,
+                    }
+                    self._chars = 0
+                elif tag == "body":
+                    self._in_body = True
+                elif tag in self.SKIPPED:
+                    self._skip_depth += 1
+                elif tag == "sec" and self._in_body and not self._skip_depth:
+                    self._section_depth += 1
+                    if not self._record["truncated"]:
+                        self._add_section("")
+                continue
+
+            record = self._record
+            if record is None:
+                continue
+            if tag in self.SKIPPED:
+                self._skip_depth -= 1
+                element.clear()
+            elif tag == "front":
+                self._read_front(element, record)
+                element.clear()
+            elif tag == "body":
+                self._in_body = False
+                element.clear()
+            elif self._skip_depth or not self._in_body:
+                if tag == "article":
+                    self.records.append(record)
+                    self._record = None
+                    element.clear()
+            elif tag == "title" and self._section_depth and not record["truncated"] \
+                    and not record["sections"][-1]["heading"] and not record["sections"][-1]["paragraphs"]:
+                record["sections"][-1]["heading"] = self._text(element)
+            elif tag == "p":
+                self._add_paragraph(self._text(element))
+                element.clear()
+            elif tag == "sec":
+                self._section_depth -= 1
+                element.clear()
+
+    def _add_section(self, heading: str):
+        self._record["sections"].append({"heading": heading, "level": max(1, self._section_depth), "paragraphs": []})
+
+    def _add_paragraph(self, text: str):
+        record = self._record
+        if not text or record["truncated"]:
+            return
+        if self._chars + len(text) > self.max_chars:
+            text = text[:max(0, self.max_chars - self._chars)].rsplit(" ", 1)[0]
+            record["truncated"] = True
+        if not record["sections"]:
+            self._add_section("")
+        record["sections"][-1]["paragraphs"].append(text)
+        self._chars += len(text)
+
+    def _read_front(self, front: ET.Element, record: Dict[str, Any]):
+        meta = front.find("article-meta")
+        if meta is None:
+            return
+        for article_id in meta.iterfind("article-id"):
+            kind, value = article_id.get("pub-id-type"), (article_id.text or "").strip()
+            if kind in ("pmc", "pmcid") and value:
+                record["pmcid"] = value if value.startswith("PMC") else f"PMC{value}"
+            elif kind == "pmid":
+                record["pmid"] = value
+            elif kind == "doi":
+                record["doi"] = value
+        record["title"] = self._text(meta.find("title-group/article-title"))
+        record["journal"] = self._text(front.find("journal-meta/journal-title-group/journal-title")) \
+            or self._text(front.find("journal-meta/journal-title"))
+        record["year"] = meta.findtext("pub-date/year") or ""
+        abstract = meta.find("abstract")
+        if abstract is not None:
+            paragraphs = [self._text(paragraph) for paragraph in abstract.iter("p")]
+            record["abstract"] = " ".join(paragraphs) if paragraphs else self._text(abstract)
+
+
+_EFETCH_FORMATS = {
+    # efetch parameters per database; the matching parser is passed to Tools._efetch
+    "pubmed": {"retmode": "xml", "rettype": "abstract"},
+    "pmc": {"retmode": "xml"},
+}
+
+
+class _AdaptiveBatchSizer:
+    """
+    AIMD controller for the number of PMIDs per efetch request.
+
+    Each successful network fetch within the latency and payload targets
+    grows the batch additively; a failure, a slow response or an oversized
+    payload halves it. Per-record time is tracked as an exponentially
+    weighted average to derive request timeouts, and the batch only grows
+    while the recent error rate is low. Sizes stay within NCBI's recommended
+    200 IDs per GET request.
+    """
+
+    def __init__(
+        self,
+        initial: int = 50,
+        minimum: int = 5,
+        maximum: int = 200,
+        step: int = 10,
+        target_seconds: float = 8.0,
+        target_bytes: int = 8 * 1024 * 1024
+    ):
+        self.size = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.step = step
+        self.target_seconds = target_seconds
+        self.target_bytes = target_bytes
+        self.seconds_per_record = 0.05
+        self.error_rate = 0.0
+        self._lock = threading.Lock()
+
+    def timeout(self, batch_size: int) -> float:
+        """Request timeout for a batch: a generous multiple of the predicted time."""
+        with self._lock:
+            predicted = 1.0 + self.seconds_per_record * batch_size
+        return max(15.0, min(120.0, 4 * predicted))
+
+    def record_success(self, batch_size: int, seconds: float, nbytes: int):
+        """Feed back a completed network fetch."""
+        with self._lock:
+            self.seconds_per_record = 0.7 * self.seconds_per_record + 0.3 * (seconds / max(batch_size, 1))
+            self.error_rate *= 0.8
+            if seconds > self.target_seconds or nbytes > self.target_bytes:
+                self.size = max(self.minimum, self.size // 2)
+            elif batch_size >= self.size and self.error_rate < 0.2:
+                self.size = min(self.maximum, self.size + self.step)
+
+    def record_failure(self):
+        """Feed back a failed fetch (timeout, connection or server error)."""
+        with self._lock:
+            self.error_rate = 0.8 * self.error_rate + 0.2
+            self.size = max(self.minimum, self.size // 2)
+
+
+# Priority, tenant and deadline of the tool call on whose behalf requests are made
+_REQUEST_CONTEXT: contextvars.ContextVar = contextvars.ContextVar("pubmed_request_context", default=None)
+
+
+class _RequestScheduler:
+    """
+    Shared NCBI rate limiter that decides which waiting request goes next.
+
+    Every E-utilities request takes one slot; slots are granted at most once
+    per interval. When several requests wait, the lowest priority class wins
+    (interactive before batch before prefetch, so lower classes only soak
+    up leftover capacity). Within a class, tenants are served fairly by start-time fair
+    queuing on the number of slots each has received, and each tenant's own
+    requests go earliest-deadline-first. A request whose deadline passes
+    while waiting is dropped with TimeoutError instead of being sent late.
+    """
+
+    PRIORITIES = {"interactive": 0, "batch": 1, "prefetch": 2}
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._waiting: List[Dict[str, Any]] = []
+        self._next_slot = 0.0
+        self._virtual_time: Dict[str, float] = {}
+        self._sequence = 0
+        self.granted = {name: 0 for name in self.PRIORITIES}
+        self.expired = 0
+
+    def _select(self) -> Dict[str, Any]:
+        """The waiting ticket to serve next."""
+        best_class = min(ticket["class"] for ticket in self._waiting)
+        candidates = [ticket for ticket in self._waiting if ticket["class"] == best_class]
+        tenant = min(candidates, key=lambda ticket: (self._virtual_time[ticket["tenant"]], ticket["seq"]))["tenant"]
+        return min(
+            (ticket for ticket in candidates if ticket["tenant"] == tenant),
+            key=lambda ticket: (ticket["deadline"] or math.inf, ticket["seq"])
+        )
+
+    def acquire(
+        self,
+        interval: float,
+        priority: str = "interactive",
+        tenant: str = "default",
+        deadline: Optional[float] = None
+    ):
+        """
+        Block until this request may be sent.
+
+        Args:
+            interval: Minimum seconds between granted slots
+            priority: Priority class name ("interactive" or "batch")
+            tenant: Fair-queuing key (e.g., OpenWebUI user id)
+            deadline: time.monotonic() value after which the request is abandoned
+
+        Raises:
+            TimeoutError: If the deadline passes before a slot is granted
+        """
+        with self._condition:
+            # A tenant returning after idling starts at the current virtual time, not behind it
+            active = [self._virtual_time[t["tenant"]] for t in self._waiting]
+            floor = min(active) if active else 0.0
+            self._virtual_time[tenant] = max(self._virtual_time.get(tenant, 0.0), floor)
+
+            self._sequence += 1
+            ticket = {
+                "class": self.PRIORITIES.get(priority, len(self.PRIORITIES)),
+                "priority": priority,
+                "tenant": tenant,
+                "deadline": deadline,
+                "seq": self._sequence,
+            }
+            self._waiting.append(ticket)
+
+            try:
+                while True:
+                    now = time.monotonic()
+                    if deadline is not None and now >= deadline:
+                        self.expired += 1
+                        raise TimeoutError("Request deadline exceeded while waiting for NCBI rate-limit capacity")
+
+                    wait = None if deadline is None else deadline - now
+                    if self._select() is ticket:
+                        if now >= self._next_slot:
+                            self._next_slot = now + interval
+                            self._virtual_time[tenant] += 1
+                            self.granted[priority] = self.granted.get(priority, 0) + 1
+                            return
+                        wait = self._next_slot - now if wait is None else min(wait, self._next_slot - now)
+                    self._condition.wait(wait)
+            finally:
+                self._waiting.remove(ticket)
+                self._condition.notify_all()
+
+
+class _PrefetchStopped(Exception):
+    """Raised before a speculative request that was cancelled or is over budget."""
+
+
+class _Prefetcher:
+    """
+    Background cache warming for likely follow-up requests.
+
+    Speculative runs execute one at a time in a daemon worker thread, in the
+    scheduler's "prefetch" class, which is only served while no interactive
+    or batch request is waiting. Each run has a request budget, and a newer
+    run for the same tenant cancels the older one; both are checked before
+    every request (see charge). Prefetched responses and records are
+    remembered, so later cache hits on them can be counted as a hit rate.
+    """
+
+    def __init__(self, max_tracked: int = 5000):
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._cancel_events: Dict[str, threading.Event] = {}
+        self._items: "OrderedDict[str, bool]" = OrderedDict()
+        self._max_tracked = max_tracked
+        self.runs = 0
+        self.requests = 0
+        self.stopped = 0
+        self.prefetched = 0
+        self.hits = 0
+
+    def submit(self, tenant: str, run):
+        """Queue run(cancel_event) for a tenant, cancelling the tenant's previous run."""
+        with self._lock:
+            previous = self._cancel_events.get(tenant)
+            if previous is not None:
+                previous.set()
+            cancel = self._cancel_events[tenant] = threading.Event()
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pubmed-prefetch")
+            self.runs += 1
+        return self._executor.submit(run, cancel)
+
+    def cancel_all(self):
+        with self._lock:
+            for cancel in self._cancel_events.values():
+                cancel.set()
+
+    def drain(self):
+        """Block until every queued run has finished."""
+        if self._executor is not None:
+            self._executor.submit(lambda: None).result()
+
+    def charge(self, context: Dict[str, Any]):
+        """
+        Account for one speculative request.
+
+        Raises:
+            _PrefetchStopped: If the run was cancelled or its budget is spent
+        """
+        budget = context["budget"]
+        if context["cancel"].is_set() or budget[0] <= 0:
+            with self._lock:
+                self.stopped += 1
+            raise _PrefetchStopped("Prefetch cancelled or over budget")
+        budget[0] -= 1
+        with self._lock:
+            self.requests += 1
+
+    def remember(self, item: str):
+        """Record that an item (response or record key) was prefetched."""
+        with self._lock:
+            if item not in self._items:
+                self.prefetched += 1
+            self._items[item] = False
+            while len(self._items) > self._max_tracked:
+                self._items.popitem(last=False)
+
+    def use(self, item: str):
+        """Count a hit if a prefetched item is used for the first time."""
+        if self._items.get(item) is False:
+            with self._lock:
+                if self._items.get(item) is False:
+                    self._items[item] = True
+                    self.hits += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters plus the fraction of prefetched items that were used."""
+        return {
+            "runs": self.runs,
+            "requests": self.requests,
+            "stopped": self.stopped,
+            "prefetched": self.prefetched,
+            "hits": self.hits,
+            "hit_rate": self.hits / self.prefetched if self.prefetched else 0.0,
+        }
+
+
+class _SQLiteBackend:
+    """
+    Host-wide coordination state in a SQLite file shared by worker processes.
+
+    OpenWebUI runs several worker processes, each with its own Tools instance.
+    This backend gives them one NCBI request schedule (a shared "next free
+    slot" per limiter), single-flight locks so only one process sends a given
+    request, and a key-value store for responses and parsed records. Every
+    operation is a short BEGIN IMMEDIATE transaction, so it is safe across
+    processes and threads (each thread uses its own connection).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._local = threading.local()
+        self._writes = 0
+        with self._transaction() as db:
+            db.execute("CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL NOT NULL)")
+            db.execute("CREATE TABLE IF NOT EXISTS slots (name TEXT PRIMARY KEY, next_slot REAL NOT NULL)")
+            db.execute("CREATE TABLE IF NOT EXISTS locks (key TEXT PRIMARY KEY, owner TEXT NOT NULL, expires REAL NOT NULL)")
+
+    def _connection(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    @contextmanager
+    def _transaction(self):
+        db = self._connection()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+
+    def reserve_slot(self, name: str, interval: float, deadline: Optional[float] = None):
+        """
+        Reserve the next host-wide request slot of a limiter and sleep until it.
+
+        Args:
+            name: Limiter name
+            interval: Minimum seconds between slots
+            deadline: time.time() value; raise instead of reserving a later slot
+
+        Raises:
+            TimeoutError: If the next free slot is after the deadline
+        """
+        with self._transaction() as db:
+            now = time.time()
+            row = db.execute("SELECT next_slot FROM slots WHERE name = ?", (name,)).fetchone()
+            slot = max(now, row[0] if row else 0.0)
+            if deadline is not None and slot > deadline:
+                raise TimeoutError("Request deadline exceeded while waiting for NCBI rate-limit capacity")
+            db.execute("INSERT OR REPLACE INTO slots (name, next_slot) VALUES (?, ?)", (name, slot + interval))
+        delay = slot - time.time()
+        if delay > 0:
+            time.sleep(delay)
+
+    def get_many(self, keys: List[str]) -> Dict[str, bytes]:
+        """Return the unexpired values stored under the given keys."""
+        found = {}
+        db = self._connection()
+        now = time.time()
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            rows = db.execute(
+                f"SELECT key, value FROM kv WHERE expires > ? AND key IN ({','.join('?' * len(chunk))})",
+                [now] + chunk
+            )
+            found.update((key, bytes(value)) for key, value in rows)
+        return found
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.get_many([key]).get(key)
+
+    def set_many(self, items: Dict[str, bytes], ttl: float):
+        """Store values that expire after ttl seconds (expired rows are pruned periodically)."""
+        if not items:
+            return
+        expires = time.time() + ttl
+        with self._transaction() as db:
+            db.executemany(
+                "INSERT OR REPLACE INTO kv (key, value, expires) VALUES (?, ?, ?)",
+                [(key, value, expires) for key, value in items.items()]
+            )
+            self._writes += len(items)
+            if self._writes >= 1000:
+                self._writes = 0
+                db.execute("DELETE FROM kv WHERE expires <= ?", (time.time(),))
+
+    def set(self, key: str, value: bytes, ttl: float):
+        self.set_many({key: value}, ttl)
+
+    def acquire_lock(self, key: str, ttl: float) -> Optional[str]:
+        """Take a lock that expires after ttl seconds; returns an owner token, or None if held."""
+        token = secrets.token_hex(8)
+        with self._transaction() as db:
+            db.execute("DELETE FROM locks WHERE key = ? AND expires <= ?", (key, time.time()))
+            cursor = db.execute(
+                "INSERT OR IGNORE INTO locks (key, owner, expires) VALUES (?, ?, ?)",
+                (key, token, time.time() + ttl)
+            )
+            return token if cursor.rowcount == 1 else None
+
+    def release_lock(self, key: str, token: str):
+        with self._transaction() as db:
+            db.execute("DELETE FROM locks WHERE key = ? AND owner = ?", (key, token))
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Unexpired entries, value bytes and earliest expiry (time.time()) per key prefix."""
+        rows = self._connection().execute(
+            "SELECT substr(key, 1, instr(key, ':') - 1), COUNT(*), SUM(LENGTH(value)), MIN(expires) "
+            "FROM kv WHERE expires > ? GROUP BY 1",
+            (time.time(),)
+        )
+        return {prefix or "other": {"entries": count, "bytes": size or 0, "earliest_expiry": expires} for prefix, count, size, expires in rows}
+
+    def size_on_disk(self) -> int:
+        """Bytes used by the database file and its write-ahead log."""
+        return sum(os.path.getsize(path) for path in (self.path, self.path + "-wal") if os.path.exists(path))
+
+    def compact(self) -> int:
+        """Delete expired entries and locks, then reclaim the free pages; returns entries removed."""
+        with self._transaction() as db:
+            now = time.time()
+            removed = db.execute("DELETE FROM kv WHERE expires <= ?", (now,)).rowcount
+            db.execute("DELETE FROM locks WHERE expires <= ?", (now,))
+        db = self._connection()
+        db.execute("VACUUM")
+        db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return removed
+
+    def purge(self) -> int:
+        """Delete all stored values (the limiter schedule and locks are kept); returns entries removed."""
+        with self._transaction() as db:
+            return db.execute("DELETE FROM kv").rowcount
+
+    def trim(self, prefix: str, max_bytes: int) -> int:
+        """Delete the entries under a key prefix that expire first until the rest fit in max_bytes; returns entries removed."""
+        with self._transaction() as db:
+            rows = db.execute(
+                "SELECT key, LENGTH(value) FROM kv WHERE key >= ? AND key < ? ORDER BY expires DESC",
+                (prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1))
+            ).fetchall()
+            kept = 0
+            removed = []
+            for key, size in rows:
+                kept += size
+                if kept > max_bytes:
+                    removed.append((key,))
+            db.executemany("DELETE FROM kv WHERE key = ?", removed)
+            return len(removed)
+
+
+class _RedisBackend:
+    """
+    Coordination backend on a Redis-compatible server (same interface as _SQLiteBackend).
+
+    Only plain SET NX PX / GET / MGET / PTTL / STRLEN / SCAN / DELETE commands are used, so
+    any client object with the redis-py method signatures works, including
+    local stand-ins such as fakeredis.
+    """
+
+    def __init__(self, client, prefix: str = "pubmed_search_tool:"):
+        self.client = client
+        self.prefix = prefix
+
+    def reserve_slot(self, name: str, interval: float, deadline: Optional[float] = None):
+        if interval <= 0:
+            return
+        key = f"{self.prefix}slot:{name}"
+        while not self.client.set(key, b"1", nx=True, px=max(1, int(interval * 1000))):
+            remaining = self.client.pttl(key)
+            wait = remaining / 1000 if remaining and remaining > 0 else 0.01
+            if deadline is not None and time.time() + wait > deadline:
+                raise TimeoutError("Request deadline exceeded while waiting for NCBI rate-limit capacity")
+            time.sleep(wait)
+
+    def get_many(self, keys: List[str]) -> Dict[str, bytes]:
+        if not keys:
+            return {}
+        values = self.client.mget([self.prefix + key for key in keys])
+        return {key: value for key, value in zip(keys, values) if value is not None}
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(self.prefix + key)
+
+    def set_many(self, items: Dict[str, bytes], ttl: float):
+        pipeline = self.client.pipeline()
+        for key, value in items.items():
+            pipeline.set(self.prefix + key, value, px=max(1, int(ttl * 1000)))
+        pipeline.execute()
+
+    def set(self, key: str, value: bytes, ttl: float):
+        self.client.set(self.prefix + key, value, px=max(1, int(ttl * 1000)))
+
+    def acquire_lock(self, key: str, ttl: float) -> Optional[str]:
+        token = secrets.token_hex(8)
+        if self.client.set(f"{self.prefix}lock:{key}", token, nx=True, px=max(1, int(ttl * 1000))):
+            return token
+        return None
+
+    def release_lock(self, key: str, token: str):
+        owner = self.client.get(f"{self.prefix}lock:{key}")
+        if owner is not None and (owner.decode() if isinstance(owner, bytes) else owner) == token:
+            self.client.delete(f"{self.prefix}lock:{key}")
+
+    def _value_keys(self) -> List[str]:
+        """Stored value keys (without the prefix); limiter slots and locks are skipped."""
+        keys = []
+        for key in self.client.scan_iter(match=self.prefix + "*", count=1000):
+            key = (key.decode() if isinstance(key, bytes) else key)[len(self.prefix):]
+            if not key.startswith(("slot:", "lock:")):
+                keys.append(key)
+        return keys
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        keys = self._value_keys()
+        pipeline = self.client.pipeline()
+        for key in keys:
+            pipeline.strlen(self.prefix + key)
+            pipeline.pttl(self.prefix + key)
+        replies = pipeline.execute() if keys else []
+        stats: Dict[str, Dict[str, Any]] = {}
+        now = time.time()
+        for index, key in enumerate(keys):
+            size, ttl = replies[2 * index], replies[2 * index + 1]
+            bucket = stats.setdefault(key.split(":", 1)[0] if ":" in key else "other", {"entries": 0, "bytes": 0, "earliest_expiry": None})
+            bucket["entries"] += 1
+            bucket["bytes"] += size or 0
+            if ttl and ttl > 0:
+                expires = now + ttl / 1000
+                bucket["earliest_expiry"] = min(bucket["earliest_expiry"] or expires, expires)
+        return stats
+
+    def size_on_disk(self) -> int:
+        return 0
+
+    def compact(self) -> int:
+        return 0  # Redis expires keys itself
+
+    def purge(self) -> int:
+        keys = self._value_keys()
+        for start in range(0, len(keys), 500):
+            self.client.delete(*[self.prefix + key for key in keys[start:start + 500]])
+        return len(keys)
+
+    def trim(self, prefix: str, max_bytes: int) -> int:
+        keys = [key for key in self._value_keys() if key.startswith(prefix)]
+        pipeline = self.client.pipeline()
+        for key in keys:
+            pipeline.strlen(self.prefix + key)
+            pipeline.pttl(self.prefix + key)
+        replies = pipeline.execute() if keys else []
+        entries = sorted(
+            ((replies[2 * index + 1] or 0, replies[2 * index] or 0, key) for index, key in enumerate(keys)),
+            reverse=True
+        )
+        kept = 0
+        removed = []
+        for _, size, key in entries:
+            kept += size
+            if kept > max_bytes:
+                removed.append(self.prefix + key)
+        for start in range(0, len(removed), 500):
+            self.client.delete(*removed[start:start + 500])
+        return len(removed)
+
+
+class _ExportJob:
+    """
+    Checkpointed state of a large record export, resumable after crashes.
+
+    Directory layout:
+        ids.txt          PMIDs to export, one per line (written once at creation)
+        records.jsonl    exported records, appended one chunk at a time
+        checkpoint.json  job parameters plus the byte range of every finished chunk
+
+    Chunk i covers ids[i * chunk_size:(i + 1) * chunk_size]. Chunks finish in
+    any order; each is appended to records.jsonl and only then recorded in the
+    checkpoint, which is replaced atomically. On open, records.jsonl is cut
+    back to the end of the last recorded chunk, so a chunk interrupted halfway
+    is simply fetched again.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._lock = threading.Lock()
+        with open(self._path("checkpoint.json"), "r", encoding="utf-8") as handle:
+            self.state: Dict[str, Any] = json.load(handle)
+        with open(self._path("ids.txt"), "r", encoding="utf-8") as handle:
+            self.ids = handle.read().split()
+        written = max((end for _, end in self.state["chunks"].values()), default=0)
+        with open(self._path("records.jsonl"), "ab") as handle:
+            handle.truncate(written)
+
+    @classmethod
+    def create(cls, directory: str, ids: List[str], chunk_size: int, params: Dict[str, Any]) -> "_ExportJob":
+        """Start a new job (replacing any previous job in the directory)."""
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, "ids.txt"), "w", encoding="utf-8") as handle:
+            handle.write("\n".join(ids))
+        open(os.path.join(directory, "records.jsonl"), "wb").close()
+        state = dict(params, chunk_size=chunk_size, total=len(ids), chunks={}, created=time.time())
+        cls._write_checkpoint(directory, state)
+        return cls(directory)
+
+    @staticmethod
+    def _write_checkpoint(directory: str, state: Dict[str, Any]):
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as handle:
+            json.dump(state, handle)
+        os.replace(temp_path, os.path.join(directory, "checkpoint.json"))
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    @property
+    def output_path(self) -> str:
+        return self._path("records.jsonl")
+
+    @property
+    def chunk_count(self) -> int:
+        size = self.state["chunk_size"]
+        return (len(self.ids) + size - 1) // size
+
+    @property
+    def complete(self) -> bool:
+        return len(self.state["chunks"]) == self.chunk_count
+
+    def pending_chunks(self) -> List[int]:
+        """Indices of chunks not exported yet."""
+        return [index for index in range(self.chunk_count) if str(index) not in self.state["chunks"]]
+
+    def chunk_ids(self, index: int) -> List[str]:
+        size = self.state["chunk_size"]
+        return self.ids[index * size:(index + 1) * size]
+
+    def record_chunk(self, index: int, records: List[Dict[str, Any]]):
+        """Append one finished chunk's records and checkpoint it."""
+        data = b"".join(json.dumps(record).encode("utf-8") + b"\n" for record in records)
+        with self._lock:
+            with open(self.output_path, "ab") as handle:
+                start = handle.tell()
+                handle.write(data)
+                handle.flush()
+                os.fsync(handle.fileno())
+            self.state["chunks"][str(index)] = [start, start + len(data)]
+            self._write_checkpoint(self.directory, self.state)
+
+    def records(self):
+        """Iterate over the exported records (in completion order)."""
+        with open(self.output_path, "r", encoding="utf-8") as handle:
+            for line in handle:
+                yield json.loads(line)
+
+
+class _QueryPlan:
+    """
+    Canonical form of a PubMed search request.
+
+    The free-text query and the tool's filters are parsed into a small AST of
+    ("term", text, field), ("and", [...]), ("or", [...]) and ("not", a, b)
+    nodes. Field tags, case and boolean structure are normalized, duplicate
+    clauses are dropped, and date filters are kept out of the term so they are
+    sent exactly once as esearch mindate/maxdate parameters. Semantically
+    identical searches therefore produce the same request and cache key.
+
+    With a MeSH index, untagged free-text terms are expanded: each phrase
+    that is a MeSH descriptor name or entry term becomes
+    ("descriptor"[mh] OR "phrase"[tiab] ...), so one request also finds
+    synonyms and records indexed under the controlled vocabulary.
+    """
+
+    FIELD_TAGS = {
+        "all": "all", "all fields": "all",
+        "ti": "ti", "title": "ti",
+        "tiab": "tiab", "title/abstract": "tiab",
+        "tw": "tw", "text word": "tw",
+        "au": "au", "author": "au", "auth": "au",
+        "1au": "1au", "first author": "1au",
+        "lastau": "lastau", "last author": "lastau",
+        "ta": "ta", "journal": "ta", "jour": "ta",
+        "mh": "mh", "mesh": "mh", "mesh terms": "mh",
+        "majr": "majr", "mesh major topic": "majr",
+        "sh": "sh", "mesh subheading": "sh",
+        "pt": "pt", "ptyp": "pt", "publication type": "pt",
+        "dp": "dp", "pdat": "dp", "date - publication": "dp",
+        "ad": "ad", "affiliation": "ad",
+        "la": "la", "lang": "la", "language": "la",
+        "nm": "nm", "substance name": "nm",
+        "sb": "sb", "filter": "sb",
+        "pmid": "pmid", "uid": "uid", "doi": "doi",
+    }
+
+    PUBLICATION_TYPES = {
+        "review": "Review",
+        "clinical trial": "Clinical Trial",
+        "meta-analysis": "Meta-Analysis",
+        "randomized controlled trial": "Randomized Controlled Trial",
+        "case report": "Case Reports",
+        "systematic review": "Systematic Review",
+        "letter": "Letter",
+        "editorial": "Editorial",
+    }
+
+    _TOKEN_RE = re.compile(r'"[^"]*"|\(|\)|\[[^\]]*\]|[^\s()\["]+')
+    _OPERATORS = ("AND", "OR", "NOT")
+
+    def __init__(
+        self,
+        query: str,
+        author: Optional[str] = None,
+        journal: Optional[str] = None,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        publication_type: Optional[str] = None,
+        mesh_index: Optional["_MeshIndex"] = None
+    ):
+        clauses = []
+        parsed = self.parse(query or "")
+        self.expanded = False
+        if parsed is not None and mesh_index is not None:
+            expanded = self._simplify(self._expand(parsed, mesh_index))
+            self.expanded = expanded != parsed
+            parsed = expanded
+        if parsed is not None:
+            clauses.append(parsed)
+        if author and author.strip():
+            clauses.append(("term", self._normalize_text(author), "au"))
+        if journal and journal.strip():
+            clauses.append(("term", self._normalize_text(journal), "ta"))
+        if publication_type and publication_type.strip():
+            pt = self.PUBLICATION_TYPES.get(publication_type.strip().lower(), publication_type)
+            clauses.append(("term", self._normalize_text(pt), "pt"))
+
+        self.ast = self._simplify(("and", clauses)) if clauses else None
+        self.term = self.render(self.ast) if self.ast is not None else ""
+        self.date_from = self.normalize_date(date_from)
+        self.date_to = self.normalize_date(date_to)
+
+    @property
+    def date_params(self) -> Dict[str, str]:
+        """esearch date parameters for this plan."""
+        return self.build_date_params(self.date_from, self.date_to)
+
+    @classmethod
+    def build_date_params(
+        cls,
+        date_from: Optional[str],
+        date_to: Optional[str],
+        date_type: str = "pdat"
+    ) -> Dict[str, str]:
+        """
+        esearch date parameters (NCBI requires mindate and maxdate together).
+
+        date_type is "pdat" (publication date), "edat" (Entrez date, when the
+        record was added to PubMed) or "mdat" (last modification date).
+        """
+        date_from, date_to = cls.normalize_date(date_from), cls.normalize_date(date_to)
+        if not (date_from or date_to):
+            return {}
+        return {
+            "mindate": date_from or "1800",
+            "maxdate": date_to or "3000",
+            "datetype": date_type,
+        }
+
+    @property
+    def cache_key(self) -> str:
+        """Stable key identifying the canonical search."""
+        raw = json.dumps([self.term, self.date_params], sort_keys=True, separators=(",", ":"))
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    TEXT_FIELDS = ("", "all", "ti", "tiab", "tw", "mh", "majr")
+
+    def text_terms(self) -> List[str]:
+        """
+        Words of the positive free-text clauses, for local relevance scoring.
+
+        Terms under the right-hand side of NOT and terms restricted to
+        non-text fields (author, journal, publication type, ...) are skipped.
+        """
+        words: List[str] = []
+
+        def visit(node):
+            if node is None:
+                return
+            if node[0] == "term":
+                if node[2] in self.TEXT_FIELDS:
+                    words.extend(re.findall(r"[a-z0-9]+", node[1]))
+            elif node[0] == "not":
+                visit(node[1])
+            else:
+                for child in node[1]:
+                    visit(child)
+
+        visit(self.ast)
+        return [word for word in dict.fromkeys(words) if word not in _STOPWORDS]
+
+    @staticmethod
+    def normalize_date(value: Optional[str]) -> str:
+        """Normalize YYYY, YYYY/MM or YYYY/MM/DD (also with - or .) to NCBI form."""
+        if not value or not str(value).strip():
+            return ""
+        parts = [part for part in re.split(r"[/\-.\s]+", str(value).strip()) if part]
+        if not all(part.isdigit() for part in parts):
+            return str(value).strip()
+        return "/".join([parts[0]] + [part.zfill(2) for part in parts[1:3]])
+
+    @classmethod
+    def date_bounds(cls, date_from: Optional[str], date_to: Optional[str]) -> Tuple[date, date]:
+        """
+        First and last day covered by a date filter, for splitting it into windows.
+
+        Open ends default to the same bounds as build_date_params (1800 and
+        the end of next year). YYYY and YYYY/MM cover the whole year or month.
+        """
+        def parse(value, default, last):
+            parts = [int(part) for part in cls.normalize_date(value).split("/") if part.isdigit()] if value else []
+            if not parts:
+                return default
+            year, month = parts[0], parts[1] if len(parts) > 1 else (12 if last else 1)
+            if len(parts) > 2:
+                return date(year, month, parts[2])
+            if not last:
+                return date(year, month, 1)
+            return date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+
+        return parse(date_from, date(1800, 1, 1), False), parse(date_to, date(datetime.now().year + 1, 12, 31), True)
+
+    @staticmethod
+    def _normalize_text(text: str) -> str:
+        """Lower-case and collapse whitespace (PubMed matching is case-insensitive)."""
+        return " ".join(text.split()).lower()
+
+    @classmethod
+    def parse(cls, query: str) -> Optional[tuple]:
+        """
+        Parse a PubMed query string into an AST.
+
+        PubMed only treats upper-case AND/OR/NOT as operators and evaluates them
+        left to right without precedence, so operators are folded left. Adjacent bare words stay together as one term
+        so automatic term mapping still sees phrases like "machine learning".
+        Unbalanced parentheses are tolerated.
+        """
+        tokens = cls._TOKEN_RE.findall(query)
+        node, _ = cls._parse_expression(tokens, 0)
+        return cls._simplify(node) if node is not None else None
+
+    @classmethod
+    def _parse_expression(cls, tokens: List[str], pos: int):
+        node = None
+        operator = "AND"
+        while pos < len(tokens):
+            token = tokens[pos]
+            if token == ")":
+                return node, pos + 1
+            if token in cls._OPERATORS and node is not None:
+                operator = token
+                pos += 1
+                continue
+
+            operand, pos = cls._parse_operand(tokens, pos)
+            if operand is None:
+                continue
+            if node is None:
+                node = operand
+            elif operator == "NOT":
+                node = ("not", node, operand)
+            else:
+                node = (operator.lower(), [node, operand])
+            operator = "AND"  # Adjacent operands are implicitly ANDed
+        return node, pos
+
+    @classmethod
+    def _parse_operand(cls, tokens: List[str], pos: int):
+        token = tokens[pos]
+        if token == "(":
+            node, pos = cls._parse_expression(tokens, pos + 1)
+        elif token.startswith("["):
+            return None, pos + 1  # Stray field tag
+        elif token in cls._OPERATORS:
+            return None, pos + 1  # Leading operator
+        elif token.startswith('"'):
+            node = ("term", '"' + cls._normalize_text(token.strip('"')) + '"', "")
+            pos += 1
+        else:
+            words = []
+            while (
+                pos < len(tokens)
+                and tokens[pos] not in ("(", ")")
+                and not tokens[pos].startswith(("[", '"'))
+                and tokens[pos] not in cls._OPERATORS
+            ):
+                words.append(tokens[pos])
+                pos += 1
+            node = ("term", cls._normalize_text(" ".join(words)), "")
+
+        # A trailing field tag applies to the preceding term
+        if pos < len(tokens) and tokens[pos].startswith("[") and node is not None and node[0] == "term":
+            tag = cls._normalize_text(tokens[pos][1:-1])
+            node = ("term", node[1], cls.FIELD_TAGS.get(tag, tag))
+            pos += 1
+        return node, pos
+
+    @classmethod
+    def _expand(cls, node: tuple, mesh_index: "_MeshIndex") -> tuple:
+        """Rewrite untagged, unquoted terms into MeSH OR title/abstract forms."""
+        kind = node[0]
+        if kind == "not":
+            # Broadening the excluded side would remove more records, so leave it alone
+            return ("not", cls._expand(node[1], mesh_index), node[2])
+        if kind != "term":
+            return (kind, [cls._expand(child, mesh_index) for child in node[1]])
+        if node[2] or node[1].startswith('"'):
+            return node
+
+        clauses = []
+        for text, descriptor in mesh_index.segment(node[1]):
+            if descriptor is None:
+                clauses.append(("term", cls._normalize_text(text), ""))
+                continue
+            name = cls._normalize_text(descriptor[1])
+            alternatives = [("term", f'"{name}"', "mh"), ("term", f'"{cls._normalize_text(text)}"', "tiab")]
+            if "," not in name:
+                # Inverted headings such as "diabetes mellitus, type 2" do not occur in running text
+                alternatives.append(("term", f'"{name}"', "tiab"))
+            clauses.append(("or", alternatives))
+        return ("and", clauses) if len(clauses) > 1 else clauses[0]
+
+    @classmethod
+    def _simplify(cls, node: tuple) -> Optional[tuple]:
+        """Flatten nested AND/OR, drop duplicate clauses and sort operands canonically."""
+        kind = node[0]
+        if kind == "term":
+            return node if node[1] not in ("", '""') else None
+        if kind == "not":
+            left, right = cls._simplify(node[1]), cls._simplify(node[2])
+            if left is None or right is None:
+                return left
+            return ("not", left, right)
+
+        children = {}
+        for child in node[1]:
+            child = cls._simplify(child)
+            if child is None:
+                continue
+            for item in (child[1] if child[0] == kind else [child]):
+                children.setdefault(cls.render(item), item)
+        if not children:
+            return None
+        if len(children) == 1:
+            return next(iter(children.values()))
+        return (kind, [children[key] for key in sorted(children)])
+
+    @classmethod
+    def render(cls, node: tuple) -> str:
+        """Render an AST node as a PubMed query string."""
+        kind = node[0]
+        if kind == "term":
+            return f"{node[1]}[{node[2]}]" if node[2] else node[1]
+
+        def wrap(child):
+            text = cls.render(child)
+            return text if child[0] == "term" else f"({text})"
+
+        if kind == "not":
+            return f"{wrap(node[1])} NOT {wrap(node[2])}"
+        return f" {kind.upper()} ".join(wrap(child) for child in node[1])
+
+
+class _MeshIndex:
+    """
+    Read-only MeSH vocabulary index for query expansion.
+
+    Every descriptor name and entry term is normalized (lower-case words
+    joined by single spaces) and stored once in a sorted UTF-8 heap with
+    uint32 offsets and descriptor numbers, i.e. a trie laid out as a sorted
+    array. A lookup walks the query word by word, binary-searching the
+    prefix read so far, and stops as soon as no key extends it. The files
+    are memory-mapped, so worker processes share one copy in the page
+    cache; only the descriptor names are held in Python objects. The index
+    is built once from the NLM descriptor XML (desc20XX.xml, optionally
+    gzipped) with a streaming parse.
+    """
+
+    _WORD_RE = re.compile(r"[^\W_]+")
+
+    def __init__(self, directory: str):
+        with open(os.path.join(directory, "descriptors.json"), "r", encoding="utf-8") as handle:
+            self.descriptors: List[List[str]] = json.load(handle)  # [MeSH UI, name] per descriptor
+        self._heap = self._map(os.path.join(directory, "heap.bin"))
+        self._offsets = memoryview(self._map(os.path.join(directory, "offsets.bin"))).cast("I")
+        self._targets = memoryview(self._map(os.path.join(directory, "targets.bin"))).cast("I")
+        self.count = len(self._targets)
+
+    @staticmethod
+    def _map(path: str) -> mmap.mmap:
+        with open(path, "rb") as handle:
+            return mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+
+    @classmethod
+    def normalize(cls, text: str) -> str:
+        """Lower-case words of a term joined by single spaces."""
+        return " ".join(cls._WORD_RE.findall(text.lower()))
+
+    @classmethod
+    def build(cls, source: str, directory: str) -> "_MeshIndex":
+        """
+        Build the index files from MeSH descriptor XML.
+
+        Args:
+            source: Path of desc20XX.xml or desc20XX.xml.gz
+            directory: Output directory (created atomically)
+
+        Returns:
+            The opened index
+        """
+        descriptors: List[List[str]] = []
+        names: Dict[str, int] = {}
+        entry_terms: Dict[str, int] = {}
+        opener = gzip.open if source.endswith(".gz") else open
+        with opener(source, "rb") as handle:
+            for _, element in ET.iterparse(handle, events=("end",)):
+                if element.tag != "DescriptorRecord":
+                    continue
+                ui = element.findtext("DescriptorUI") or ""
+                name = element.findtext("DescriptorName/String") or ""
+                if ui and name:
+                    index = len(descriptors)
+                    descriptors.append([ui, name])
+                    names.setdefault(cls.normalize(name), index)
+                    for term in element.iterfind("ConceptList/Concept/TermList/Term/String"):
+                        entry_terms.setdefault(cls.normalize(term.text or ""), index)
+                element.clear()
+
+        if not descriptors:
+            raise Exception(f"No MeSH descriptor records found in {source}")
+
+        # A descriptor's own name wins over another descriptor's entry term
+        entry_terms.update(names)
+        entry_terms.pop("", None)
+        keys = sorted((key.encode("utf-8"), index) for key, index in entry_terms.items())
+
+        offsets = array("I", [0])
+        targets = array("I")
+        parent = os.path.dirname(os.path.abspath(directory))
+        os.makedirs(parent, exist_ok=True)
+        staging = tempfile.mkdtemp(dir=parent)
+        with open(os.path.join(staging, "heap.bin"), "wb") as heap:
+            for key, index in keys:
+                heap.write(key)
+                offsets.append(offsets[-1] + len(key))
+                targets.append(index)
+        with open(os.path.join(staging, "offsets.bin"), "wb") as handle:
+            offsets.tofile(handle)
+        with open(os.path.join(staging, "targets.bin"), "wb") as handle:
+            targets.tofile(handle)
+        with open(os.path.join(staging, "descriptors.json"), "w", encoding="utf-8") as handle:
+            json.dump(descriptors, handle)
+        try:
+            os.replace(staging, directory)
+        except OSError:
+            shutil.rmtree(staging, ignore_errors=True)  # Another process finished the same build first
+        return cls(directory)
+
+    def _key(self, position: int) -> bytes:
+        return self._heap[self._offsets[position]:self._offsets[position + 1]]
+
+    def _lower_bound(self, key: bytes, low: int) -> int:
+        high = self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self._key(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def match(self, words: List[str], start: int) -> Tuple[int, Optional[int]]:
+        """
+        Longest entry term starting at words[start].
+
+        Args:
+            words: Normalized query words
+            start: Index of the first word
+
+        Returns:
+            (index after the last matched word, descriptor number), or
+            (start, None) if no entry term starts here
+        """
+        best: Tuple[int, Optional[int]] = (start, None)
+        prefix = b""
+        low = 0
+        for end in range(start, len(words)):
+            prefix = (prefix + b" " if prefix else b"") + words[end].encode("utf-8")
+            # Keys only contain word characters and single spaces, and the space sorts
+            # first, so the smallest key >= prefix is the prefix itself or an extension
+            low = self._lower_bound(prefix, low)
+            if low >= self.count:
+                break
+            key = self._key(low)
+            if key == prefix:
+                best = (end + 1, self._targets[low])
+            elif not key.startswith(prefix + b" "):
+                break
+        return best
+
+    def segment(self, text: str) -> List[Tuple[str, Optional[List[str]]]]:
+        """
+        Split free text into MeSH entry-term matches and unmatched runs.
+
+        Args:
+            text: Free-text query term
+
+        Returns:
+            (original text of the run, [MeSH UI, descriptor name] or None) in order
+        """
+        spans = [(match.start(), match.end()) for match in self._WORD_RE.finditer(text)]
+        words = [text[start:end].lower() for start, end in spans]
+        segments: List[Tuple[str, Optional[List[str]]]] = []
+        unmatched_from = None
+        position = 0
+        while position < len(words):
+            end, descriptor = self.match(words, position)
+            if descriptor is None or (end - position == 1 and len(words[position]) < 3):
+                if unmatched_from is None:
+                    unmatched_from = position
+                position += 1
+                continue
+            if unmatched_from is not None:
+                segments.append((text[spans[unmatched_from][0]:spans[position - 1][1]], None))
+                unmatched_from = None
+            segments.append((text[spans[position][0]:spans[end - 1][1]], self.descriptors[descriptor]))
+            position = end
+        if unmatched_from is not None:
+            segments.append((text[spans[unmatched_from][0]:spans[-1][1]], None))
+        return segments
+
+
+_TITLE_PREFIX_RE = re.compile(
+    r"^(erratum|corrigendum|correction|retraction|retracted|expression of concern)"
+    r"( to| for| of| notice)?[:\s]+",
+    re.IGNORECASE
+)
+
+
+@lru_cache(maxsize=65536)
+def _word_hash(word: str) -> int:
+    """Stable 64-bit hash of a word (independent of PYTHONHASHSEED)."""
+    return int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def _word_hashes(text: str) -> List[int]:
+    """Hashes of the normalized words of a text, in order."""
+    return [_word_hash(word) for word in re.findall(r"[a-z0-9]+", text.lower())]
+
+
+_MASK64 = (1 << 64) - 1
+_MIX1, _MIX2 = 0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F
+_FIN1, _FIN2 = 0xBF58476D1CE4E5B9, 0x94D049BB133111EB
+
+
+def _simhash_fingerprints(hash_lists: List[List[int]]) -> List[int]:
+    """
+    Compute 64-bit SimHash fingerprints over word 3-shingles for many documents.
+
+    Shingle hashes are derived from word hashes with a multiply-xor mix and a
+    splitmix64 finalizer. With NumPy this runs over all documents at once: the
+    shingle hashes are unpacked into one (shingles x 64) bit matrix and summed
+    per document with a single reduceat. Without NumPy the same arithmetic runs
+    in pure Python. Documents with fewer than 3 words get fingerprint 0.
+    """
+    if np is not None:
+        lengths = np.array([len(hashes) for hashes in hash_lists], dtype=np.int64)
+        shingle_counts = np.maximum(lengths - 2, 0)
+        fingerprints = np.zeros(len(hash_lists), dtype=np.uint64)
+        non_empty = np.nonzero(shingle_counts)[0]
+        if not len(non_empty):
+            return [0] * len(hash_lists)
+
+        flat = np.fromiter(
+            (h for hashes in hash_lists for h in hashes), dtype=np.uint64, count=int(lengths.sum())
+        )
+        # Shingle i of the flat array is valid when words i..i+2 belong to one document
+        starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        valid = np.zeros(max(len(flat) - 2, 0), dtype=bool)
+        for start, count in zip(starts[non_empty], shingle_counts[non_empty]):
+            valid[start:start + count] = True
+        first, second, third = flat[:-2][valid], flat[1:-1][valid], flat[2:][valid]
+
+        shingles = first ^ (second * np.uint64(_MIX1)) ^ (third * np.uint64(_MIX2))
+        shingles ^= shingles >> np.uint64(30)
+        shingles *= np.uint64(_FIN1)
+        shingles ^= shingles >> np.uint64(27)
+        shingles *= np.uint64(_FIN2)
+        shingles ^= shingles >> np.uint64(31)
+
+        bits = np.unpackbits(shingles.astype("<u8").view(np.uint8).reshape(-1, 8), axis=1, bitorder="little")
+        offsets = np.concatenate(([0], np.cumsum(shingle_counts[non_empty])[:-1]))
+        ones = np.add.reduceat(bits, offsets, axis=0, dtype=np.int32)
+        majority = 2 * ones > shingle_counts[non_empty][:, None]
+        fingerprints[non_empty] = np.packbits(majority, axis=1, bitorder="little").view("<u8").ravel()
+        return [int(fp) for fp in fingerprints]
+
+    fingerprints = []
+    for hashes in hash_lists:
+        ones = [0] * 64
+        count = max(len(hashes) - 2, 0)
+        for i in range(count):
+            h = (hashes[i] ^ (hashes[i + 1] * _MIX1) ^ (hashes[i + 2] * _MIX2)) & _MASK64
+            h ^= h >> 30
+            h = (h * _FIN1) & _MASK64
+            h ^= h >> 27
+            h = (h * _FIN2) & _MASK64
+            h ^= h >> 31
+            for bit in range(64):
+                ones[bit] += (h >> bit) & 1
+        fingerprints.append(sum(1 << bit for bit in range(64) if 2 * ones[bit] > count))
+    return fingerprints
+
+
+def _near_duplicate_clusters(articles: List[Dict[str, Any]], max_distance: int = 3) -> List[List[int]]:
+    """
+    Group near-duplicate articles (errata, preprint/published pairs, repeated
+    conference abstracts).
+
+    Two articles are duplicates when their normalized titles match (after
+    stripping prefixes such as "Erratum:") or when the SimHash fingerprints of
+    title + abstract differ in at most max_distance bits. Candidate pairs come
+    from 16-bit band buckets (any two fingerprints within 3 bits share a band),
+    so the run time stays roughly linear in the number of articles.
+
+    Args:
+        articles: Parsed article dictionaries
+        max_distance: Maximum Hamming distance between fingerprints
+
+    Returns:
+        Clusters as lists of indices into articles, each in original order;
+        singletons included
+    """
+    parent = list(range(len(articles)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(i, j):
+        root_i, root_j = find(i), find(j)
+        if root_i != root_j:
+            parent[max(root_i, root_j)] = min(root_i, root_j)
+
+    titles: Dict[str, int] = {}
+    texts = []
+    for i, article in enumerate(articles):
+        title = _TITLE_PREFIX_RE.sub("", (article.get("title") or "").strip())
+        title = " ".join(re.findall(r"[a-z0-9]+", title.lower()))
+        if len(title) > 20:
+            if title in titles:
+                union(titles[title], i)
+            else:
+                titles[title] = i
+        abstract = article.get("abstract") or ""
+        if abstract == "No abstract available":
+            abstract = ""
+        texts.append(f"{title} {abstract}")
+
+    hash_lists = [_word_hashes(text) for text in texts]
+    fingerprints = _simhash_fingerprints(hash_lists)
+    bands: Dict[tuple, List[int]] = {}
+    for i, fingerprint in enumerate(fingerprints):
+        if len(hash_lists[i]) < 10:  # Too little text for a meaningful signature
+            continue
+        for band in range(4):
+            bucket = bands.setdefault((band, (fingerprint >> (16 * band)) & 0xFFFF), [])
+            for j in bucket:
+                if bin(fingerprint ^ fingerprints[j]).count("1") <= max_distance:
+                    union(i, j)
+            bucket.append(i)
+
+    clusters: Dict[int, List[int]] = {}
+    for i in range(len(articles)):
+        clusters.setdefault(find(i), []).append(i)
+    return list(clusters.values())
+
+
 class Tools:
     """
     OpenWebUI Tool class for PubMed literature search.
 
-    This tool allows the LLM to search PubMed for scientific literature
-    with advanced filtering options including date range, author, journal,
-    and publication type filters.
-    """
+    This tool allows the LLM to search PubMed for scientific literature
+    with advanced filtering options including date range, author, journal,
+    and publication type filters.
+    """
+
+    class Valves(BaseModel):
+        """Configuration valves for the PubMed Search Tool."""
+        NCBI_API_KEY: str = Field(
+            default="",
+            description="Optional NCBI API key for higher rate limits (10 req/sec vs 3 req/sec)"
+        )
+        NCBI_EMAIL: str = Field(
+            default="",
+            description="Email address for NCBI API identification (recommended)"
+        )
+        MAX_RESULTS: int = Field(
+            default=10,
+            description="Default maximum number of results to return",
+            ge=1,
+            le=100
+        )
+        CACHE_DIR: str = Field(
+            default="",
+            description="Directory for persistent caches, indexes, saved searches and exports (empty = system temp directory)"
+        )
+        RESPONSE_CACHE_MB: int = Field(
+            default=64,
+            description="In-memory cache for compressed E-utilities responses, per worker process (MB)",
+            ge=1,
+            le=4096
+        )
+        RESPONSE_CACHE_TTL: int = Field(
+            default=3600,
+            description="Seconds before a cached response is revalidated with NCBI",
+            ge=0
+        )
+        SHARED_CACHE_TTL: int = Field(
+            default=86400,
+            description="Seconds responses and parsed records stay in the host-wide shared cache",
+            ge=60
+        )
+        RECORD_CACHE_SIZE: int = Field(
+            default=2000,
+            description="Parsed articles kept in memory per worker process",
+            ge=0
+        )
+        COORDINATION: str = Field(
+            default="sqlite",
+            description="Host-wide rate limiter and cache shared by worker processes: sqlite, none or a redis:// URL"
+        )
+        MAX_WORKERS: int = Field(
+            default=3,
+            description="Concurrent E-utilities requests per tool call (still paced by the NCBI rate limit)",
+            ge=1,
+            le=10
+        )
+        STREAM_CHUNK_KB: int = Field(
+            default=64,
+            description="Chunk size for streaming response bodies into the parser and cache (KB)",
+            ge=4,
+            le=4096
+        )
+        REQUEST_TIMEOUT: int = Field(
+            default=30,
+            description="Timeout for search, summary and link requests in seconds (efetch timeouts adapt to batch size)",
+            ge=5,
+            le=300
+        )
+        CALL_TIMEOUT: int = Field(
+            default=120,
+            description="Seconds a tool call may wait for rate-limit capacity before giving up",
+            ge=5,
+            le=600
+        )
+        PARSER_BACKEND: Literal["streaming", "buffered"] = Field(
+            default="streaming",
+            description="streaming parses efetch bodies while they download; buffered downloads the whole body first and parses it in one pass"
+        )
+        PREFETCH: bool = Field(
+            default=False,
+            description="Warm caches for likely follow-up calls in the background using spare rate-limit capacity"
+        )
+        MESH_EXPANSION: bool = Field(
+            default=False,
+            description="Expand free-text query terms with MeSH descriptors (requires MESH_SOURCE)"
+        )
+        MESH_SOURCE: str = Field(
+            default="",
+            description="Path of the MeSH descriptor XML (desc20XX.xml[.gz]) or of a directory with a built index"
+        )
+
+    def __init__(self, warm_start: bool = False):
+        """
+        Initialize the PubMed Search Tool.
+
+        Args:
+            warm_start: Run _warm_up in a background thread on construction
+        """
+        self.valves = self.Valves()
+        self.base_url_search = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esearch.fcgi"
+        self.base_url_fetch = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/efetch.fcgi"
+        self.base_url_summary = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esummary.fcgi"
+        self.base_url_link = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/elink.fcgi"
+        self._min_request_interval = 0.34  # 3 requests per second max without API key
+        self._scheduler = _RequestScheduler()
+        self._interactive_deadline = 120  # Seconds an interactive call may wait for rate-limit slots
+        self._prefetch = False  # Warm caches for likely follow-up calls in the background
+        self._prefetcher = _Prefetcher()
+        self._prefetch_budget = 6  # E-utilities requests per prefetch run
+        self._prefetch_timeout = 30  # Seconds a prefetch run may wait for spare rate-limit capacity
+        self._prefetch_top_hits = 5  # Abstracts prefetched after a metadata-only search
+        self._session = None  # Created on first request (or by _warm_up)
+        self._session_lock = threading.Lock()
+        self._response_cache = _ResponseCache()
+        self._response_cache_ttl = 3600  # Seconds before a cached response is revalidated
+        self._coordination = "sqlite"  # Host-wide limiter/cache backend: "sqlite", "none" or a redis:// URL
+        self._shared_backend = None  # Created from _coordination on first use (or assigned directly)
+        self._shared_backend_lock = threading.Lock()
+        self._shared_cache_ttl = 86400  # Seconds responses and records stay in the shared backend
+        self._shared_response_max_bytes = 1024 * 1024  # Larger responses (full texts, export chunks) are not shared
+        self._shared_response_written = 0  # Bytes of responses shared since the last trim
+        self._shared_trim_lock = threading.Lock()
+        self._max_workers = 3  # Concurrent E-utilities requests (still paced by _rate_limit)
+        self._record_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._record_cache_size = 2000  # Parsed efetch records kept in memory (LRU)
+        self._fragment_cache: "OrderedDict[Tuple[str, str], Tuple[int, str, str]]" = OrderedDict()
+        self._fragment_cache_size = 4000  # Rendered Markdown fragments (per record and detail level)
+        self._record_lock = threading.Lock()  # Guards _record_cache and _fragment_cache (request, worker and prefetch threads)
+        self._batch_sizer = _AdaptiveBatchSizer()
+        self._cursor_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._cursor_cache_size = 256
+        self._cursor_ttl = 3600  # Seconds a pagination cursor stays valid
+        self._saved_search_max_ids = 10000  # PMIDs tracked per saved search (newest first)
+        self._export_chunk_size = 200  # PMIDs per efetch in export jobs (fixed per job for resumption)
+        self._export_time_budget = 240  # Seconds one export_records call works before reporting progress
+        self._collapse_duplicates = True  # Merge near-duplicate records in formatted output
+        self._rerank_overfetch = 5  # Candidates fetched per returned result when re-ranking
+        self._cache_dir = os.path.join(tempfile.gettempdir(), "pubmed_search_tool")
+        self._embedding_model = ""  # sentence-transformers model name; empty = hashed features
+        self._semantic_index: Optional[_VectorIndex] = None
+        self._embedder: Optional[_TextEmbedder] = None
+        self._semantic_lock = threading.Lock()
+        self._columnar_stores: Dict[str, _ColumnarStore] = {}
+        self._mesh_expansion = False  # Expand free-text query terms with MeSH descriptors and entry terms
+        self._mesh_source = ""  # MeSH descriptor XML (desc20XX.xml[.gz]) or a directory with a built index
+        self._mesh_index: Optional[_MeshIndex] = None
+        self._mesh_index_error = ""  # Set when the index could not be built, so it is not retried per call
+        self._mesh_lock = threading.Lock()
+        self._request_timeout = 30  # Seconds per esearch/esummary/elink request
+        self._stream_chunk_size = 65536  # Bytes per chunk when streaming response bodies
+        self._parser_backend = "streaming"  # "streaming" or "buffered" efetch parsing
+        self._warm_start = warm_start
+        self._warm_up_timings: Dict[str, float] = {}
+        self._applied_valves = self.valves.model_dump()
+
+        if self._warm_start:
+            threading.Thread(target=self._warm_up, name="pubmed-warm-up", daemon=True).start()
+
+    def _apply_valves(self):
+        """
+        Bring the tool's settings in line with the current valve values.
+
+        OpenWebUI assigns self.valves after construction and again whenever an
+        administrator saves new values, so this runs at the start of every
+        tool call. Only valves changed since the last call are applied;
+        settings assigned directly on the instance stay in effect until their
+        valve is edited. State tied to a changed setting (backend connection,
+        on-disk indexes) is reopened on next use.
+        """
+        values = self.valves.model_dump()
+        changed = {name for name, value in values.items() if self._applied_valves.get(name) != value}
+        if not changed:
+            return
+        self._applied_valves = values
+
+        if "NCBI_API_KEY" in changed:
+            self._min_request_interval = 0.1 if values["NCBI_API_KEY"] else 0.34  # 10 vs 3 requests per second
+        if "CACHE_DIR" in changed:
+            self._cache_dir = os.path.expanduser(values["CACHE_DIR"]) or os.path.join(tempfile.gettempdir(), "pubmed_search_tool")
+            with self._semantic_lock:
+                self._semantic_index = None
+            self._columnar_stores = {}
+        if "COORDINATION" in changed:
+            self._coordination = values["COORDINATION"].strip()
+        if changed & {"CACHE_DIR", "COORDINATION"}:
+            with self._shared_backend_lock:
+                self._shared_backend = None
+        if "MESH_EXPANSION" in changed:
+            self._mesh_expansion = values["MESH_EXPANSION"]
+        if "MESH_SOURCE" in changed:
+            self._mesh_source = values["MESH_SOURCE"]
+        if changed & {"CACHE_DIR", "MESH_EXPANSION", "MESH_SOURCE"}:
+            with self._mesh_lock:
+                self._mesh_index = None
+                self._mesh_index_error = ""
+        if "RESPONSE_CACHE_MB" in changed:
+            self._response_cache.resize(values["RESPONSE_CACHE_MB"] * 1024 * 1024)
+        settings = {
+            "RESPONSE_CACHE_TTL": ("_response_cache_ttl", 1),
+            "SHARED_CACHE_TTL": ("_shared_cache_ttl", 1),
+            "RECORD_CACHE_SIZE": ("_record_cache_size", 1),
+            "MAX_WORKERS": ("_max_workers", 1),
+            "STREAM_CHUNK_KB": ("_stream_chunk_size", 1024),
+            "REQUEST_TIMEOUT": ("_request_timeout", 1),
+            "CALL_TIMEOUT": ("_interactive_deadline", 1),
+            "PARSER_BACKEND": ("_parser_backend", None),
+            "PREFETCH": ("_prefetch", None),
+        }
+        for name, (attribute, scale) in settings.items():
+            if name in changed:
+                setattr(self, attribute, values[name] * scale if scale else values[name])
+        if "RECORD_CACHE_SIZE" in changed:
+            with self._record_lock:
+                while len(self._record_cache) > self._record_cache_size:
+                    self._record_cache.popitem(last=False)
+
+    def _get_session(self):
+        """Shared requests.Session (connection pool), created on first use."""
+        with self._session_lock:
+            if self._session is None:
+                self._session = requests.Session()
+            return self._session
+
+    def _get_shared_backend(self):
+        """
+        Coordination backend shared by all worker processes on the host, or None.
+
+        Falls back to process-local limiting and caching (returns None) when
+        coordination is disabled or the backend cannot be opened.
+        """
+        with self._shared_backend_lock:
+            if self._shared_backend is None and self._coordination not in ("", "none"):
+                try:
+                    if self._coordination.startswith(("redis://", "rediss://", "unix://")):
+                        if redis is None:
+                            raise Exception("redis package not installed")
+                        self._shared_backend = _RedisBackend(redis.Redis.from_url(self._coordination))
+                    else:
+                        self._shared_backend = _SQLiteBackend(os.path.join(self._cache_dir, "coordination.sqlite3"))
+                except Exception:
+                    self._coordination = "none"
+            return self._shared_backend
+
+    def _warm_up(self, open_connection: bool = True) -> Dict[str, float]:
+        """
+        Pay the first-call costs ahead of time.
+
+        Imports the optional heavy dependencies, creates the HTTP session,
+        opens the shared backend, primes the rate limiter by taking one slot
+        (which also creates the host-wide slot schedule), spends that slot on a
+        HEAD request that leaves a pooled TCP/TLS connection to NCBI open, and
+        loads the semantic and MeSH indexes from disk.
+        Failures are recorded and ignored; the first real call then simply
+        does the remaining work itself.
+
+        Args:
+            open_connection: Whether to prime the rate limiter and pre-open the
+                             connection to NCBI (costs one rate-limit slot)
+
+        Returns:
+            Seconds spent per warm-up step (also kept in _warm_up_timings)
+        """
+        def connect():
+            self._get_session().head(self.base_url_search, timeout=self._request_timeout).close()
+
+        steps = [
+            ("imports", lambda: [module._load() for module in (requests, np, sparse, zstandard) if module is not None]),
+            ("session", self._get_session),
+            ("shared_backend", self._get_shared_backend),
+            ("rate_limiter", self._rate_limit),
+            ("connection", connect),
+            ("semantic_index", self._get_semantic_index),
+            ("mesh_index", self._get_mesh_index),
+        ]
+        if not open_connection:
+            steps = [step for step in steps if step[0] not in ("rate_limiter", "connection")]
+
+        for name, step in steps:
+            start = time.perf_counter()
+            try:
+                step()
+            except Exception:
+                pass
+            self._warm_up_timings[name] = time.perf_counter() - start
+        return dict(self._warm_up_timings)
+
+    def _get_mesh_index(self) -> Optional[_MeshIndex]:
+        """
+        MeSH vocabulary index for query expansion, or None when disabled.
+
+        _mesh_source may name a directory that already holds a built index;
+        descriptor XML is indexed once into the cache directory, keyed by the
+        file's path, size and modification time so a new MeSH release is
+        picked up automatically.
+        """
+        if not self._mesh_expansion or not self._mesh_source:
+            return None
+        with self._mesh_lock:
+            if self._mesh_index is None and not self._mesh_index_error:
+                try:
+                    source = os.path.expanduser(self._mesh_source)
+                    if os.path.isfile(os.path.join(source, "descriptors.json")):
+                        self._mesh_index = _MeshIndex(source)
+                    else:
+                        info = os.stat(source)
+                        digest = hashlib.sha1(f"{os.path.abspath(source)}:{info.st_size}:{info.st_mtime_ns}".encode("utf-8")).hexdigest()[:12]
+                        directory = os.path.join(self._cache_dir, "mesh", digest)
+                        if os.path.isfile(os.path.join(directory, "descriptors.json")):
+                            self._mesh_index = _MeshIndex(directory)
+                        else:
+                            self._mesh_index = _MeshIndex.build(source, directory)
+                except Exception as e:
+                    self._mesh_index_error = str(e)
+            return self._mesh_index
+
+    def _query_plan(self, query: str, **filters) -> _QueryPlan:
+        """_QueryPlan for a tool call, with MeSH expansion when it is enabled."""
+        return _QueryPlan(query, mesh_index=self._get_mesh_index(), **filters)
+
+    def _rate_limit(self):
+        """
+        Ensure we don't exceed NCBI rate limits (safe to call from worker threads).
+
+        Waits for a slot from the in-process scheduler using the priority,
+        tenant and deadline of the current request scope, then reserves a slot
+        in the host-wide schedule of the shared backend so that all worker
+        processes together stay within the limit. Speculative requests are
+        charged to their prefetch run's budget first.
+        """
+        context = _REQUEST_CONTEXT.get() or {}
+        if context.get("priority") == "prefetch":
+            self._prefetcher.charge(context)
+        deadline = context.get("deadline")
+        self._scheduler.acquire(
+            self._min_request_interval,
+            priority=context.get("priority", "interactive"),
+            tenant=context.get("tenant", "default"),
+            deadline=deadline
+        )
+        backend = self._get_shared_backend()
+        if backend is not None:
+            if deadline is not None:
+                deadline = time.time() + deadline - time.monotonic()
+            backend.reserve_slot("eutils", self._min_request_interval, deadline)
+
+    @contextmanager
+    def _request_scope(
+        self,
+        priority: str = "interactive",
+        user: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None,
+        budget: Optional[int] = None,
+        cancel: Optional[threading.Event] = None
+    ):
+        """
+        Tag the E-utilities requests made inside this block for the scheduler.
+
+        Args:
+            priority: "interactive" for chat tool calls, "batch" for bulk work,
+                      "prefetch" for speculative cache warming
+            user: OpenWebUI __user__ dict; its id is the fair-queuing tenant
+            timeout: Seconds from now after which waiting requests are abandoned
+                     (defaults to _interactive_deadline for interactive calls)
+            budget: Maximum number of requests (prefetch scopes)
+            cancel: Event that stops further requests when set (prefetch scopes)
+        """
+        self._apply_valves()
+        if timeout is None and priority == "interactive":
+            timeout = self._interactive_deadline
+        token = _REQUEST_CONTEXT.set({
+            "priority": priority,
+            "tenant": str((user or {}).get("id") or "default"),
+            "deadline": time.monotonic() + timeout if timeout else None,
+            "budget": [budget],
+            "cancel": cancel or threading.Event(),
+        })
+        try:
+            yield
+        finally:
+            _REQUEST_CONTEXT.reset(token)
+
+    def _http_get(
+        self,
+        url: str,
+        params: Dict[str, Any],
+        timeout: float,
+        stats: Optional[Dict[str, Any]] = None,
+        refresh: bool = False,
+        sink=None
+    ) -> bytes:
+        """
+        Perform a rate-limited E-utilities GET through the raw response cache.
+
+        Fresh cache hits are served without a request (and without waiting for
+        the rate limiter). Stale entries with HTTP validators are revalidated
+        with a conditional request; a 304 reuses the cached body.
+
+        The body is streamed: decoded chunks are compressed for the cache as
+        they arrive, and with a sink they are handed on directly, so the full
+        document is never assembled in memory (cached bodies are streamed to
+        the sink the same way).
+
+        Args:
+            url: E-utilities endpoint URL
+            params: Query parameters
+            timeout: Request timeout in seconds
+            stats: Optional dict filled with "network" (whether a request was
+                   sent), "seconds" (request time including the sink, excluding
+                   rate-limit waits) and "bytes" (body size)
+            refresh: Treat cached copies as stale, so they are revalidated
+            sink: Optional callable receiving the body in chunks instead of
+                  it being returned
+
+        Returns:
+            Raw (decompressed) response body as bytes, ready for json.loads
+            without an intermediate str copy (b"" when a sink is given)
+        """
+        if stats is None:
+            stats = {}
+        stats["network"] = False
+        cache = self._response_cache
+        key = cache.make_key(url, params)
+        entry = cache.get(key)
+        headers = {"Accept-Encoding": "gzip, deflate"}
+
+        def fresh(candidate):
+            return not refresh and candidate is not None and time.time() - candidate["stored"] < self._response_cache_ttl
+
+        speculative = (_REQUEST_CONTEXT.get() or {}).get("priority") == "prefetch"
+        def deliver(cached):
+            if sink is None:
+                return cache.decompress(cached)
+            for chunk in cache.iter_decompress(cached, chunk_size=self._stream_chunk_size):
+                sink(chunk)
+            return b""
+
+        if fresh(entry):
+            cache.count("hits")
+            if not speculative:
+                self._prefetcher.use(f"response:{key}")
+            return deliver(entry)
+
+        backend = self._get_shared_backend()
+        lock = None
+        if backend is not None:
+            # Another worker process may already have this response, or be fetching it right now
+            entry = self._load_shared_response(backend, key) or entry
+            lock = backend.acquire_lock(f"flight:{key}", timeout)
+            wait_until = time.time() + timeout
+            while lock is None and not fresh(entry) and time.time() < wait_until:
+                time.sleep(0.05)
+                entry = self._load_shared_response(backend, key) or entry
+                lock = backend.acquire_lock(f"flight:{key}", timeout)
+            if fresh(entry):
+                if lock is not None:
+                    backend.release_lock(f"flight:{key}", lock)
+                cache.count("hits")
+                return deliver(entry)
+
+        if entry is not None:
+            if entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        try:
+            self._rate_limit()
+            start = time.perf_counter()
+            with self._get_session().get(url, params=params, headers=headers, timeout=timeout, stream=True) as response:
+                stats["network"] = True
+                if response.status_code == 304 and entry is not None:
+                    cache.count("revalidations")
+                    cache.touch(key)
+                    body = deliver(entry)
+                    stats["bytes"] = 0
+                else:
+                    cache.count("misses")
+                    response.raise_for_status()
+                    chunks = []
+                    size = 0
+                    codec, compressor = cache.compressor()
+                    compressed = []
+                    for chunk in response.iter_content(chunk_size=self._stream_chunk_size):
+                        size += len(chunk)
+                        compressed.append(compressor.compress(chunk))
+                        if sink is None:
+                            chunks.append(chunk)
+                        else:
+                            sink(chunk)
+                    compressed.append(compressor.flush())
+                    body = b"".join(chunks)
+                    stats["bytes"] = size
+                    entry = cache.make_entry(codec, b"".join(compressed), response.headers)
+                    cache.put_entry(key, entry)
+            stats["seconds"] = time.perf_counter() - start
+
+            if backend is not None:
+                packed = cache.pack(entry)
+                if len(packed) <= self._shared_response_max_bytes:
+                    backend.set(f"response:{key}", packed, self._shared_cache_ttl)
+                    self._trim_shared_responses(backend, len(packed))
+            if speculative:
+                self._prefetcher.remember(f"response:{key}")
+            return body
+        finally:
+            if lock is not None:
+                backend.release_lock(f"flight:{key}", lock)
+
+    def _trim_shared_responses(self, backend, written: int):
+        """
+        Keep the shared responses within the response cache budget (RESPONSE_CACHE_MB).
+
+        Summing the stored entries takes a scan, so the backend is trimmed only
+        after this process has shared another sixteenth of the budget; each
+        worker can overshoot the cap by at most that much.
+        """
+        budget = self._response_cache.max_bytes
+        with self._shared_trim_lock:
+            self._shared_response_written += written
+            if self._shared_response_written < budget // 16:
+                return
+            self._shared_response_written = 0
+        backend.trim("response:", budget)
+
+    def _load_shared_response(self, backend, key: str) -> Optional[Dict[str, Any]]:
+        """Copy a response cached by another worker process into the local cache."""
+        blob = backend.get(f"response:{key}")
+        if blob is None:
+            return None
+        entry = self._response_cache.unpack(blob)
+        self._response_cache.put_entry(key, entry)
+        return entry
+
+    def _eutils_params(self, db: str, **params) -> Dict[str, Any]:
+        """Request parameters for one database plus the configured NCBI credentials."""
+        params["db"] = db
+        if self.valves.NCBI_API_KEY:
+            params["api_key"] = self.valves.NCBI_API_KEY
+        if self.valves.NCBI_EMAIL:
+            params["email"] = self.valves.NCBI_EMAIL
+        return params
+
+    def _esearch(self, db: str, term: str, timeout: Optional[float] = None, **params) -> Dict[str, Any]:
+        """
+        Run esearch against any Entrez database.
+
+        Args:
+            db: Entrez database (e.g., "pubmed", "pmc", "mesh")
+            term: Search term
+            timeout: Request timeout in seconds (default: _request_timeout)
+            **params: Further esearch parameters (retmax, retstart, sort, rettype, dates)
+
+        Returns:
+            The "esearchresult" object of the JSON response
+        """
+        params = self._eutils_params(db, term=term, retmode="json", **params)
+        return json.loads(self._http_get(self.base_url_search, params, timeout=timeout or self._request_timeout)).get("esearchresult", {})
+
+    def _efetch(
+        self,
+        db: str,
+        ids: List[str],
+        parser,
+        timeout: float = 60,
+        stats: Optional[Dict[str, Any]] = None,
+        refresh: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        Run efetch against any Entrez database, streaming the body into a parser.
+
+        The request format comes from _EFETCH_FORMATS; the body is fed to the
+        database's parser chunk by chunk as it arrives (or leaves the cache),
+        so large documents are never held in memory as a whole. With the
+        "buffered" parser backend the complete body is fed in one call.
+
+        Args:
+            db: Entrez database (e.g., "pubmed", "pmc")
+            ids: Database UIDs
+            parser: Object with feed(bytes) and close() -> records
+            timeout: Request timeout in seconds
+            stats: Optional dict receiving request statistics (see _http_get)
+            refresh: Revalidate a cached response instead of reusing it
+
+        Returns:
+            The parser's records
+        """
+        params = self._eutils_params(db, id=",".join(ids), **_EFETCH_FORMATS.get(db, {}))
+        if self._parser_backend == "buffered":
+            parser.feed(self._http_get(self.base_url_fetch, params, timeout=timeout, stats=stats, refresh=refresh))
+        else:
+            self._http_get(self.base_url_fetch, params, timeout=timeout, stats=stats, refresh=refresh, sink=parser.feed)
+        return parser.close()
+
+    def _esummary(self, db: str, ids: List[str], timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Run esummary (JSON) against any Entrez database.
+
+        Returns:
+            The "result" object of the JSON response ("uids" plus one entry per UID)
+        """
+        params = self._eutils_params(db, id=",".join(ids), retmode="json")
+        return json.loads(self._http_get(self.base_url_summary, params, timeout=timeout or self._request_timeout)).get("result", {})
+
+    def _elink(self, dbfrom: str, db: str, uid: str, linkname: str, timeout: Optional[float] = None) -> List[str]:
+        """
+        Run elink for one UID and return the linked UIDs of one link name.
+
+        Args:
+            dbfrom: Source database
+            db: Target database
+            uid: Source UID
+            linkname: ELink link name (e.g., pubmed_pubmed_citedin, pubmed_pmc)
+            timeout: Request timeout in seconds (default: _request_timeout)
+
+        Returns:
+            Linked UIDs in the order returned by NCBI
+        """
+        params = self._eutils_params(db, dbfrom=dbfrom, id=uid, linkname=linkname, retmode="json")
+        data = json.loads(self._http_get(self.base_url_link, params, timeout=timeout or self._request_timeout))
+
+        links = []
+        for linkset in data.get("linksets", []):
+            for linksetdb in linkset.get("linksetdbs", []):
+                if linksetdb.get("linkname") == linkname:
+                    links.extend(str(link) for link in linksetdb.get("links", []))
+        return links
+
+    def _build_search_query(
+        self,
+        query: str,
+        author: Optional[str] = None,
+        journal: Optional[str] = None,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        publication_type: Optional[str] = None
+    ) -> str:
+        """
+        Build a canonical PubMed search query with filters.
+
+        The query and filters are normalized through _QueryPlan (with MeSH
+        expansion when enabled). Date filters are not part of the term; they
+        are sent once as esearch parameters.
+
+        Args:
+            query: Main search terms
+            author: Author name filter
+            journal: Journal name/abbreviation filter
+            date_from: Start date (YYYY/MM/DD or YYYY), applied in _search_pubmed
+            date_to: End date (YYYY/MM/DD or YYYY), applied in _search_pubmed
+            publication_type: Publication type (e.g., Review, Clinical Trial)
+
+        Returns:
+            Formatted PubMed query string
+        """
+        return self._query_plan(
+            query,
+            author=author,
+            journal=journal,
+            publication_type=publication_type
+        ).term
+
+    def _search_pubmed(
+        self,
+        query: str,
+        max_results: int,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None
+    ) -> List[str]:
+        """
+        Search PubMed and return list of PMIDs.
+
+        Args:
+            query: Search query
+            max_results: Maximum number of results
+            date_from: Minimum date filter
+            date_to: Maximum date filter
+
+        Returns:
+            List of PMID strings
+        """
+        return self._search_pubmed_page(query, max_results, date_from, date_to)["ids"]
+
+    def _search_pubmed_page(
+        self,
+        query: str,
+        max_results: int,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        retstart: int = 0,
+        date_type: str = "pdat",
+        sort: str = "relevance"
+    ) -> Dict[str, Any]:
+        """
+        Search PubMed for one page of results.
+
+        Args:
+            query: Search query
+            max_results: Page size
+            date_from: Minimum date filter
+            date_to: Maximum date filter
+            retstart: Zero-based offset of the first PMID to return
+            date_type: Date the filter applies to ("pdat", "edat" or "mdat")
+            sort: esearch sort order (e.g., "relevance", "pub_date")
+
+        Returns:
+            Dictionary with "ids" (list of PMID strings) and "count" (total hits)
+        """
+        params = {
+            "retmax": max_results,
+            "sort": sort
+        }
+
+        if retstart:
+            params["retstart"] = retstart
+        params.update(_QueryPlan.build_date_params(date_from, date_to, date_type))
+
+        try:
+            result = self._esearch("pubmed", query, **params)
+            return {
+                "ids": result.get("idlist", []),
+                "count": int(result.get("count", 0) or 0)
+            }
+
+        except Exception as e:
+            raise Exception(f"PubMed search failed: {str(e)}")
+
+    def _count_pubmed(
+        self,
+        query: str,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None
+    ) -> int:
+        """
+        Number of PubMed records matching a search (esearch rettype=count, no IDs).
+
+        Args:
+            query: Search query
+            date_from: Minimum publication date filter
+            date_to: Maximum publication date filter
 
-    class Valves(BaseModel):
-        """Configuration valves for the PubMed Search Tool."""
-        NCBI_API_KEY: str = Field(
-            default="",
-            description="Optional NCBI API key for higher rate limits (10 req/sec vs 3 req/sec)"
-        )
-        NCBI_EMAIL: str = Field(
-            default="",
-            description="Email address for NCBI API identification (recommended)"
-        )
-        MAX_RESULTS: int = Field(
-            default=10,
-            description="Default maximum number of results to return",
-            ge=1,
-            le=100
-        )
+        Returns:
+            Total hit count
+        """
+        params = _QueryPlan.build_date_params(date_from, date_to)
 
-    def __init__(self):
-        """Initialize the PubMed Search Tool."""
-        self.valves = self.Valves()
-        self.base_url_search = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esearch.fcgi"
-        self.base_url_fetch = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/efetch.fcgi"
-        self._last_request_time = 0
-        self._min_request_interval = 0.34  # 3 requests per second max without API key
+        try:
+            return int(self._esearch("pubmed", query, rettype="count", **params).get("count", 0) or 0)
 
-    def _rate_limit(self):
-        """Ensure we don't exceed NCBI rate limits."""
-        elapsed = time.time() - self._last_request_time
-        if elapsed < self._min_request_interval:
-            time.sleep(self._min_request_interval - elapsed)
-        self._last_request_time = time.time()
+        except Exception as e:
+            raise Exception(f"PubMed count failed: {str(e)}")
 
-    def _build_search_query(
+    def _count_buckets(self, requests_by_label: Dict[str, Tuple[str, Optional[str], Optional[str]]]) -> Dict[str, int]:
+        """
+        Run several count queries concurrently under the shared rate limiter.
+
+        Args:
+            requests_by_label: Bucket label -> (query, date_from, date_to)
+
+        Returns:
+            Bucket label -> hit count, in the order given
+        """
+        context = contextvars.copy_context()
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            counts = executor.map(
+                lambda request: context.copy().run(self._count_pubmed, *request),
+                requests_by_label.values()
+            )
+            return dict(zip(requests_by_label, counts))
+
+    def _search_all_ids(
         self,
         query: str,
-        author: Optional[str] = None,
-        journal: Optional[str] = None,
+        limit: int,
         date_from: Optional[str] = None,
         date_to: Optional[str] = None,
-        publication_type: Optional[str] = None
+        date_type: str = "pdat"
+    ) -> List[str]:
+        """
+        Collect up to limit PMIDs for a search, newest first.
+
+        esearch returns no PMIDs past the first 10,000 of a search, so larger
+        result sets are collected over consecutive date windows, newest first,
+        halving each window until it holds at most 10,000 records.
+
+        Args:
+            query: Search query
+            limit: Maximum number of PMIDs to collect
+            date_from: Minimum date filter
+            date_to: Maximum date filter
+            date_type: Date the filter applies to ("pdat", "edat" or "mdat")
+
+        Returns:
+            List of PMID strings
+
+        Raises:
+            Exception: If fewer than min(limit, hit count) PMIDs could be collected
+        """
+        ids: List[str] = []
+
+        def collect(start: Optional[date], end: Optional[date]) -> int:
+            needed = limit - len(ids)
+            window = (start.strftime("%Y/%m/%d"), end.strftime("%Y/%m/%d")) if start else (date_from, date_to)
+            page = self._search_pubmed_page(query, min(10000, needed), *window, date_type=date_type, sort="pub_date")
+            if page["count"] <= 10000 or len(page["ids"]) >= needed:
+                ids.extend(page["ids"][:needed])
+                return page["count"]
+            if start is None:
+                start, end = _QueryPlan.date_bounds(date_from, date_to)
+            if start >= end:
+                raise Exception(f"More than 10,000 records on {start:%Y/%m/%d}; narrow the search")
+            middle = start + (end - start) // 2
+            for window_start, window_end in ((middle + timedelta(days=1), end), (start, middle)):
+                if len(ids) < limit:
+                    collect(window_start, window_end)
+            return page["count"]
+
+        total = collect(None, None)
+        if len(ids) < min(limit, total):
+            raise Exception(f"Only {len(ids):,} of {min(limit, total):,} PMIDs could be retrieved from esearch")
+        return ids
+
+    def _store_cursor(self, state: Dict[str, Any]) -> str:
+        """
+        Save pagination state server-side and return an opaque cursor token.
+
+        Each token maps to an immutable page description, so re-using a cursor
+        returns the same page instead of silently advancing. Cursors live in the
+        shared coordination backend, so a follow-up call may land on any worker;
+        only with coordination disabled are they kept in this process.
+        """
+        token = secrets.token_urlsafe(9)
+        backend = self._get_shared_backend()
+        if backend is not None:
+            backend.set(f"cursor:{token}", json.dumps(state).encode("utf-8"), self._cursor_ttl)
+            return token
+        self._cursor_cache[token] = {"state": dict(state), "created": time.time()}
+        while len(self._cursor_cache) > self._cursor_cache_size:
+            self._cursor_cache.popitem(last=False)
+        return token
+
+    def _load_cursor(self, token: str) -> Optional[Dict[str, Any]]:
+        """Return the pagination state for a cursor, or None if unknown/expired."""
+        token = token.strip()
+        backend = self._get_shared_backend()
+        if backend is not None:
+            blob = backend.get(f"cursor:{token}")
+            return json.loads(blob) if blob is not None else None
+        entry = self._cursor_cache.get(token)
+        if entry is None:
+            return None
+        if time.time() - entry["created"] > self._cursor_ttl:
+            del self._cursor_cache[token]
+            return None
+        return dict(entry["state"])
+
+    def _fetch_article_details(
+        self,
+        pmids: List[str],
+        timeout: float = 60,
+        stats: Optional[Dict[str, Any]] = None,
+        refresh: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        Fetch detailed article information including abstracts.
+
+        Args:
+            pmids: List of PubMed IDs
+            timeout: Request timeout in seconds
+            stats: Optional dict receiving request statistics (see _http_get)
+            refresh: Revalidate a cached response instead of reusing it
+
+        Returns:
+            List of article dictionaries
+        """
+        if not pmids:
+            return []
+
+        try:
+            # Records are built while the body is still arriving
+            parser = _PubMedStreamParser(self._parse_article_element)
+            return self._efetch("pubmed", pmids, parser, timeout=timeout, stats=stats, refresh=refresh)
+
+        except ET.ParseError as e:
+            raise Exception(f"Failed to fetch article details: Failed to parse PubMed XML: {str(e)}")
+        except _PrefetchStopped:
+            raise
+        except Exception as e:
+            raise Exception(f"Failed to fetch article details: {str(e)}")
+
+    def _cache_records(self, articles: List[Dict[str, Any]], share: bool = True):
+        """
+        Store fully parsed records in the LRU record cache.
+
+        Args:
+            articles: Parsed article dictionaries
+            share: Also publish them to the shared backend for other worker processes
+        """
+        with self._record_lock:
+            for article in articles:
+                pmid = article.get("pmid")
+                if not pmid:
+                    continue
+                self._record_cache[pmid] = article
+                self._record_cache.move_to_end(pmid)
+                # A new copy of the record invalidates its rendered fragments
+                for detail_level in ("full", "metadata"):
+                    self._fragment_cache.pop((pmid, detail_level), None)
+            while len(self._record_cache) > self._record_cache_size:
+                self._record_cache.popitem(last=False)
+        self._index_records(articles)
+
+        backend = self._get_shared_backend() if share else None
+        if backend is not None:
+            backend.set_many(
+                {
+                    f"record:{article['pmid']}": json.dumps(
+                        article.to_json() if isinstance(article, _PubMedRecord) else article
+                    ).encode("utf-8")
+                    for article in articles if article.get("pmid")
+                },
+                self._shared_cache_ttl
+            )
+
+    def _saved_search_path(self, name: str, user: Optional[Dict[str, Any]] = None) -> str:
+        """File holding one user's saved search."""
+        tenant = re.sub(r"[^A-Za-z0-9_.-]+", "_", str((user or {}).get("id") or "default"))
+        return os.path.join(self._cache_dir, "saved_searches", tenant, re.sub(r"[^A-Za-z0-9_.-]+", "_", name) + ".json")
+
+    def _load_saved_search(self, path: str) -> Optional[Dict[str, Any]]:
+        """Read a saved search, or return None if it does not exist."""
+        try:
+            with open(path, "r", encoding="utf-8") as handle:
+                return json.load(handle)
+        except FileNotFoundError:
+            return None
+
+    def _store_saved_search(self, path: str, state: Dict[str, Any]):
+        """Write a saved search atomically (a crash never leaves a truncated file)."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as handle:
+            json.dump(state, handle)
+        os.replace(temp_path, path)
+
+    def _run_export_job(self, job: _ExportJob, time_budget: float) -> bool:
+        """
+        Fetch a job's pending chunks concurrently until done or out of time.
+
+        Workers share the rate limiter in the caller's (batch) scope. A chunk
+        that fails three times stops the run; everything checkpointed so far
+        is kept for the next call.
+
+        Returns:
+            False if the run stopped because of request failures
+        """
+        stop_at = time.monotonic() + time_budget
+        context = contextvars.copy_context()
+        failed = threading.Event()
+
+        def export_chunk(index):
+            if failed.is_set() or time.monotonic() >= stop_at:
+                return
+            pmids = job.chunk_ids(index)
+            for attempt in range(3):
+                try:
+                    articles = self._fetch_article_details(pmids, timeout=self._batch_sizer.timeout(len(pmids)))
+                    break
+                except Exception:
+                    if attempt == 2:
+                        failed.set()
+                        return
+            # Export the extended fields too; the XML slice itself is not written
+            job.record_chunk(index, [
+                dict(article, **{name: article[name] for name in _PubMedRecord.LAZY_FIELDS}) for article in articles
+            ])
+
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            list(executor.map(lambda index: context.copy().run(export_chunk, index), job.pending_chunks()))
+        return not failed.is_set()
+
+    def _get_semantic_index(self) -> Optional[_VectorIndex]:
+        """Open (once) the on-disk semantic index, or return None without NumPy."""
+        if np is None:
+            return None
+        with self._semantic_lock:
+            if self._semantic_index is None:
+                self._embedder = _TextEmbedder(self._embedding_model)
+                directory = os.path.join(self._cache_dir, "semantic", self._embedder.name)
+                self._semantic_index = _VectorIndex(directory, self._embedder.dim)
+            return self._semantic_index
+
+    def _columnar_store_dir(self, name: str) -> str:
+        """Directory of a named columnar article store."""
+        return os.path.join(self._cache_dir, "columnar", re.sub(r"[^A-Za-z0-9_.-]+", "_", name))
+
+    def _write_columnar_store(self, name: str, articles: Iterable[Dict[str, Any]]):
+        """Append parsed articles to a named columnar store (created on first use), 1000 at a time."""
+        if np is None:
+            raise Exception("Columnar stores require NumPy")
+        writer = _ColumnarStoreWriter(self._columnar_store_dir(name))
+        articles = iter(articles)
+        while True:
+            batch = list(itertools.islice(articles, 1000))
+            if not batch:
+                break
+            writer.add(batch)
+        writer.commit()
+        self._columnar_stores.pop(name, None)
+
+    def _open_columnar_store(self, name: str) -> Optional[_ColumnarStore]:
+        """Open a named columnar store read-only, or return None if it does not exist."""
+        if np is None:
+            return None
+        store = self._columnar_stores.get(name)
+        if store is None:
+            directory = self._columnar_store_dir(name)
+            if not os.path.exists(os.path.join(directory, "meta.json")):
+                return None
+            store = self._columnar_stores[name] = _ColumnarStore(directory)
+        return store
+
+    def _count_collection(
+        self,
+        name: str,
+        facet: str,
+        buckets: List[str],
+        journal: Optional[str],
+        first_year: Optional[int],
+        last_year: Optional[int]
     ) -> str:
+        """Facet counts over a local columnar store, formatted like count_pubmed."""
+        store = self._open_columnar_store(name)
+        if store is None:
+            return f"## PubMed Counts\n\nNo local collection named **{name}**."
+        if facet == "publication_type":
+            return "## PubMed Counts\n\nLocal collections store no publication types; count by year or journal instead."
+
+        rows = store.filter(first_year, last_year, journals=[journal] if journal else None)
+        if facet == "year":
+            counts = {str(year): count for year, count in sorted(store.year_counts(rows).items())}
+        else:
+            counts = dict(sorted(store.journal_counts(rows).items(), key=lambda item: -item[1]))
+        if buckets:
+            wanted = {bucket.lower() for bucket in buckets}
+            counts = {bucket: count for bucket, count in counts.items() if bucket.lower() in wanted}
+        elif facet == "journal":
+            counts = dict(list(counts.items())[:20])
+
+        label = facet.capitalize()
+        table = "\n".join(f"| {bucket} | {count:,} |" for bucket, count in counts.items())
+        return (
+            f"## PubMed Counts\n\n**Collection**: {name} (local, {len(store):,} articles)\n"
+            f"\n| {label} | Articles |\n|---|---:|\n{table}\n\n**Total matching**: {len(rows):,} articles\n"
+        )
+
+    def _index_records(self, articles: List[Dict[str, Any]]):
+        """Embed newly fetched records and add them to the semantic index."""
+        try:
+            index = self._get_semantic_index()
+            if index is None:
+                return
+            new = [article for article in articles if article.get("pmid") and article["pmid"] not in index]
+            if not new:
+                return
+            vectors = self._embedder.embed([
+                f"{article.get('title', '')} {article.get('abstract') or ''}" for article in new
+            ])
+            metadata = [
+                {key: article.get(key, "") for key in ("pmid", "title", "authors", "journal", "pub_date", "doi", "url")}
+                for article in new
+            ]
+            index.add([article["pmid"] for article in new], vectors, metadata)
+        except OSError:
+            # The semantic index is an optional local accelerator; searches must not fail on disk errors
+            pass
+
+    def _get_articles(self, pmids: List[str], refresh: bool = False) -> List[Dict[str, Any]]:
         """
-        Build a PubMed search query with filters.
+        Return full article records, answering from the record cache first.
+
+        Records missing locally are looked up in the shared backend (filled by
+        other worker processes) next. Only the remaining misses are fetched,
+        in efetch batches sized by the adaptive batch controller. A failed batch is retried at the reduced size, so
+        records fetched before the failure are kept.
 
         Args:
-            query: Main search terms
-            author: Author name filter
-            journal: Journal name/abbreviation filter
-            date_from: Start date (YYYY/MM/DD or YYYY)
-            date_to: End date (YYYY/MM/DD or YYYY)
-            publication_type: Publication type (e.g., Review, Clinical Trial)
+            pmids: List of PubMed IDs
+            refresh: Re-fetch every record (e.g., after it was modified in
+                     PubMed) and replace the cached copies
 
         Returns:
-            Formatted PubMed query string
+            List of article dictionaries in the order of pmids (PMIDs that
+            PubMed did not return are skipped)
         """
-        terms = [query]
-
-        if author:
-            terms.append(f"{author}[AU]")
-
-        if journal:
-            terms.append(f"{journal}[TA]")
-
-        if publication_type:
-            # Map common publication types to PubMed codes
-            pt_mapping = {
-                "review": "Review[PT]",
-                "clinical trial": "Clinical Trial[PT]",
-                "meta-analysis": "Meta-Analysis[PT]",
-                "randomized controlled trial": "Randomized Controlled Trial[PT]",
-                "case report": "Case Reports[PT]",
-                "systematic review": "Systematic Review[PT]",
-                "letter": "Letter[PT]",
-                "editorial": "Editorial[PT]",
-            }
-            pt_lower = publication_type.lower()
-            if pt_lower in pt_mapping:
-                terms.append(pt_mapping[pt_lower])
+        # Results are collected here rather than read back from the LRU, which
+        # may already have evicted them again (e.g., a batch larger than the cache)
+        found: Dict[str, Dict[str, Any]] = {}
+        if not refresh:
+            with self._record_lock:
+                for pmid in pmids:
+                    article = self._record_cache.get(pmid)
+                    if article is not None:
+                        self._record_cache.move_to_end(pmid)
+                        found[pmid] = article
+        missing = [pmid for pmid in pmids if pmid not in found]
+        speculative = (_REQUEST_CONTEXT.get() or {}).get("priority") == "prefetch"
+        if not speculative:
+            for pmid in found:
+                self._prefetcher.use(f"record:{pmid}")
+        backend = self._get_shared_backend() if missing and not refresh else None
+        if backend is not None:
+            shared = backend.get_many([f"record:{pmid}" for pmid in missing])
+            if shared:
+                records = [_PubMedRecord.from_json(json.loads(blob)) for blob in shared.values()]
+                self._cache_records(records, share=False)
+                found.update((article["pmid"], article) for article in records)
+                missing = [pmid for pmid in missing if pmid not in found]
+        sizer = self._batch_sizer
+        failures = 0
+        while missing:
+            chunk = missing[:sizer.size]
+            stats: Dict[str, Any] = {}
+            try:
+                articles = self._fetch_article_details(chunk, timeout=sizer.timeout(len(chunk)), stats=stats, refresh=refresh)
+            except _PrefetchStopped:
+                raise  # Not a request failure; must not shrink the batch size
+            except Exception:
+                sizer.record_failure()
+                failures += 1
+                if failures >= 3:
+                    raise
+                continue
+
+            if stats.get("network"):
+                sizer.record_success(len(chunk), stats["seconds"], stats["bytes"])
+            failures = 0
+            self._cache_records(articles)
+            found.update((article["pmid"], article) for article in articles if article.get("pmid"))
+            if speculative:
+                for article in articles:
+                    self._prefetcher.remember(f"record:{article['pmid']}")
+            missing = missing[len(chunk):]
+
+        return [found[pmid] for pmid in pmids if pmid in found]
+
+    def _page_fetch_size(self, max_results: int, rerank: bool, pending: Optional[List[str]] = None) -> int:
+        """
+        PMIDs to request from esearch for one search_pubmed page.
+
+        Re-ranked pages over-fetch candidates; those a page did not show are
+        carried over in the cursor, so the next page requests fewer new ones.
+        """
+        if not rerank:
+            return max_results
+        return min(100, max_results * self._rerank_overfetch) - len(pending or [])
+
+    def _schedule_prefetch(self, state: Dict[str, Any], pmids: List[str], has_next: bool, user: Optional[Dict[str, Any]]):
+        """
+        Warm the caches for the likely follow-ups of a search_pubmed call.
+
+        In order: the abstracts of the top hits (after a metadata-only
+        search), the next page, and the same search restricted to reviews.
+        Runs in the background in the "prefetch" scheduler class; failures,
+        cancellation and an exhausted budget simply end the run.
+
+        Args:
+            state: Search parameters in cursor form, with retstart = next page offset
+            pmids: PMIDs of the page just returned
+            has_next: Whether there is a next page
+            user: OpenWebUI __user__ dict of the caller
+        """
+        if not self._prefetch:
+            return
+
+        def fetch_page(query, retstart, pending):
+            fetch_size = self._page_fetch_size(state["max_results"], state["rerank"], pending)
+            page = self._search_pubmed_page(query, fetch_size, state["date_from"], state["date_to"], retstart=retstart)
+            if state["detail_level"] == "metadata":
+                self._fetch_article_summaries(page["ids"])
             else:
-                terms.append(f"{publication_type}[PT]")
+                self._get_articles(page["ids"])
 
-        full_query = " AND ".join(terms)
+        def run(cancel):
+            with self._request_scope(
+                priority="prefetch",
+                user=user,
+                timeout=self._prefetch_timeout,
+                budget=self._prefetch_budget,
+                cancel=cancel
+            ):
+                try:
+                    if state["detail_level"] == "metadata":
+                        self._get_articles(pmids[:self._prefetch_top_hits])
+                    filters = {name: state[name] for name in ("author", "journal", "date_from", "date_to")}
+                    if has_next:
+                        fetch_page(self._query_plan(state["query"], publication_type=state["publication_type"], **filters).term, state["retstart"], state.get("pending"))
+                    if not state["publication_type"]:
+                        fetch_page(self._query_plan(state["query"], publication_type="Review", **filters).term, 0, None)
+                except Exception:
+                    pass
 
-        return full_query
+        self._prefetcher.submit(str((user or {}).get("id") or "default"), run)
 
-    def _search_pubmed(
+    def _schedule_delta_fetch(self, unlisted: List[str], updated: List[str], user: Optional[Dict[str, Any]]):
+        """
+        Warm the caches with the part of a saved-search delta that was not listed.
+
+        Runs in the background in the "prefetch" class, so it never holds up
+        interactive calls. Updated records are re-fetched first, then new ones;
+        at most _record_cache_size records in total, since more would only
+        evict each other from the record cache.
+
+        Args:
+            unlisted: New PMIDs beyond the listed ones
+            updated: Tracked PMIDs modified since the last run
+            user: OpenWebUI __user__ dict of the caller
+        """
+        updated = updated[:self._record_cache_size]
+        unlisted = unlisted[:self._record_cache_size - len(updated)]
+        if not updated and not unlisted:
+            return
+
+        def run(cancel):
+            with self._request_scope(
+                priority="prefetch",
+                user=user,
+                timeout=self._prefetch_timeout,
+                budget=len(updated) + len(unlisted),  # Every request fetches at least one record
+                cancel=cancel
+            ):
+                try:
+                    self._get_articles(updated, refresh=True)
+                    self._get_articles(unlisted)
+                except Exception:
+                    pass
+
+        self._prefetcher.submit(str((user or {}).get("id") or "default"), run)
+
+    def _fetch_links(self, pmid: str, linkname: str) -> List[str]:
+        """
+        Fetch PMIDs linked to one article via ELink.
+
+        Args:
+            pmid: Source PubMed ID
+            linkname: ELink link name (e.g., pubmed_pubmed_citedin)
+
+        Returns:
+            List of linked PMID strings in the order returned by NCBI
+        """
+        try:
+            return self._elink("pubmed", "pubmed", pmid, linkname)
+
+        except Exception as e:
+            raise Exception(f"PubMed link lookup failed for PMID {pmid}: {str(e)}")
+
+    def _expand_links(
         self,
-        query: str,
-        max_results: int,
-        date_from: Optional[str] = None,
-        date_to: Optional[str] = None
-    ) -> List[str]:
+        seeds: List[str],
+        linkname: str,
+        depth: int,
+        max_per_node: int,
+        max_nodes: int
+    ) -> Dict[str, int]:
+        """
+        Breadth-first traversal of the ELink graph from a set of seed PMIDs.
+
+        Each level's frontier is looked up concurrently; all requests share the
+        tool's rate limiter. A visited set prevents revisiting articles.
+
+        Args:
+            seeds: Starting PMIDs (not included in the result)
+            linkname: ELink link name to follow
+            depth: Maximum number of hops from the seeds
+            max_per_node: Maximum links followed from each article (fan-out)
+            max_nodes: Maximum number of discovered articles
+
+        Returns:
+            Ordered mapping of discovered PMID -> hop distance from the seeds
+        """
+        visited = set(seeds)
+        discovered: Dict[str, int] = {}
+        frontier = list(seeds)
+
+        # Worker threads must make their requests in the caller's scheduler scope
+        context = contextvars.copy_context()
+
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            for level in range(1, depth + 1):
+                if not frontier or len(discovered) >= max_nodes:
+                    break
+
+                next_frontier = []
+                link_lists = executor.map(
+                    lambda pmid: context.copy().run(self._fetch_links, pmid, linkname),
+                    frontier
+                )
+                for links in link_lists:
+                    for linked in links[:max_per_node]:
+                        if linked in visited:
+                            continue
+                        visited.add(linked)
+                        discovered[linked] = level
+                        next_frontier.append(linked)
+                        if len(discovered) >= max_nodes:
+                            break
+                    if len(discovered) >= max_nodes:
+                        break
+                frontier = next_frontier
+
+        return discovered
+
+    def _fetch_article_summaries(self, pmids: List[str]) -> List[Dict[str, Any]]:
+        """
+        Fetch lightweight article metadata (no abstracts) via esummary.
+
+        The esummary JSON document is several times smaller than the efetch
+        abstract XML, so this is used when only titles, authors, journal and
+        date are needed.
+
+        Args:
+            pmids: List of PubMed IDs
+
+        Returns:
+            List of article dictionaries with an empty "abstract" field
+        """
+        if not pmids:
+            return []
+
+        try:
+            return self._parse_esummary_json({"result": self._esummary("pubmed", pmids)})
+
+        except Exception as e:
+            raise Exception(f"Failed to fetch article summaries: {str(e)}")
+
+    def _parse_esummary_json(self, data: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Parse an esummary JSON response into article dictionaries.
+
+        Args:
+            data: Decoded JSON from esummary
+
+        Returns:
+            List of article dictionaries in the same shape as _parse_pubmed_xml,
+            with "abstract" left empty
+        """
+        articles = []
+        result = data.get("result", {})
+
+        # "uids" preserves the order PMIDs were requested in
+        for uid in result.get("uids", []):
+            summary = result.get(uid)
+            if not summary or "error" in summary:
+                continue
+
+            article = {}
+            article["pmid"] = summary.get("uid", uid)
+            article["title"] = summary.get("title") or "No title available"
+
+            authors = [
+                author["name"]
+                for author in summary.get("authors", [])
+                if author.get("name") and author.get("authtype", "Author") == "Author"
+            ]
+            article["authors"] = authors[:5]  # Limit to first 5 authors
+            if len(authors) > 5:
+                article["authors"].append("et al.")
+
+            article["journal"] = summary.get("fulljournalname") or summary.get("source", "")
+            article["pub_date"] = summary.get("pubdate", "")
+            article["abstract"] = ""
+
+            for article_id in summary.get("articleids", []):
+                if article_id.get("idtype") == "doi":
+                    article["doi"] = article_id.get("value", "")
+                    break
+            else:
+                article["doi"] = ""
+
+            article["url"] = f"https://pubmed.ncbi.nlm.nih.gov/{article['pmid']}/"
+
+            articles.append(article)
+
+        return articles
+
+    def _resolve_pmc_ids(self, identifiers: List[str]) -> Dict[str, str]:
+        """
+        Map PMIDs and PMCIDs to numeric PMC UIDs (PMIDs via elink pubmed_pmc, concurrently).
+
+        Args:
+            identifiers: Normalized PMIDs ("38123456") and PMCIDs ("PMC10234567")
+
+        Returns:
+            Identifier -> PMC UID for identifiers that have a PMC record, in input order
+        """
+        resolved = {identifier: identifier[3:] for identifier in identifiers if identifier.startswith("PMC")}
+        pmids = [identifier for identifier in identifiers if identifier.isdigit()]
+
+        context = contextvars.copy_context()
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            link_lists = executor.map(
+                lambda pmid: context.copy().run(self._elink, "pubmed", "pmc", pmid, "pubmed_pmc"),
+                pmids
+            )
+            for pmid, links in zip(pmids, link_lists):
+                if links:
+                    resolved[pmid] = links[0]
+        return {identifier: resolved[identifier] for identifier in identifiers if identifier in resolved}
+
+    def _fetch_full_text(self, pmc_uids: List[str], max_chars: int) -> List[Dict[str, Any]]:
+        """
+        Fetch and parse PMC full-text articles with the streaming JATS parser.
+
+        Args:
+            pmc_uids: Numeric PMC UIDs
+            max_chars: Maximum body text kept per article
+
+        Returns:
+            One record per article (see _PMCStreamParser)
+        """
+        if not pmc_uids:
+            return []
+
+        try:
+            return self._efetch("pmc", pmc_uids, _PMCStreamParser(max_chars), timeout=120)
+
+        except ET.ParseError as e:
+            raise Exception(f"Failed to parse PMC XML: {str(e)}")
+        except Exception as e:
+            raise Exception(f"Failed to fetch PMC full text: {str(e)}")
+
+    def _format_full_text(self, records: List[Dict[str, Any]]) -> str:
+        """
+        Format PMC full-text records as Markdown.
+
+        Args:
+            records: Records from _fetch_full_text
+
+        Returns:
+            Markdown with metadata, abstract and body sections per article
+        """
+        output = f"## PMC Full Text\n\nRetrieved **{len(records)}** article(s).\n\n"
+        for i, record in enumerate(records, 1):
+            output += f"### {i}. {record['title'] or 'No title available'}\n\n"
+            ids = [f"**PMCID**: [{record['pmcid']}](https://pmc.ncbi.nlm.nih.gov/articles/{record['pmcid']}/)"]
+            if record["pmid"]:
+                ids.append(f"**PMID**: [{record['pmid']}](https://pubmed.ncbi.nlm.nih.gov/{record['pmid']}/)")
+            if record["doi"]:
+                ids.append(f"**DOI**: [{record['doi']}](https://doi.org/{record['doi']})")
+            output += " | ".join(ids) + "\n"
+            if record["journal"]:
+                output += f"**Journal**: {record['journal']}" + (f" ({record['year']})" if record["year"] else "") + "\n"
+            if record["abstract"]:
+                output += f"\n**Abstract**: {record['abstract']}\n"
+
+            if not record["sections"]:
+                output += "\n*Full text is not available as XML for this article (outside the PMC open-access subset).*\n\n"
+                continue
+            for section in record["sections"]:
+                if section["heading"]:
+                    output += f"\n{'#' * min(6, 3 + section['level'])} {section['heading']}\n"
+                if section["paragraphs"]:
+                    output += "\n" + "\n\n".join(section["paragraphs"]) + "\n"
+            if record["truncated"]:
+                output += "\n*Text truncated; increase max_chars to read more.*\n"
+            output += "\n---\n\n"
+        return output
+
+    def _parse_mesh_summary(self, result: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Parse an esummary result from the MeSH database.
+
+        Args:
+            result: The "result" object from _esummary("mesh", ...)
+
+        Returns:
+            One dictionary per descriptor with "name", "ui", "entry_terms",
+            "tree_numbers" and "scope_note", in the order requested
+        """
+        descriptors = []
+        for uid in result.get("uids", []):
+            summary = result.get(uid)
+            if not summary or "error" in summary:
+                continue
+            terms = summary.get("ds_meshterms") or []
+            descriptors.append({
+                "name": terms[0] if terms else "",
+                "ui": summary.get("ds_meshui", ""),
+                "entry_terms": terms[1:],
+                "tree_numbers": [link["treenum"] for link in summary.get("ds_idxlinks", []) if link.get("treenum")],
+                "scope_note": " ".join((summary.get("ds_scopenote") or "").split()),
+            })
+        return descriptors
+
+    def _parse_pubmed_xml(self, xml_content: Union[bytes, str]) -> List[Dict[str, Any]]:
+        """
+        Parse PubMed XML response to extract article data.
+
+        Args:
+            xml_content: Raw XML bytes (or string) from efetch
+
+        Returns:
+            List of _PubMedRecord dictionaries (extended fields such as MeSH
+            terms are extracted lazily from each record's XML slice)
+        """
+        if isinstance(xml_content, str):
+            xml_content = xml_content.encode("utf-8")
+
+        parser = _PubMedStreamParser(self._parse_article_element)
+        try:
+            parser.feed_all(xml_content)
+            return parser.close()
+        except ET.ParseError as e:
+            raise Exception(f"Failed to parse PubMed XML: {str(e)}")
+
+    def _parse_article_element(self, element: ET.Element, source: bytes) -> "_PubMedRecord":
         """
-        Search PubMed and return list of PMIDs.
+        Build a record from one parsed <PubmedArticle> element.
 
         Args:
-            query: Search query
-            max_results: Maximum number of results
-            date_from: Minimum date filter
-            date_to: Maximum date filter
+            element: The article element
+            source: Raw XML bytes of the element, kept for lazy fields
 
         Returns:
-            List of PMID strings
+            _PubMedRecord with the core fields filled in
         """
-        params = {
-            "db": "pubmed",
-            "term": query,
-            "retmax": max_results,
-            "retmode": "json",
-            "sort": "relevance"
-        }
+        article = _PubMedRecord({}, source)
 
-        if date_from:
-            params["mindate"] = date_from
-        if date_to:
-            params["maxdate"] = date_to
-        if date_from or date_to:
-            params["datetype"] = "pdat"  # Publication date
+        # PMID
+        pmid_elem = element.find(".//PMID")
+        article["pmid"] = pmid_elem.text if pmid_elem is not None else ""
 
-        if self.valves.NCBI_API_KEY:
-            params["api_key"] = self.valves.NCBI_API_KEY
-        if self.valves.NCBI_EMAIL:
-            params["email"] = self.valves.NCBI_EMAIL
+        # Title
+        title_elem = element.find(".//ArticleTitle")
+        article["title"] = title_elem.text if title_elem is not None else "No title available"
 
-        try:
-            self._rate_limit()
-            response = requests.get(self.base_url_search, params=params, timeout=30)
-            response.raise_for_status()
-            data = response.json()
+        # Authors
+        authors = []
+        for author_elem in element.findall(".//Author"):
+            lastname = author_elem.find("LastName")
+            forename = author_elem.find("ForeName")
+            if lastname is not None:
+                name = lastname.text
+                if forename is not None:
+                    name = f"{lastname.text} {forename.text}"
+                authors.append(name)
+        article["authors"] = authors[:5]  # Limit to first 5 authors
+        if len(authors) > 5:
+            article["authors"].append("et al.")
 
-            id_list = data.get("esearchresult", {}).get("idlist", [])
-            return id_list
+        # Journal
+        journal_elem = element.find(".//Journal/Title")
+        article["journal"] = journal_elem.text if journal_elem is not None else ""
 
-        except Exception as e:
-            raise Exception(f"PubMed search failed: {str(e)}")
+        # Publication Date
+        pub_date = element.find(".//PubDate")
+        if pub_date is not None:
+            year = pub_date.find("Year")
+            month = pub_date.find("Month")
+            day = pub_date.find("Day")
+            date_parts = []
+            if year is not None:
+                date_parts.append(year.text)
+            if month is not None:
+                date_parts.append(month.text)
+            if day is not None:
+                date_parts.append(day.text)
+            article["pub_date"] = " ".join(date_parts) if date_parts else ""
+        else:
+            article["pub_date"] = ""
 
-    def _fetch_article_details(self, pmids: List[str]) -> List[Dict[str, Any]]:
-        """
-        Fetch detailed article information including abstracts.
+        # Abstract
+        abstract_texts = []
+        for abstract_elem in element.findall(".//AbstractText"):
+            label = abstract_elem.get("Label", "")
+            text = "".join(abstract_elem.itertext())
+            if label:
+                abstract_texts.append(f"**{label}**: {text}")
+            else:
+                abstract_texts.append(text)
+        article["abstract"] = " ".join(abstract_texts) if abstract_texts else "No abstract available"
 
-        Args:
-            pmids: List of PubMed IDs
+        # DOI
+        for id_elem in element.findall(".//ArticleId"):
+            if id_elem.get("IdType") == "doi":
+                article["doi"] = id_elem.text
+                break
+        else:
+            article["doi"] = ""
 
-        Returns:
-            List of article dictionaries
-        """
-        if not pmids:
-            return []
+        # PubMed URL
+        article["url"] = f"https://pubmed.ncbi.nlm.nih.gov/{article['pmid']}/"
 
-        params = {
-            "db": "pubmed",
-            "id": ",".join(pmids),
-            "retmode": "xml",
-            "rettype": "abstract"
-        }
+        return article
 
-        if self.valves.NCBI_API_KEY:
-            params["api_key"] = self.valves.NCBI_API_KEY
-        if self.valves.NCBI_EMAIL:
-            params["email"] = self.valves.NCBI_EMAIL
+    def _rerank_articles(
+        self,
+        articles: List[Dict[str, Any]],
+        plan: _QueryPlan,
+        top_k: int
+    ) -> List[Dict[str, Any]]:
+        """
+        Re-rank fetched articles by local BM25 relevance to the query text.
 
-        try:
-            self._rate_limit()
-            response = requests.get(self.base_url_fetch, params=params, timeout=60)
-            response.raise_for_status()
+        Args:
+            articles: Parsed article dictionaries
+            plan: Query plan of the search (its free-text terms are the query)
+            top_k: Number of articles to keep
 
-            return self._parse_pubmed_xml(response.text)
+        Returns:
+            The top_k articles, best first (ties keep NCBI's order)
+        """
+        terms = plan.text_terms()
+        if not terms:
+            return articles[:top_k]
 
-        except Exception as e:
-            raise Exception(f"Failed to fetch article details: {str(e)}")
+        documents = [
+            f"{article.get('title', '')} {article.get('abstract') or ''}"
+            for article in articles
+        ]
+        scores = _bm25_scores(terms, documents)
+        order = sorted(range(len(articles)), key=lambda i: (-scores[i], i))
+        return [articles[i] for i in order[:top_k]]
 
-    def _parse_pubmed_xml(self, xml_content: str) -> List[Dict[str, Any]]:
+    def _collapse_near_duplicates(
+        self,
+        articles: List[Dict[str, Any]]
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, List[str]]]:
         """
-        Parse PubMed XML response to extract article data.
+        Collapse near-duplicate articles into one entry per cluster.
+
+        The representative is the best-ranked member with an abstract (or the
+        best-ranked member if none has one). Records are not modified.
 
         Args:
-            xml_content: XML string from efetch
+            articles: Parsed article dictionaries in ranked order
 
         Returns:
-            List of article dictionaries
+            Tuple of (representative articles in ranked order, mapping of
+            representative PMID -> PMIDs of its collapsed duplicates)
         """
-        articles = []
+        if not self._collapse_duplicates or len(articles) < 2:
+            return articles, {}
 
-        try:
-            root = ET.fromstring(xml_content)
-
-            for article_elem in root.findall(".//PubmedArticle"):
-                article = {}
-
-                # PMID
-                pmid_elem = article_elem.find(".//PMID")
-                article["pmid"] = pmid_elem.text if pmid_elem is not None else ""
-
-                # Title
-                title_elem = article_elem.find(".//ArticleTitle")
-                article["title"] = title_elem.text if title_elem is not None else "No title available"
-
-                # Authors
-                authors = []
-                for author_elem in article_elem.findall(".//Author"):
-                    lastname = author_elem.find("LastName")
-                    forename = author_elem.find("ForeName")
-                    if lastname is not None:
-                        name = lastname.text
-                        if forename is not None:
-                            name = f"{lastname.text} {forename.text}"
-                        authors.append(name)
-                article["authors"] = authors[:5]  # Limit to first 5 authors
-                if len(authors) > 5:
-                    article["authors"].append("et al.")
-
-                # Journal
-                journal_elem = article_elem.find(".//Journal/Title")
-                article["journal"] = journal_elem.text if journal_elem is not None else ""
-
-                # Publication Date
-                pub_date = article_elem.find(".//PubDate")
-                if pub_date is not None:
-                    year = pub_date.find("Year")
-                    month = pub_date.find("Month")
-                    day = pub_date.find("Day")
-                    date_parts = []
-                    if year is not None:
-                        date_parts.append(year.text)
-                    if month is not None:
-                        date_parts.append(month.text)
-                    if day is not None:
-                        date_parts.append(day.text)
-                    article["pub_date"] = " ".join(date_parts) if date_parts else ""
-                else:
-                    article["pub_date"] = ""
-
-                # Abstract
-                abstract_texts = []
-                for abstract_elem in article_elem.findall(".//AbstractText"):
-                    label = abstract_elem.get("Label", "")
-                    text = "".join(abstract_elem.itertext())
-                    if label:
-                        abstract_texts.append(f"**{label}**: {text}")
-                    else:
-                        abstract_texts.append(text)
-                article["abstract"] = " ".join(abstract_texts) if abstract_texts else "No abstract available"
+        representatives = []
+        duplicates: Dict[str, List[str]] = {}
+        for cluster in _near_duplicate_clusters(articles):
+            with_abstract = [
+                i for i in cluster
+                if articles[i].get("abstract") not in ("", None, "No abstract available")
+            ]
+            best = (with_abstract or cluster)[0]
+            representatives.append((cluster[0], articles[best]))
+            if len(cluster) > 1:
+                duplicates[articles[best]["pmid"]] = [articles[i]["pmid"] for i in cluster if i != best]
 
-                # DOI
-                for id_elem in article_elem.findall(".//ArticleId"):
-                    if id_elem.get("IdType") == "doi":
-                        article["doi"] = id_elem.text
-                        break
-                else:
-                    article["doi"] = ""
+        representatives.sort(key=lambda item: item[0])
+        return [article for _, article in representatives], duplicates
 
-                # PubMed URL
-                article["url"] = f"https://pubmed.ncbi.nlm.nih.gov/{article['pmid']}/"
+    def _article_fragment(self, article: Dict[str, Any], detail_level: str) -> Tuple[str, str]:
+        """
+        Markdown for one article, split around the optional near-duplicates line.
 
-                articles.append(article)
+        The fragment excludes the result number, so it can be reused in any
+        response. Parsed records (_PubMedRecord) are cached by PMID and
+        detail level and validated against the record's version; other
+        dictionaries (esummary results, decorated copies) are rendered fresh.
 
-        except ET.ParseError as e:
-            raise Exception(f"Failed to parse PubMed XML: {str(e)}")
+        Returns:
+            (head, tail): title through PMID/DOI line, and abstract plus separator
+        """
+        version = getattr(article, "version", None)
+        key = (article["pmid"], detail_level)
+        if version is not None:
+            with self._record_lock:
+                cached = self._fragment_cache.get(key)
+                if cached is not None and cached[0] == version:
+                    self._fragment_cache.move_to_end(key)
+                    return cached[1], cached[2]
 
-        return articles
+        authors_str = ", ".join(article["authors"]) if article["authors"] else "Unknown authors"
+        head = (
+            f"{article['title']}\n\n"
+            f"**Authors**: {authors_str}\n\n"
+            f"**Journal**: {article['journal']} ({article['pub_date']})\n\n"
+            f"**PMID**: [{article['pmid']}]({article['url']})\n"
+            + (f" | **DOI**: {article['doi']}\n" if article["doi"] else "\n")
+        )
+        tail = f"\n\n**Abstract**:\n{article['abstract']}\n" if detail_level != "metadata" else ""
+        tail += "\n\n---\n"
+
+        if version is not None:
+            with self._record_lock:
+                self._fragment_cache[key] = (version, head, tail)
+                self._fragment_cache.move_to_end(key)
+                while len(self._fragment_cache) > self._fragment_cache_size:
+                    self._fragment_cache.popitem(last=False)
+        return head, tail
 
-    def _format_results(self, articles: List[Dict[str, Any]], query: str) -> str:
+    def _format_results(
+        self,
+        articles: List[Dict[str, Any]],
+        query: str,
+        detail_level: str = "full",
+        heading: str = "PubMed Search Results",
+        start_index: int = 1,
+        duplicates: Optional[Dict[str, List[str]]] = None
+    ) -> str:
         """
         Format search results as Markdown for LLM consumption.
 
         Args:
             articles: List of article dictionaries
             query: Original search query
+            detail_level: "full" to include abstracts, "metadata" to omit them
+            heading: Top-level heading for the output
+            start_index: Number of the first article (for paginated results)
+            duplicates: Mapping of PMID -> PMIDs of near-duplicates collapsed into it
 
         Returns:
             Markdown formatted string
         """
         if not articles:
-            return f"## PubMed Search Results\n\nNo articles found for query: **{query}**"
+            return f"## {heading}\n\nNo articles found for query: **{query}**"
 
         output_parts = []
 
         # Header with summary
-        output_parts.append(f"## PubMed Search Results\n")
+        output_parts.append(f"## {heading}\n")
         output_parts.append(f"**Query**: {query}\n")
-        output_parts.append(f"**Results Found**: {len(articles)} articles\n")
+        duplicates = duplicates or {}
+        collapsed = sum(len(pmids) for pmids in duplicates.values())
+        if collapsed:
+            output_parts.append(f"**Results Found**: {len(articles)} articles ({collapsed} near-duplicates collapsed)\n")
+        else:
+            output_parts.append(f"**Results Found**: {len(articles)} articles\n")
         output_parts.append(f"**Retrieved**: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
         output_parts.append("---\n")
 
-        # Individual articles
-        for i, article in enumerate(articles, 1):
-            output_parts.append(f"### {i}. {article['title']}\n")
-
-            # Metadata line
-            authors_str = ", ".join(article["authors"]) if article["authors"] else "Unknown authors"
-            output_parts.append(f"**Authors**: {authors_str}\n")
-            output_parts.append(f"**Journal**: {article['journal']} ({article['pub_date']})\n")
-            output_parts.append(f"**PMID**: [{article['pmid']}]({article['url']})")
+        # Individual articles, assembled from cached per-record fragments
+        for i, article in enumerate(articles, start_index):
+            head, tail = self._article_fragment(article, detail_level)
+            if article["pmid"] in duplicates:
+                head += f"\n**Near-duplicates**: PMID {', '.join(duplicates[article['pmid']])}\n"
+            output_parts.append(f"### {i}. {head}{tail}")
 
-            if article["doi"]:
-                output_parts.append(f" | **DOI**: {article['doi']}\n")
-            else:
-                output_parts.append("\n")
-
-            # Abstract
-            output_parts.append(f"\n**Abstract**:\n{article['abstract']}\n")
-            output_parts.append("\n---\n")
+        if detail_level == "metadata":
+            output_parts.append(
+                "*Metadata-only results: abstracts were not retrieved. "
+                "Use get_abstracts with the PMIDs of interest to read full abstracts.*\n"
+            )
 
         return "\n".join(output_parts)
 
@@ -339,7 +4136,11 @@ class Tools:
         journal: Optional[str] = None,
         date_from: Optional[str] = None,
         date_to: Optional[str] = None,
-        publication_type: Optional[str] = None
+        publication_type: Optional[str] = None,
+        detail_level: str = "full",
+        cursor: Optional[str] = None,
+        rerank: bool = False,
+        __user__: Optional[dict] = None
     ) -> str:
         """
         Search PubMed for scientific literature with advanced filtering options.
@@ -361,6 +4162,16 @@ class Tools:
                               "Review", "Clinical Trial", "Meta-Analysis",
                               "Randomized Controlled Trial", "Case Report",
                               "Systematic Review", "Letter", "Editorial".
+            detail_level: "full" (default) returns abstracts; "metadata" returns only
+                          titles, authors, journal, date and identifiers, which is much
+                          faster and smaller when screening many results.
+            cursor: Pagination token from a previous result's "next page" line. When
+                    given, the original query, filters and page size are reused and
+                    only the next page is fetched; the other arguments are ignored.
+            rerank: If True, fetch several times more candidates than max_results and
+                    return only the max_results most relevant to the query text,
+                    ranked locally with BM25 over titles and abstracts. Candidates
+                    not shown are re-ranked again on the next page.
 
         Returns:
             A Markdown-formatted string containing search results with:
@@ -369,7 +4180,7 @@ class Tools:
             - Journal and publication date
             - PMID with link to PubMed
             - DOI (if available)
-            - Full abstract text
+            - Full abstract text (omitted when detail_level="metadata")
 
         Example:
             search_pubmed(
@@ -379,44 +4190,859 @@ class Tools:
                 publication_type="Review"
             )
         """
-        try:
-            # Use valve default if not specified
-            if max_results is None:
-                max_results = self.valves.MAX_RESULTS
-
-            # Clamp max_results
-            max_results = max(1, min(100, max_results))
-
-            # Build search query with filters
-            search_query = self._build_search_query(
-                query=query,
-                author=author,
-                journal=journal,
-                date_from=date_from,
-                date_to=date_to,
-                publication_type=publication_type
-            )
+        with self._request_scope(user=__user__):
+            try:
+                retstart = 0
+                pending: List[str] = []  # Re-ranked candidates fetched but not shown yet
+                shown = 0  # Re-ranked results shown on earlier pages
+                if cursor:
+                    state = self._load_cursor(cursor)
+                    if state is None:
+                        return "## PubMed Search Error\n\nThe pagination cursor is unknown or has expired.\n\nPlease run the search again without a cursor."
+                    query = state["query"]
+                    max_results = state["max_results"]
+                    author = state["author"]
+                    journal = state["journal"]
+                    date_from = state["date_from"]
+                    date_to = state["date_to"]
+                    publication_type = state["publication_type"]
+                    detail_level = state["detail_level"]
+                    rerank = state.get("rerank", False)
+                    retstart = state["retstart"]
+                    pending = state.get("pending", [])
+                    shown = state.get("shown", 0)
 
-            # Search for PMIDs
-            pmids = self._search_pubmed(
-                query=search_query,
-                max_results=max_results,
-                date_from=date_from,
-                date_to=date_to
-            )
+                # Use valve default if not specified
+                if max_results is None:
+                    max_results = self.valves.MAX_RESULTS
 
-            if not pmids:
-                return f"## PubMed Search Results\n\nNo articles found for query: **{query}**\n\nFilters applied:\n- Author: {author or 'None'}\n- Journal: {journal or 'None'}\n- Date range: {date_from or 'Any'} to {date_to or 'Any'}\n- Publication type: {publication_type or 'Any'}"
+                # Clamp max_results
+                max_results = max(1, min(100, max_results))
+                detail_level = (detail_level or "full").lower()
+                if detail_level != "metadata":
+                    detail_level = "full"
 
-            # Fetch detailed article information
-            articles = self._fetch_article_details(pmids)
+                # Build search query with filters
+                plan = self._query_plan(
+                    query,
+                    author=author,
+                    journal=journal,
+                    date_from=date_from,
+                    date_to=date_to,
+                    publication_type=publication_type
+                )
 
-            # Format results
-            return self._format_results(articles, query)
+                # Over-fetch candidates when re-ranking locally
+                fetch_size = self._page_fetch_size(max_results, rerank, pending)
 
-        except Exception as e:
-            return f"## PubMed Search Error\n\nAn error occurred while searching PubMed: {str(e)}\n\nPlease try again with different search terms or check your network connection."
+                # Search for one page of PMIDs
+                page = self._search_pubmed_page(
+                    query=plan.term,
+                    max_results=fetch_size,
+                    date_from=date_from,
+                    date_to=date_to,
+                    retstart=retstart
+                )
+                pmids = page["ids"]
+                candidate_ids = list(dict.fromkeys(pending + pmids))
+
+                if not candidate_ids:
+                    if retstart:
+                        return f"## PubMed Search Results\n\nNo more articles for query: **{query}** ({page['count']} total matches already listed)."
+                    return f"## PubMed Search Results\n\nNo articles found for query: **{query}**\n\nFilters applied:\n- Author: {author or 'None'}\n- Journal: {journal or 'None'}\n- Date range: {date_from or 'Any'} to {date_to or 'Any'}\n- Publication type: {publication_type or 'Any'}"
+
+                # Fetch article information; esummary is enough for metadata-only results
+                if detail_level == "metadata":
+                    articles = self._fetch_article_summaries(candidate_ids)
+                else:
+                    articles = self._get_articles(candidate_ids)
+
+                candidates = len(articles)
+                next_pending: List[str] = []
+                if rerank:
+                    ranked = self._rerank_articles(articles, plan, len(articles))
+                    articles = ranked[:max_results]
+                    next_pending = [article["pmid"] for article in ranked[max_results:]]
+
+                # Collapse errata, preprint/published pairs and repeated abstracts
+                articles, duplicates = self._collapse_near_duplicates(articles)
+
+                # Format results
+                output = self._format_results(
+                    articles,
+                    query,
+                    detail_level=detail_level,
+                    start_index=(shown if rerank else retstart) + 1,
+                    duplicates=duplicates
+                )
+                if rerank:
+                    output += f"\n**Re-ranked**: top {len(articles)} of {candidates} candidates by local BM25 relevance to the query.\n"
+                if plan.expanded:
+                    output += f"\n**MeSH expansion**: `{plan.term}`\n"
+
+                # Offer a cursor for the next page instead of re-running a bigger search
+                next_start = retstart + len(pmids)
+                next_state = {
+                    "query": query,
+                    "max_results": max_results,
+                    "author": author,
+                    "journal": journal,
+                    "date_from": date_from,
+                    "date_to": date_to,
+                    "publication_type": publication_type,
+                    "detail_level": detail_level,
+                    "rerank": rerank,
+                    "retstart": next_start,
+                }
+                first, last = retstart + 1, next_start
+                if rerank:
+                    next_state["pending"] = next_pending
+                    next_state["shown"] = shown + len(articles)
+                    first, last = shown + 1, shown + len(articles)
+                has_next = next_start < page["count"] or bool(next_pending)
+                self._schedule_prefetch(next_state, pmids, has_next, __user__)
+                if has_next:
+                    next_cursor = self._store_cursor(next_state)
+                    output += (
+                        f"\n**Showing**: {first}-{last} of {page['count']} matches. "
+                        f"For the next page call search_pubmed with cursor=\"{next_cursor}\".\n"
+                    )
+
+                return output
+
+            except Exception as e:
+                return f"## PubMed Search Error\n\nAn error occurred while searching PubMed: {str(e)}\n\nPlease try again with different search terms or check your network connection."
+
+    def get_abstracts(self, pmids: Union[List[str], str], __user__: Optional[dict] = None) -> str:
+        """
+        Retrieve full abstracts for specific PubMed articles by PMID.
+
+        Use this after a search_pubmed call with detail_level="metadata" to read
+        the abstracts of only the articles that look relevant. Records already
+        retrieved in this session are returned without contacting PubMed.
+
+        Args:
+            pmids: List of PubMed IDs (e.g., ["38123456", "37987654"]). A comma- or
+                   space-separated string is also accepted.
+
+        Returns:
+            A Markdown-formatted string with title, authors, journal, date,
+            PMID/DOI and full abstract for each requested article.
+
+        Example:
+            get_abstracts(pmids=["38123456", "37987654"])
+        """
+        with self._request_scope(user=__user__):
+            try:
+                if isinstance(pmids, str):
+                    pmids = re.split(r"[\s,;]+", pmids)
+
+                # Normalize and de-duplicate while keeping the caller's order
+                requested = list(dict.fromkeys(str(pmid).strip() for pmid in pmids if str(pmid).strip()))
+                invalid = [pmid for pmid in requested if not pmid.isdigit()]
+                requested = [pmid for pmid in requested if pmid.isdigit()]
+
+                if not requested:
+                    return "## PubMed Abstracts\n\nNo valid PMIDs were provided."
+
+                requested = requested[:100]  # Same upper bound as search_pubmed
+                articles = self._get_articles(requested)
+                output = self._format_results(
+                    articles,
+                    ", ".join(requested),
+                    heading="PubMed Abstracts"
+                )
+
+                found = {article["pmid"] for article in articles}
+                not_found = [pmid for pmid in requested if pmid not in found] + invalid
+                if not_found:
+                    output += f"\n**Not found**: {', '.join(not_found)}\n"
+
+                return output
+
+            except Exception as e:
+                return f"## PubMed Abstracts Error\n\nAn error occurred while retrieving abstracts: {str(e)}\n\nPlease check the PMIDs or your network connection."
+
+    def expand_citations(
+        self,
+        pmids: Union[List[str], str],
+        direction: str = "cited_by",
+        depth: int = 1,
+        max_per_node: int = 10,
+        max_results: int = 20,
+        __user__: Optional[dict] = None
+    ) -> str:
+        """
+        Explore the citation graph around one or more PubMed articles.
+
+        Follows PubMed links breadth-first from the given articles to find papers
+        that cite them, papers they reference, or similar articles.
+
+        Args:
+            pmids: Seed PubMed ID(s) (e.g., ["38123456"]). A comma-separated string
+                   is also accepted.
+            direction: Which links to follow:
+                       "cited_by" - papers citing the seed articles (default),
+                       "references" - papers cited by the seed articles,
+                       "similar" - PubMed's related articles.
+            depth: Number of hops to follow (1-3, default: 1). Depth 2 also
+                   includes e.g. papers citing the citing papers.
+            max_per_node: Maximum links followed from each article (1-50, default: 10).
+            max_results: Maximum number of articles returned (1-100, default: 20).
+
+        Returns:
+            A Markdown-formatted list of the discovered articles with titles,
+            authors, journal, date and PMID/DOI. Use get_abstracts to read the
+            abstracts of interesting articles.
+
+        Example:
+            expand_citations(pmids=["38123456"], direction="cited_by", depth=1)
+        """
+        linknames = {
+            "cited_by": "pubmed_pubmed_citedin",
+            "references": "pubmed_pubmed_refs",
+            "similar": "pubmed_pubmed",
+        }
+
+        with self._request_scope(user=__user__):
+            try:
+                if isinstance(pmids, str):
+                    pmids = re.split(r"[\s,;]+", pmids)
+                seeds = list(dict.fromkeys(str(pmid).strip() for pmid in pmids if str(pmid).strip().isdigit()))
+                if not seeds:
+                    return "## PubMed Citation Expansion\n\nNo valid PMIDs were provided."
+
+                direction = (direction or "cited_by").lower().replace("-", "_").replace(" ", "_")
+                if direction not in linknames:
+                    return f"## PubMed Citation Expansion\n\nUnknown direction: **{direction}**. Use one of: {', '.join(linknames)}."
+
+                depth = max(1, min(3, depth))
+                max_per_node = max(1, min(50, max_per_node))
+                max_results = max(1, min(100, max_results))
+
+                discovered = self._expand_links(
+                    seeds,
+                    linknames[direction],
+                    depth=depth,
+                    max_per_node=max_per_node,
+                    max_nodes=max_results
+                )
+
+                label = f"{direction.replace('_', ' ')} PMID {', '.join(seeds)}"
+                if not discovered:
+                    return f"## PubMed Citation Expansion\n\nNo linked articles found for: **{label}**"
+
+                # Resolve node metadata through the batched efetch + record cache path
+                articles = self._get_articles(list(discovered))
+                output = self._format_results(
+                    articles,
+                    label,
+                    detail_level="metadata",
+                    heading="PubMed Citation Expansion"
+                )
+
+                levels = [f"depth {level}: {list(discovered.values()).count(level)}" for level in range(1, depth + 1)]
+                output += f"\n**Articles per hop**: {', '.join(levels)}\n"
+                return output
+
+            except Exception as e:
+                return f"## PubMed Citation Expansion Error\n\nAn error occurred while expanding citations: {str(e)}\n\nPlease check the PMIDs or your network connection."
+
+    def count_pubmed(
+        self,
+        query: str,
+        facet: str = "year",
+        buckets: Optional[Union[List[str], str]] = None,
+        author: Optional[str] = None,
+        journal: Optional[str] = None,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        publication_type: Optional[str] = None,
+        collection: Optional[str] = None,
+        __user__: Optional[dict] = None
+    ) -> str:
+        """
+        Count PubMed articles per year, publication type or journal without retrieving them.
+
+        Use this for questions like "how many randomized controlled trials on X
+        were published per year since 2015". Only counts are requested from
+        PubMed, which is much faster than searching and counting results.
+
+        Args:
+            query: Search terms (same syntax as search_pubmed).
+            facet: How to split the counts: "year" (default), "publication_type"
+                   or "journal".
+            buckets: Values to count. For "year", a list of years (default: the
+                     date_from..date_to range, or the last 10 years). For
+                     "publication_type", types such as "Review" (default: all
+                     supported types). For "journal", journal names (required
+                     unless counting a local collection).
+            author: Filter by author name.
+            journal: Filter by journal name or abbreviation.
+            date_from: Start date (YYYY or YYYY/MM/DD).
+            date_to: End date (YYYY or YYYY/MM/DD).
+            publication_type: Filter by publication type.
+            collection: Job id of a completed export_records job; its locally
+                        stored articles are counted instead of PubMed. Only the
+                        date and journal filters apply; the query terms are not
+                        matched locally.
+
+        Returns:
+            A Markdown table with one row per bucket and the overall total.
+
+        Example:
+            count_pubmed(query="semaglutide", facet="year", date_from="2015",
+                         publication_type="Randomized Controlled Trial")
+        """
+        with self._request_scope(user=__user__):
+            try:
+                facet = (facet or "year").lower().replace(" ", "_").replace("-", "_")
+                if facet not in ("year", "publication_type", "journal"):
+                    return f"## PubMed Counts\n\nUnknown facet: **{facet}**. Use one of: year, publication_type, journal."
+                if isinstance(buckets, str):
+                    buckets = [bucket for bucket in re.split(r"\s*[,;]\s*", buckets) if bucket]
+                buckets = [str(bucket).strip() for bucket in buckets or [] if str(bucket).strip()][:50]
+
+                plan = self._query_plan(
+                    query,
+                    author=author,
+                    journal=journal,
+                    date_from=date_from,
+                    date_to=date_to,
+                    publication_type=publication_type
+                )
+                first_year = int(plan.date_from[:4]) if plan.date_from else None
+                last_year = int(plan.date_to[:4]) if plan.date_to else None
+
+                if collection:
+                    return self._count_collection(collection, facet, buckets, journal, first_year, last_year)
+
+                if facet == "year":
+                    if not buckets:
+                        end = last_year or datetime.now().year
+                        start = max(first_year or end - 9, end - 49)
+                        buckets = [str(year) for year in range(start, end + 1)]
+                    requests_by_label = {}
+                    for year in buckets:
+                        if not year.isdigit():
+                            return f"## PubMed Counts\n\nInvalid year bucket: **{year}**."
+                        # Keep the caller's exact start/end date inside the first/last year
+                        bucket_from = plan.date_from if first_year == int(year) else year
+                        bucket_to = plan.date_to if last_year == int(year) else year
+                        requests_by_label[year] = (plan.term, bucket_from, bucket_to)
+                else:
+                    if facet == "journal" and not buckets:
+                        return "## PubMed Counts\n\nPlease list the journals to count in buckets (or count a local collection)."
+                    if not buckets:
+                        buckets = list(dict.fromkeys(_QueryPlan.PUBLICATION_TYPES.values()))
+                    requests_by_label = {}
+                    for bucket in buckets:
+                        bucket_plan = self._query_plan(
+                            query,
+                            author=author,
+                            journal=bucket if facet == "journal" else journal,
+                            publication_type=bucket if facet == "publication_type" else publication_type
+                        )
+                        requests_by_label[bucket] = (bucket_plan.term, date_from, date_to)
+
+                requests_by_label[""] = (plan.term, date_from, date_to)  # Overall total
+                counts = self._count_buckets(requests_by_label)
+                total = counts.pop("")
+
+                label = facet.replace("_", " ").capitalize()
+                rows = [f"| {bucket} | {count:,} |" for bucket, count in counts.items()]
+                output = (
+                    f"## PubMed Counts\n\n**Query**: {plan.term}\n"
+                    + (f"**Date range**: {date_from or 'Any'} to {date_to or 'Any'}\n" if date_from or date_to else "")
+                    + f"\n| {label} | Articles |\n|---|---:|\n"
+                    + "\n".join(rows)
+                    + f"\n\n**Total matching**: {total:,} articles\n"
+                )
+                if facet != "year":
+                    output += "\n*Buckets can overlap or leave articles out, so they need not sum to the total.*\n"
+                return output
+
+            except Exception as e:
+                return f"## PubMed Counts Error\n\nAn error occurred while counting articles: {str(e)}\n\nPlease try again with different search terms or check your network connection."
+
+    def export_records(
+        self,
+        query: Optional[str] = None,
+        author: Optional[str] = None,
+        journal: Optional[str] = None,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        publication_type: Optional[str] = None,
+        max_records: int = 10000,
+        job_id: Optional[str] = None,
+        __user__: Optional[dict] = None
+    ) -> str:
+        """
+        Export all records of a large search (e.g., for a systematic review) to a local file.
+
+        The export is checkpointed: if it is interrupted, or does not finish
+        within one call, calling export_records again with the same arguments
+        (or with job_id) continues where it stopped instead of starting over.
+
+        Args:
+            query: Search terms (same syntax as search_pubmed). Not needed when
+                   continuing a job by job_id.
+            author: Filter by author name.
+            journal: Filter by journal name or abbreviation.
+            date_from: Start date (YYYY or YYYY/MM/DD).
+            date_to: End date (YYYY or YYYY/MM/DD).
+            publication_type: Filter by publication type.
+            max_records: Maximum number of records to export (1-50000, default: 10000).
+            job_id: Identifier of an existing export job to continue.
+
+        Returns:
+            A Markdown summary with the job id, progress, and the path of the
+            JSON Lines output file (one full record per line, including MeSH
+            terms, keywords, affiliations and grants).
+
+        Example:
+            export_records(query="sepsis biomarkers", date_from="2010", max_records=20000)
+        """
+        with self._request_scope(priority="batch", user=__user__):
+            try:
+                tenant = re.sub(r"[^A-Za-z0-9_.-]+", "_", str((__user__ or {}).get("id") or "default"))
+                jobs_dir = os.path.join(self._cache_dir, "exports", tenant)
+                max_records = max(1, min(50000, max_records))
+
+                if not job_id and not query:
+                    return "## PubMed Export\n\nPlease provide a query (or the job_id of an export to continue)."
+                if query:
+                    plan = self._query_plan(
+                        query,
+                        author=author,
+                        journal=journal,
+                        date_from=date_from,
+                        date_to=date_to,
+                        publication_type=publication_type
+                    )
+                if not job_id:
+                    job_id = "export-" + hashlib.sha1(f"{plan.cache_key}:{max_records}".encode("utf-8")).hexdigest()[:12]
+
+                job_id = re.sub(r"[^A-Za-z0-9_.-]+", "_", job_id.strip())
+                directory = os.path.join(jobs_dir, job_id)
+                if os.path.exists(os.path.join(directory, "checkpoint.json")):
+                    job = _ExportJob(directory)
+                elif query:
+                    ids = self._search_all_ids(plan.term, max_records, plan.date_from, plan.date_to)
+                    job = _ExportJob.create(
+                        directory,
+                        ids,
+                        self._export_chunk_size,
+                        {"job_id": job_id, "term": plan.term, "date_params": plan.date_params}
+                    )
+                else:
+                    return f"## PubMed Export\n\nNo export job named **{job_id}**."
+
+                done_before = len(job.state["chunks"])
+                dates = job.state.get("date_params")
+                succeeded = self._run_export_job(job, self._export_time_budget)
+
+                output = (
+                    f"## PubMed Export\n\n**Job**: {job_id}\n**Query**: {job.state['term']}\n"
+                    + (f"**Date range**: {dates['mindate']} to {dates['maxdate']}\n" if dates else "")
+                    + f"**Records**: {job.state['total']:,}\n"
+                    f"**Chunks done**: {len(job.state['chunks'])} of {job.chunk_count} ({len(job.state['chunks']) - done_before} in this call)\n"
+                    f"**Output**: {job.output_path}\n"
+                )
+                if job.complete:
+                    if np is not None:
+                        # Also keep the export as a local collection for count_pubmed(collection=...)
+                        if self._open_columnar_store(job_id) is None:
+                            self._write_columnar_store(job_id, job.records())
+                        output += f"\n**Status**: complete. Count it locally with count_pubmed(query=\"\", collection=\"{job_id}\").\n"
+                    else:
+                        output += "\n**Status**: complete.\n"
+                elif not succeeded:
+                    output += f"\n**Status**: stopped after repeated request failures; progress is saved. Call export_records(job_id=\"{job_id}\") to continue.\n"
+                else:
+                    output += f"\n**Status**: in progress; progress is saved. Call export_records(job_id=\"{job_id}\") to continue.\n"
+                return output
+
+            except Exception as e:
+                return f"## PubMed Export Error\n\nAn error occurred during the export: {str(e)}\n\nProgress made so far is saved; call export_records again to continue."
+
+    def watch_topic(
+        self,
+        name: str,
+        query: Optional[str] = None,
+        author: Optional[str] = None,
+        journal: Optional[str] = None,
+        publication_type: Optional[str] = None,
+        max_results: int = 10,
+        detail_level: str = "full",
+        __user__: Optional[dict] = None
+    ) -> str:
+        """
+        Run a saved PubMed search and report only what is new since its last run.
+
+        The first call with a name saves the search and remembers its current
+        results. Later calls with the same name only retrieve articles added to
+        PubMed (or modified) since the previous run, so daily surveillance of a
+        topic stays fast no matter how many articles match in total.
+
+        Args:
+            name: Name of the saved search (e.g., "car-t-lymphoma").
+            query: Search terms. Required the first time; when given later with
+                   different terms or filters, the saved search is redefined and
+                   starts over.
+            author: Filter by author name.
+            journal: Filter by journal name or abbreviation.
+            publication_type: Filter by publication type (e.g., "Review").
+            max_results: Maximum number of new articles to list (1-100, default: 10).
+            detail_level: "full" (default) includes abstracts; "metadata" omits them.
+
+        Returns:
+            A Markdown-formatted list of the newest articles (first run) or of the
+            articles added since the last run, followed by counts of new, updated
+            and tracked articles.
+
+        Example:
+            watch_topic(name="crispr-base-editing", query="base editing", publication_type="Review")
+        """
+        with self._request_scope(user=__user__):
+            try:
+                name = (name or "").strip()
+                if not name:
+                    return "## Saved Search\n\nPlease provide a name for the saved search."
+
+                path = self._saved_search_path(name, __user__)
+                state = self._load_saved_search(path)
+                if query:
+                    term = self._query_plan(query, author=author, journal=journal, publication_type=publication_type).term
+                    if state is None or state["term"] != term:
+                        state = {"name": name, "term": term, "last_run": None, "pmids": []}
+                elif state is None:
+                    return f"## Saved Search\n\nNo saved search named **{name}**. Provide a query to create it."
+
+                max_results = max(1, min(100, max_results))
+                detail_level = "metadata" if (detail_level or "").lower() == "metadata" else "full"
+                today = datetime.now().strftime("%Y/%m/%d")
+                previous_run = state["last_run"]
+                known = set(state["pmids"])
+
+                if previous_run is None:
+                    # Baseline: remember the PMIDs, fetch only the records that are listed
+                    new_ids = self._search_all_ids(state["term"], self._saved_search_max_ids)
+                    shown = new_ids[:max_results]
+                    updated: List[str] = []
+                else:
+                    # Delta: records added (Entrez date) or modified since the last run day.
+                    # The window includes that day, so records seen then are filtered by PMID.
+                    limit = self._saved_search_max_ids
+                    added = self._search_all_ids(state["term"], limit, previous_run, today, date_type="edat")
+                    modified = self._search_all_ids(state["term"], limit, previous_run, today, date_type="mdat")
+                    new_ids = [pmid for pmid in dict.fromkeys(added + modified) if pmid not in known]
+                    updated = [pmid for pmid in modified if pmid in known]
+                    shown = new_ids[:max_results]
+                    self._schedule_delta_fetch(new_ids[max_results:], updated, __user__)
+
+                articles = self._get_articles(shown)
+
+                state["pmids"] = sorted(known.union(new_ids), key=int, reverse=True)[:self._saved_search_max_ids]
+                state["last_run"] = today
+                self._store_saved_search(path, state)
+
+                heading = f"Saved Search: {name}" if previous_run is None else f"Saved Search: {name} (new since {previous_run})"
+                output = self._format_results(articles, state["term"], detail_level=detail_level, heading=heading)
+                if previous_run is None:
+                    output += f"\n**Tracking**: {len(state['pmids'])} articles. Run watch_topic(name=\"{name}\") again to get only new articles.\n"
+                else:
+                    output += f"\n**New**: {len(new_ids)}, **updated**: {len(updated)}, **tracked**: {len(state['pmids'])} articles.\n"
+                return output
+
+            except Exception as e:
+                return f"## Saved Search Error\n\nAn error occurred while running the saved search: {str(e)}\n\nPlease try again or check your network connection."
+
+    def find_similar_papers(
+        self,
+        text: Optional[str] = None,
+        pmid: Optional[str] = None,
+        max_results: int = 10,
+        __user__: Optional[dict] = None
+    ) -> str:
+        """
+        Find semantically similar papers among articles retrieved earlier, without querying PubMed.
+
+        Every article fetched with abstracts (by search_pubmed, get_abstracts or
+        expand_citations) is added to a local semantic index. This function
+        searches that index by meaning rather than exact keywords.
+
+        Args:
+            text: Free-text description of what you are looking for
+                  (e.g., "resistance mechanisms to EGFR inhibitors in lung cancer").
+            pmid: Alternatively, a PMID whose similar papers should be found. The
+                  article must have been retrieved before.
+            max_results: Maximum number of articles to return (1-100, default: 10).
+
+        Returns:
+            A Markdown-formatted list of the most similar locally indexed articles
+            with titles, authors, journal, date, PMID/DOI and a similarity score.
+            Use get_abstracts to read their abstracts.
+
+        Example:
+            find_similar_papers(text="CRISPR off-target effects detection", max_results=5)
+        """
+        with self._request_scope(user=__user__):
+            try:
+                index = self._get_semantic_index()
+                if index is None:
+                    return "## Similar Papers\n\nSemantic search requires NumPy, which is not installed."
+                if not len(index):
+                    return "## Similar Papers\n\nThe local index is empty. Run search_pubmed first; retrieved articles are indexed automatically."
+
+                max_results = max(1, min(100, max_results))
+                pmid = (pmid or "").strip()
+                if pmid:
+                    query_vector = index.vector(pmid)
+                    if query_vector is None:
+                        return f"## Similar Papers\n\nPMID {pmid} is not in the local index. Retrieve it with get_abstracts first."
+                    label = f"similar to PMID {pmid}"
+                elif text and text.strip():
+                    query_vector = self._embedder.embed([text])[0]
+                    label = text.strip()
+                else:
+                    return "## Similar Papers\n\nProvide either text or a PMID."
+
+                matches = index.search(query_vector, max_results, exclude=(pmid,) if pmid else ())
+                articles = []
+                for match_pmid, score in matches:
+                    with self._record_lock:
+                        article = self._record_cache.get(match_pmid)
+                    article = article or index.metadata(match_pmid)
+                    if article:
+                        articles.append(dict(article, abstract=article.get("abstract", ""), title=f"{article['title']} (similarity {score:.2f})"))
+
+                output = self._format_results(
+                    articles,
+                    label,
+                    detail_level="metadata",
+                    heading="Similar Papers"
+                )
+                output += f"\n**Local index**: {len(index)} articles\n"
+                return output
+
+            except Exception as e:
+                return f"## Similar Papers Error\n\nAn error occurred during semantic search: {str(e)}"
+
+    def get_full_text(
+        self,
+        ids: Union[List[str], str],
+        max_chars: int = 20000,
+        __user__: Optional[dict] = None
+    ) -> str:
+        """
+        Retrieve the full text of open-access articles from PubMed Central (PMC).
+
+        Use this when an abstract is not enough, e.g. to read methods or results
+        in detail. Only articles in the PMC open-access subset have full text;
+        for others the abstract is shown.
+
+        Args:
+            ids: PubMed IDs (e.g., ["38123456"]) and/or PMC IDs (e.g., ["PMC10234567"]),
+                 at most 10. A comma- or space-separated string is also accepted.
+            max_chars: Maximum characters of body text per article (1000-100000,
+                       default: 20000).
+
+        Returns:
+            A Markdown document per article with metadata, abstract and body
+            sections (figures, tables and references omitted).
+
+        Example:
+            get_full_text(ids=["PMC10234567"], max_chars=10000)
+        """
+        with self._request_scope(user=__user__):
+            try:
+                if isinstance(ids, str):
+                    ids = re.split(r"[\s,;]+", ids)
+
+                requested = [str(identifier).strip() for identifier in ids if str(identifier).strip()]
+                requested = list(dict.fromkeys(
+                    identifier.upper() if identifier.upper().startswith("PMC") else identifier for identifier in requested
+                ))
+                invalid = [
+                    identifier for identifier in requested
+                    if not (identifier.isdigit() or (identifier.startswith("PMC") and identifier[3:].isdigit()))
+                ]
+                requested = [identifier for identifier in requested if identifier not in invalid][:10]
+                if not requested:
+                    return "## PMC Full Text\n\nNo valid PMIDs or PMC IDs were provided."
+
+                max_chars = max(1000, min(100000, max_chars))
+                resolved = self._resolve_pmc_ids(requested)
+                records = self._fetch_full_text(list(dict.fromkeys(resolved.values())), max_chars)
+
+                output = self._format_full_text(records)
+                not_found = [identifier for identifier in requested if identifier not in resolved] + invalid
+                if not_found:
+                    output += f"**No PMC record**: {', '.join(not_found)}\n"
+                return output
+
+            except Exception as e:
+                return f"## PMC Full Text Error\n\nAn error occurred while retrieving full text: {str(e)}\n\nPlease check the IDs or your network connection."
+
+    def lookup_mesh(self, term: str, max_results: int = 5, __user__: Optional[dict] = None) -> str:
+        """
+        Look up MeSH (Medical Subject Headings) descriptors for a term.
+
+        Use this to find the controlled vocabulary term for a concept before
+        searching, e.g. to search with [MeSH Terms] instead of free text.
+
+        Args:
+            term: Concept to look up (e.g., "heart attack")
+            max_results: Maximum number of descriptors (1-20, default: 5)
+
+        Returns:
+            A Markdown list of descriptors with MeSH UI, tree numbers, entry
+            terms (synonyms), scope note and a ready-to-use search tag.
+
+        Example:
+            lookup_mesh(term="heart attack")
+        """
+        with self._request_scope(user=__user__):
+            try:
+                term = (term or "").strip()
+                if not term:
+                    return "## MeSH Lookup\n\nNo term was provided."
+
+                max_results = max(1, min(20, max_results))
+                uids = self._esearch("mesh", term, retmax=max_results).get("idlist", [])
+                descriptors = self._parse_mesh_summary(self._esummary("mesh", uids)) if uids else []
+                if not descriptors:
+                    return f"## MeSH Lookup\n\nNo MeSH descriptors found for: **{term}**"
+
+                output = f"## MeSH Lookup\n\n**Term**: {term}\n\n"
+                for i, descriptor in enumerate(descriptors, 1):
+                    output += f"### {i}. {descriptor['name']}\n\n"
+                    output += f"**MeSH UI**: {descriptor['ui']}"
+                    if descriptor["tree_numbers"]:
+                        output += f" | **Tree numbers**: {', '.join(descriptor['tree_numbers'])}"
+                    output += "\n"
+                    if descriptor["entry_terms"]:
+                        output += f"**Entry terms**: {'; '.join(descriptor['entry_terms'][:15])}\n"
+                    if descriptor["scope_note"]:
+                        output += f"**Scope note**: {descriptor['scope_note']}\n"
+                    output += f"**Search tag**: `\"{descriptor['name']}\"[MeSH Terms]`\n\n"
+                return output
+
+            except Exception as e:
+                return f"## MeSH Lookup Error\n\nAn error occurred while looking up MeSH terms: {str(e)}"
+
+    def manage_cache(self, action: str = "stats", __user__: Optional[dict] = None) -> str:
+        """
+        Report and maintain the tool's caches (administrators only).
+
+        Use this to check how well the caches work after changing the cache
+        valves, or to reclaim space, without redeploying the tool.
+
+        Args:
+            action: One of:
+                    - "stats": entries, size, hit ratio and oldest entry per cache (default)
+                    - "warm": load dependencies, indexes and the NCBI connection ahead of the next call
+                    - "compact": drop stale entries that cannot be revalidated and reclaim disk space
+                    - "purge": empty the response and record caches (saved searches and exports are kept)
+
+        Returns:
+            A Markdown report of the action's result followed by current cache statistics.
+
+        Example:
+            manage_cache(action="compact")
+        """
+        if (__user__ or {}).get("role") != "admin":
+            return "## PubMed Cache\n\nCache management is only available to administrators."
+
+        def size(nbytes):
+            for unit in ("B", "KB", "MB", "GB"):
+                if nbytes < 1024 or unit == "GB":
+                    return f"{nbytes:.0f} {unit}" if unit == "B" else f"{nbytes:.1f} {unit}"
+                nbytes /= 1024
+
+        def age(seconds):
+            if seconds is None:
+                return "n/a"
+            minutes, secs = divmod(int(seconds), 60)
+            hours, minutes = divmod(minutes, 60)
+            return f"{hours}h {minutes}m" if hours else f"{minutes}m {secs}s"
+
+        with self._request_scope(user=__user__):
+            try:
+                action = (action or "stats").strip().lower()
+                if action not in ("stats", "warm", "compact", "purge"):
+                    return f"## PubMed Cache\n\nUnknown action: **{action}**. Use one of: stats, warm, compact, purge."
+
+                output = "## PubMed Cache\n\n"
+                backend = self._get_shared_backend()
+                if action == "warm":
+                    timings = self._warm_up()
+                    output += "**Warmed**: " + ", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in timings.items()) + "\n\n"
+                elif action == "compact":
+                    removed = self._response_cache.compact(self._response_cache_ttl)
+                    now = time.time()
+                    expired = [token for token, entry in list(self._cursor_cache.items()) if now - entry["created"] > self._cursor_ttl]
+                    for token in expired:
+                        self._cursor_cache.pop(token, None)
+                    shared = backend.trim("response:", self._response_cache.max_bytes) + backend.compact() if backend is not None else 0
+                    output += f"**Compacted**: {removed} stale responses, {len(expired)} expired cursors, {shared} expired or over-budget shared entries removed\n\n"
+                elif action == "purge":
+                    responses = self._response_cache.clear()
+                    with self._record_lock:
+                        records = len(self._record_cache)
+                        self._record_cache.clear()
+                        self._fragment_cache.clear()
+                    shared = backend.purge() if backend is not None else 0
+                    output += f"**Purged**: {responses} responses, {records} records, {shared} shared entries\n\n"
+
+                cache = self._response_cache.stats()
+                output += "### Response Cache (this worker)\n\n"
+                output += f"**Entries**: {cache['entries']} | **Size**: {size(cache['bytes'])} of {size(cache['max_bytes'])} (compressed)\n"
+                output += f"**Hit ratio**: {cache['hit_ratio']:.1%} ({cache['hits']} hits, {cache['misses']} misses, {cache['revalidations']} revalidated, {cache['evictions']} evicted)\n"
+                output += f"**Oldest entry**: {age(cache['oldest_age'])} | **TTL**: {self._response_cache_ttl} s\n\n"
+                output += f"**Parsed records**: {len(self._record_cache)} of {self._record_cache_size} | "
+                output += f"**Rendered fragments**: {len(self._fragment_cache)} of {self._fragment_cache_size} | "
+                output += f"**Cursors**: {len(self._cursor_cache)}\n\n" if backend is None else "**Cursors**: in the shared cache\n\n"
+
+                output += f"### Shared Cache ({self._coordination or 'none'})\n\n"
+                if backend is None:
+                    output += "Not in use.\n\n"
+                else:
+                    shared_stats = backend.stats()
+                    for prefix, bucket in sorted(shared_stats.items()):
+                        expiry = bucket["earliest_expiry"]
+                        output += f"- **{prefix}**: {bucket['entries']} entries, {size(bucket['bytes'])}"
+                        output += f", next expiry in {age(expiry - time.time())}\n" if expiry else "\n"
+                    if not shared_stats:
+                        output += "- Empty\n"
+                    if backend.size_on_disk():
+                        output += f"- **File size**: {size(backend.size_on_disk())}\n"
+                    output += "\n"
+
+                prefetch = self._prefetcher.stats()
+                output += f"### Prefetch ({'on' if self._prefetch else 'off'})\n\n"
+                output += f"**Runs**: {prefetch['runs']} | **Requests**: {prefetch['requests']} | **Prefetched**: {prefetch['prefetched']} | **Used**: {prefetch['hits']} ({prefetch['hit_rate']:.1%})\n\n"
+
+                output += f"### Disk ({self._cache_dir})\n\n"
+                usage = {}
+                if os.path.isdir(self._cache_dir):
+                    for entry in os.scandir(self._cache_dir):
+                        name = entry.name.split(".", 1)[0] if entry.is_file() else entry.name
+                        if entry.is_file():
+                            usage[name] = usage.get(name, 0) + entry.stat().st_size
+                        else:
+                            usage[name] = usage.get(name, 0) + sum(
+                                os.path.getsize(os.path.join(root, file)) for root, _, files in os.walk(entry.path) for file in files
+                            )
+                for name, nbytes in sorted(usage.items()):
+                    output += f"- **{name}**: {size(nbytes)}\n"
+                if not usage:
+                    output += "- Empty\n"
+                return output
 
+            except Exception as e:
+                return f"## PubMed Cache Error\n\nAn error occurred while managing the cache: {str(e)}"
 
 # For testing outside OpenWebUI
 if __name__ == "__main__":
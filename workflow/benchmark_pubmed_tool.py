@@ -0,0 +1,179 @@
+"""
+Benchmark script for PubMed Search Tool
+
+Measures cold-start costs against a local mock E-utilities server:
+- module import + Tools() construction time in a fresh interpreter
+- latency of the first search_pubmed call, cold and after Tools._warm_up()
+- efetch fetch+parse cost per MB of XML (CPU time and peak traced memory),
+  from the socket and from the response cache
+
+The rate limiter's request spacing is disabled in the first-call runs so the
+numbers reflect the tool's own overhead.
+
+Use --max-import-ms / --max-first-call-ms / --max-parse-ms-per-mb as
+regression gates (non-zero exit status when a median exceeds its limit).
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+WORKFLOW_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(os.path.dirname(WORKFLOW_DIR), "results")
+sys.path.insert(0, WORKFLOW_DIR)
+
+from mock_eutils import MockEUtilsServer
+
+IMPORT_SNIPPET = """
+import sys, time
+start = time.perf_counter()
+sys.path.insert(0, {results!r})
+import pubmed_search_tool
+pubmed_search_tool.Tools()
+print(time.perf_counter() - start)
+"""
+
+FIRST_CALL_SNIPPET = """
+import json, sys, tempfile, time
+sys.path.insert(0, {results!r})
+sys.path.insert(0, {workflow!r})
+import pubmed_search_tool
+from mock_eutils import point_tool_at
+tool = point_tool_at(pubmed_search_tool.Tools(), {base_url!r})
+tool._cache_dir = tempfile.mkdtemp()
+tool._min_request_interval = 0  # Measure tool overhead, not NCBI request spacing
+warm_up = {{}}
+if {warm!r}:
+    warm_up = tool._warm_up()
+start = time.perf_counter()
+result = tool.search_pubmed(query="gene regulation", max_results=10, rerank=True)
+elapsed = time.perf_counter() - start
+assert "PubMed Search Results" in result, result
+print(json.dumps({{"first_call": elapsed, "warm_up": warm_up}}))
+"""
+
+PARSE_SNIPPET = """
+import json, sys, tempfile, time, tracemalloc
+sys.path.insert(0, {results!r})
+sys.path.insert(0, {workflow!r})
+import pubmed_search_tool
+from mock_eutils import point_tool_at
+tool = point_tool_at(pubmed_search_tool.Tools(), {base_url!r})
+tool._cache_dir = tempfile.mkdtemp()
+tool._min_request_interval = 0
+pmids = [str(30000000 + i) for i in range(200)]
+tool._fetch_article_details(pmids)  # Warm the HTTP connection and the response cache
+def fetch():
+    if not {cached!r}:
+        tool._response_cache = type(tool._response_cache)()
+    stats = {{}}
+    assert len(tool._fetch_article_details(pmids, stats=stats)) == 200
+    return stats
+start = time.process_time()  # Includes the in-process mock server's threads
+stats = fetch()
+cpu = time.process_time() - start
+tracemalloc.start()  # Separate run: tracing slows allocation down
+fetch()
+peak = tracemalloc.get_traced_memory()[1]
+tracemalloc.stop()
+size = stats.get("bytes") or len(tool._response_cache.decompress(next(iter(tool._response_cache._entries.values()))))
+print(json.dumps({{"cpu": cpu, "peak": peak, "bytes": size}}))
+"""
+
+
+def run_snippet(snippet: str) -> str:
+    """Run a snippet in a fresh interpreter and return its last output line."""
+    completed = subprocess.run(
+        [sys.executable, "-c", snippet],
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    return completed.stdout.strip().splitlines()[-1]
+
+
+def bench_import(runs: int) -> list:
+    """Seconds to import the module and construct Tools, one fresh process per run."""
+    return [float(run_snippet(IMPORT_SNIPPET.format(results=RESULTS_DIR))) for _ in range(runs)]
+
+
+def bench_first_call(runs: int, base_url: str, warm: bool) -> list:
+    """Seconds for the first search_pubmed call in a fresh process."""
+    timings = []
+    for _ in range(runs):
+        output = run_snippet(FIRST_CALL_SNIPPET.format(
+            results=RESULTS_DIR,
+            workflow=WORKFLOW_DIR,
+            base_url=base_url,
+            warm=warm
+        ))
+        timings.append(json.loads(output)["first_call"])
+    return timings
+
+
+def bench_parse(runs: int, base_url: str, cached: bool) -> tuple:
+    """CPU seconds and peak traced bytes per MB of efetch XML, one fresh process per run."""
+    cpu, peak = [], []
+    for _ in range(runs):
+        output = json.loads(run_snippet(PARSE_SNIPPET.format(
+            results=RESULTS_DIR,
+            workflow=WORKFLOW_DIR,
+            base_url=base_url,
+            cached=cached
+        )))
+        megabytes = output["bytes"] / 2 ** 20
+        cpu.append(output["cpu"] / megabytes)
+        peak.append(output["peak"] / 2 ** 20 / megabytes)
+    return cpu, peak
+
+
+def report(name: str, timings: list) -> float:
+    """Print a summary line and return the median in milliseconds."""
+    median_ms = statistics.median(timings) * 1000
+    print(f"{name:<28} median {median_ms:8.1f} ms   min {min(timings) * 1000:8.1f} ms   max {max(timings) * 1000:8.1f} ms")
+    return median_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="Fresh processes per measurement")
+    parser.add_argument("--max-import-ms", type=float, default=None, help="Fail if median import time exceeds this")
+    parser.add_argument("--max-first-call-ms", type=float, default=None, help="Fail if median cold first call exceeds this")
+    parser.add_argument("--max-parse-ms-per-mb", type=float, default=None, help="Fail if median efetch parse CPU per MB exceeds this")
+    args = parser.parse_args()
+
+    server = MockEUtilsServer().start()
+
+    print("=" * 60)
+    print("PubMed Search Tool - Cold Start Benchmark")
+    print("=" * 60)
+    import_ms = report("import + Tools()", bench_import(args.runs))
+    cold_ms = report("first call (cold)", bench_first_call(args.runs, server.base_url, warm=False))
+    report("first call (after warm-up)", bench_first_call(args.runs, server.base_url, warm=True))
+    parse_cpu, parse_peak = bench_parse(args.runs, server.base_url, cached=False)
+    parse_ms = report("efetch parse CPU per MB", parse_cpu)
+    print(f"{'efetch parse peak memory':<28} median {statistics.median(parse_peak):8.2f} MB per MB of XML")
+    cached_cpu, cached_peak = bench_parse(args.runs, server.base_url, cached=True)
+    report("cached efetch CPU per MB", cached_cpu)
+    print(f"{'cached efetch peak memory':<28} median {statistics.median(cached_peak):8.2f} MB per MB of XML")
+    server.shutdown()
+
+    failed = False
+    if args.max_import_ms is not None and import_ms > args.max_import_ms:
+        print(f"\n[FAIL] import median {import_ms:.1f} ms > {args.max_import_ms} ms")
+        failed = True
+    if args.max_first_call_ms is not None and cold_ms > args.max_first_call_ms:
+        print(f"\n[FAIL] cold first call median {cold_ms:.1f} ms > {args.max_first_call_ms} ms")
+        failed = True
+    if args.max_parse_ms_per_mb is not None and parse_ms > args.max_parse_ms_per_mb:
+        print(f"\n[FAIL] efetch parse median {parse_ms:.1f} ms/MB > {args.max_parse_ms_per_mb} ms/MB")
+        failed = True
+    return not failed
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,366 @@
+"""
+Load and soak test harness for the PubMed Search Tool
+
+Drives many concurrent virtual users through the full Tools call path
+(scheduler, caches, HTTP session, parsing, formatting) against a local mock
+E-utilities server, and reports:
+- latency histograms and p50/p95/p99 per tool call
+- resource curves sampled over time (RSS, threads, TCP connections opened,
+  requests sent, response-cache size)
+- limiter fairness across users (Jain's index over per-user throughput)
+
+Scenarios are JSON documents (see BUILTIN_SCENARIOS for the format); keys
+given on the command line override the scenario. Gates (scenario "gates" or
+--max-* options) turn the run into a regression check with a non-zero exit
+status on failure.
+
+Examples:
+    python3 workflow/loadtest_pubmed_tool.py --scenario chat --users 50 --duration 3600
+    python3 workflow/loadtest_pubmed_tool.py --scenario-file soak.json --report soak_report.json
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+
+WORKFLOW_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(os.path.dirname(WORKFLOW_DIR), "results")
+sys.path.insert(0, WORKFLOW_DIR)
+sys.path.insert(0, RESULTS_DIR)
+
+from mock_eutils import MockEUtilsServer, point_tool_at
+from pubmed_search_tool import Tools
+
+BUILTIN_SCENARIOS = {
+    "chat": {
+        "users": 50,
+        "duration": 60,             # Seconds of load after ramp-up starts
+        "ramp_up": 10,              # Seconds over which users start
+        "think_time": [0.5, 3.0],   # Uniform pause between a user's calls (seconds)
+        "cache_hit_ratio": 0.5,     # Share of queries drawn from a small pool of popular queries
+        "hot_queries": 20,          # Size of that pool
+        "server_latency": 0.05,     # Mock E-utilities response delay (seconds)
+        "request_interval": 0.34,   # Tool rate-limit interval (NCBI: 0.34 without API key)
+        "sample_interval": 1.0,     # Seconds between resource samples
+        "mix": [
+            {"call": "search_pubmed", "weight": 5, "args": {"max_results": 10}},
+            {"call": "search_pubmed", "weight": 2, "args": {"max_results": 20, "detail_level": "metadata"}},
+            {"call": "get_abstracts", "weight": 2},
+            {"call": "count_pubmed", "weight": 1, "args": {"facet": "year", "date_from": "2020", "date_to": "2024"}},
+        ],
+        "gates": {},
+    },
+    "smoke": {
+        "users": 5,
+        "duration": 10,
+        "ramp_up": 1,
+        "think_time": [0.1, 0.3],
+        "cache_hit_ratio": 0.7,
+        "hot_queries": 5,
+        "server_latency": 0.01,
+        "request_interval": 0.0,
+        "sample_interval": 0.5,
+        "mix": [
+            {"call": "search_pubmed", "weight": 3, "args": {"max_results": 10}},
+            {"call": "get_abstracts", "weight": 1},
+        ],
+        "gates": {"error_rate": 0.0, "p99_ms": 5000},
+    },
+}
+
+WORDS = (
+    "gene regulation cancer immunotherapy crispr diabetes insulin microbiome sepsis biomarker "
+    "alzheimer tau amyloid stroke hypertension obesity vaccine antibody tumor metastasis "
+    "inflammation cytokine kinase inhibitor resistance mutation sequencing transcriptome"
+).split()
+
+HISTOGRAM_EDGES_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000, float("inf")]
+
+PMID_RE = re.compile(r"\*\*PMID\*\*: \[(\d+)\]")
+
+
+def percentile(values: list, fraction: float) -> float:
+    """Nearest-rank percentile of a list of numbers."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+
+def histogram(values_ms: list) -> list:
+    """Counts per HISTOGRAM_EDGES_MS bucket (upper bounds)."""
+    counts = [0] * len(HISTOGRAM_EDGES_MS)
+    for value in values_ms:
+        for index, edge in enumerate(HISTOGRAM_EDGES_MS):
+            if value <= edge:
+                counts[index] += 1
+                break
+    return counts
+
+
+def rss_mb() -> float:
+    """Resident set size of this process in MB (Linux /proc, else peak RSS)."""
+    try:
+        with open("/proc/self/statm", "r") as handle:
+            return int(handle.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class LoadTest:
+    """One scenario run: virtual users, a resource sampler, and the collected results."""
+
+    def __init__(self, scenario: dict, seed: int = 1):
+        self.scenario = scenario
+        self.rng = random.Random(seed)
+        self.server = MockEUtilsServer(latency=scenario["server_latency"], vary_by_term=True).start()
+        self.tool = point_tool_at(Tools(), self.server.base_url)
+        self.tool._cache_dir = tempfile.mkdtemp(prefix="pubmed_loadtest_")
+        self.tool._min_request_interval = scenario["request_interval"]
+        self.hot_queries = [self._random_query(self.rng) for _ in range(scenario["hot_queries"])]
+        self.calls = []     # (seconds since start, user, call, latency seconds, error)
+        self.samples = []   # Resource curve points
+        self._lock = threading.Lock()
+        self._unique = 0
+
+    @staticmethod
+    def _random_query(rng: random.Random) -> str:
+        return " ".join(rng.sample(WORDS, 2))
+
+    def _query(self, rng: random.Random) -> str:
+        """A popular query (likely cached) or a new one, according to cache_hit_ratio."""
+        if rng.random() < self.scenario["cache_hit_ratio"]:
+            return rng.choice(self.hot_queries)
+        with self._lock:
+            self._unique += 1
+            unique = self._unique
+        return f"{self._random_query(rng)} {unique}"
+
+    def _user(self, index: int, start: float, stop_at: float):
+        rng = random.Random(index)
+        user = {"id": f"user-{index}"}
+        mix = self.scenario["mix"]
+        weights = [entry.get("weight", 1) for entry in mix]
+        seen_pmids = []
+
+        time.sleep(self.scenario["ramp_up"] * index / max(1, self.scenario["users"]))
+        while time.monotonic() < stop_at:
+            entry = rng.choices(mix, weights=weights)[0]
+            args = dict(entry.get("args", {}))
+            if entry["call"] == "get_abstracts":
+                args["pmids"] = rng.sample(seen_pmids, min(3, len(seen_pmids))) if seen_pmids else ["30000000"]
+            elif entry["call"] == "expand_citations":
+                args["pmids"] = seen_pmids[:1] or ["30000000"]
+            else:
+                args["query"] = self._query(rng)
+
+            call_start = time.perf_counter()
+            try:
+                output = getattr(self.tool, entry["call"])(**args, __user__=user)
+                error = "Error" in output.split("\n", 1)[0]
+            except Exception:
+                output, error = "", True
+            latency = time.perf_counter() - call_start
+
+            if entry["call"] == "search_pubmed":
+                seen_pmids = PMID_RE.findall(output)[:20] or seen_pmids
+            with self._lock:
+                self.calls.append((time.monotonic() - start, user["id"], entry["call"], latency, error))
+
+            low, high = self.scenario["think_time"]
+            time.sleep(rng.uniform(low, high))
+
+    def _sample(self, start: float, done: threading.Event):
+        while True:
+            with self._lock:
+                completed = len(self.calls)
+            self.samples.append({
+                "t": round(time.monotonic() - start, 2),
+                "rss_mb": round(rss_mb(), 1),
+                "threads": threading.active_count(),
+                "connections": self.server.connections,
+                "requests": sum(self.server.requests.values()),
+                "response_cache_mb": round(self.tool._response_cache.total_bytes / 2 ** 20, 2),
+                "calls": completed,
+            })
+            if done.wait(self.scenario["sample_interval"]):
+                return
+
+    def run(self) -> dict:
+        """Run the scenario and return the report dictionary."""
+        start = time.monotonic()
+        stop_at = start + self.scenario["duration"]
+        done = threading.Event()
+        sampler = threading.Thread(target=self._sample, args=(start, done), daemon=True)
+        sampler.start()
+
+        users = [
+            threading.Thread(target=self._user, args=(index, start, stop_at), daemon=True)
+            for index in range(self.scenario["users"])
+        ]
+        for thread in users:
+            thread.start()
+        for thread in users:
+            thread.join()
+        done.set()
+        sampler.join()
+        self.server.shutdown()
+        return self.report(time.monotonic() - start)
+
+    def report(self, elapsed: float) -> dict:
+        """Latency percentiles, histograms, fairness and resource summary."""
+        per_call = {}
+        for _, _, call, latency, error in self.calls:
+            stats = per_call.setdefault(call, {"latencies_ms": [], "errors": 0})
+            stats["latencies_ms"].append(latency * 1000)
+            stats["errors"] += error
+
+        all_ms = [latency * 1000 for _, _, _, latency, _ in self.calls]
+        errors = sum(error for *_, error in self.calls)
+
+        # Jain's fairness index over per-user completed calls (1.0 = perfectly even)
+        per_user = {}
+        for _, user, _, _, _ in self.calls:
+            per_user[user] = per_user.get(user, 0) + 1
+        throughput = list(per_user.values())
+        fairness = (sum(throughput) ** 2 / (len(throughput) * sum(x * x for x in throughput))) if throughput else 0.0
+
+        steady = self.samples[len(self.samples) // 4:] or self.samples
+        cache = self.tool._response_cache
+        lookups = cache.hits + cache.misses + cache.revalidations
+        return {
+            "scenario": self.scenario,
+            "elapsed_s": round(elapsed, 1),
+            "calls": len(self.calls),
+            "throughput_per_s": round(len(self.calls) / elapsed, 2) if elapsed else 0.0,
+            "error_rate": errors / len(self.calls) if self.calls else 0.0,
+            "p50_ms": percentile(all_ms, 0.50),
+            "p95_ms": percentile(all_ms, 0.95),
+            "p99_ms": percentile(all_ms, 0.99),
+            "per_call": {
+                call: {
+                    "count": len(stats["latencies_ms"]),
+                    "errors": stats["errors"],
+                    "p50_ms": percentile(stats["latencies_ms"], 0.50),
+                    "p95_ms": percentile(stats["latencies_ms"], 0.95),
+                    "p99_ms": percentile(stats["latencies_ms"], 0.99),
+                    "histogram": histogram(stats["latencies_ms"]),
+                }
+                for call, stats in per_call.items()
+            },
+            "histogram_edges_ms": HISTOGRAM_EDGES_MS[:-1] + ["inf"],
+            "fairness_index": round(fairness, 3),
+            "response_cache_hit_ratio": round(cache.hits / lookups, 3) if lookups else 0.0,
+            "requests_per_connection": round(sum(self.server.requests.values()) / max(1, self.server.connections), 1),
+            "rss_growth_mb": round(steady[-1]["rss_mb"] - steady[0]["rss_mb"], 1) if steady else 0.0,
+            "scheduler_granted": dict(self.tool._scheduler.granted),
+            "scheduler_expired": self.tool._scheduler.expired,
+            "samples": self.samples,
+        }
+
+
+def print_report(report: dict):
+    print("=" * 60)
+    print("PubMed Search Tool - Load Test")
+    print("=" * 60)
+    print(f"Users: {report['scenario']['users']}   Duration: {report['elapsed_s']} s   Calls: {report['calls']} "
+          f"({report['throughput_per_s']}/s)   Errors: {report['error_rate']:.2%}")
+    print(f"Latency: p50 {report['p50_ms']:.0f} ms   p95 {report['p95_ms']:.0f} ms   p99 {report['p99_ms']:.0f} ms")
+    print(f"Fairness (Jain): {report['fairness_index']}   Response cache hit ratio: {report['response_cache_hit_ratio']:.0%}   "
+          f"Requests/connection: {report['requests_per_connection']}")
+    print(f"RSS growth after warm-up: {report['rss_growth_mb']} MB   Scheduler: {report['scheduler_granted']} "
+          f"(expired {report['scheduler_expired']})")
+
+    edges = report["histogram_edges_ms"]
+    for call, stats in report["per_call"].items():
+        print(f"\n{call}: {stats['count']} calls, {stats['errors']} errors, "
+              f"p50 {stats['p50_ms']:.0f} ms, p95 {stats['p95_ms']:.0f} ms, p99 {stats['p99_ms']:.0f} ms")
+        peak = max(stats["histogram"]) or 1
+        for edge, count in zip(edges, stats["histogram"]):
+            if count:
+                print(f"  <= {str(edge):>6} ms {count:7d} {'#' * max(1, int(40 * count / peak))}")
+
+    print("\nResource curve (t s, RSS MB, threads, connections, requests, cache MB, calls):")
+    step = max(1, len(report["samples"]) // 20)
+    for sample in report["samples"][::step]:
+        print(f"  {sample['t']:8.1f} {sample['rss_mb']:8.1f} {sample['threads']:5d} {sample['connections']:6d} "
+              f"{sample['requests']:8d} {sample['response_cache_mb']:7.2f} {sample['calls']:7d}")
+
+
+def check_gates(report: dict, gates: dict) -> bool:
+    """Print gate results; True if every gate passes."""
+    limits = {
+        "p50_ms": ("p50 latency", report["p50_ms"], lambda value, limit: value <= limit),
+        "p95_ms": ("p95 latency", report["p95_ms"], lambda value, limit: value <= limit),
+        "p99_ms": ("p99 latency", report["p99_ms"], lambda value, limit: value <= limit),
+        "error_rate": ("error rate", report["error_rate"], lambda value, limit: value <= limit),
+        "rss_growth_mb": ("RSS growth", report["rss_growth_mb"], lambda value, limit: value <= limit),
+        "min_fairness": ("fairness index", report["fairness_index"], lambda value, limit: value >= limit),
+    }
+    passed = True
+    for name, limit in gates.items():
+        if limit is None or name not in limits:
+            continue
+        label, value, check = limits[name]
+        ok = check(value, limit)
+        passed &= ok
+        print(f"[{'PASS' if ok else 'FAIL'}] {label}: {value:.3f} (limit {limit})")
+    return passed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", default="chat", choices=sorted(BUILTIN_SCENARIOS), help="Built-in scenario")
+    parser.add_argument("--scenario-file", help="JSON scenario (keys missing from it come from --scenario)")
+    parser.add_argument("--users", type=int, help="Concurrent virtual users")
+    parser.add_argument("--duration", type=float, help="Seconds of load")
+    parser.add_argument("--cache-hit-ratio", type=float, help="Share of popular (cacheable) queries")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed for query selection")
+    parser.add_argument("--report", help="Write the full report (including resource samples) as JSON")
+    parser.add_argument("--max-p95-ms", type=float, help="Gate: p95 latency limit")
+    parser.add_argument("--max-p99-ms", type=float, help="Gate: p99 latency limit")
+    parser.add_argument("--max-error-rate", type=float, help="Gate: error rate limit (0-1)")
+    parser.add_argument("--max-rss-growth-mb", type=float, help="Gate: RSS growth after warm-up")
+    parser.add_argument("--min-fairness", type=float, help="Gate: minimum Jain fairness index (0-1)")
+    args = parser.parse_args()
+
+    scenario = json.loads(json.dumps(BUILTIN_SCENARIOS[args.scenario]))
+    if args.scenario_file:
+        with open(args.scenario_file, "r", encoding="utf-8") as handle:
+            scenario.update(json.load(handle))
+    for key in ("users", "duration", "cache_hit_ratio"):
+        if getattr(args, key) is not None:
+            scenario[key] = getattr(args, key)
+
+    gates = dict(scenario.get("gates", {}))
+    gates.update({
+        name: value for name, value in {
+            "p95_ms": args.max_p95_ms,
+            "p99_ms": args.max_p99_ms,
+            "error_rate": args.max_error_rate,
+            "rss_growth_mb": args.max_rss_growth_mb,
+            "min_fairness": args.min_fairness,
+        }.items() if value is not None
+    })
+
+    report = LoadTest(scenario, seed=args.seed).run()
+    print_report(report)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as handle:
+            json.dump(report, handle, indent=2)
+        print(f"\nReport written to {args.report}")
+
+    print()
+    return check_gates(report, gates)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
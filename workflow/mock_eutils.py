@@ -0,0 +1,303 @@
+"""
+Local mock of the NCBI E-utilities endpoints used by the PubMed Search Tool.
+
+Serves deterministic synthetic data for esearch, efetch, esummary and elink
+(PubMed, plus PMC full text and MeSH descriptors) so benchmarks and load
+tests can exercise the full tool path without network access or NCBI rate
+limits. Responses are gzip-compressed when the client
+sends Accept-Encoding: gzip, like the real service. With validators=True,
+responses carry an ETag and Last-Modified date, and conditional requests
+for unchanged bodies are answered with 304 Not Modified. Results carry
+synthetic publication dates (HITS_PER_DAY per day, newest first), so pdat
+windows narrow esearch results, and, as on the real service, esearch returns
+no PMIDs past the first 10,000 of a search.
+"""
+
+import gzip
+import json
+import zlib
+import threading
+import time
+from datetime import date
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+TOTAL_HITS = 5000
+FIRST_PMID = 30000000
+NEW_HITS = 3  # Results of edat (added since) windows
+MODIFIED_HITS = 2  # Results of mdat (modified since) windows
+FIRST_PMCID = 7000000  # PMC UID of FIRST_PMID; every third PMID has no PMC record
+PMC_SECTIONS = 40  # Body sections per synthetic full-text article
+LAST_MODIFIED = "Mon, 01 Jan 2024 00:00:00 GMT"  # Sent with validators=True; the synthetic data never changes
+NEWEST_PDAT = date(2024, 12, 31)  # Publication date of the first result
+HITS_PER_DAY = 10  # Default results per publication day, counting back from NEWEST_PDAT
+ESEARCH_MAX_RETSTART = 10000  # Like the real esearch, no PMIDs are returned past this offset
+
+
+def _window(mindate: str, maxdate: str, total: int, per_day: int = HITS_PER_DAY) -> range:
+    """Result indexes whose synthetic publication date lies within a pdat window."""
+    def parse(value, last):
+        parts = [int(part) for part in value.split("/")]
+        if len(parts) == 3:
+            return date(*parts)
+        return date(parts[0], 12, 31) if last else date(parts[0], 1, 1)  # YYYY/MM is treated as YYYY
+
+    first = max(0, (NEWEST_PDAT - parse(maxdate, True)).days) * per_day
+    last = max(0, (NEWEST_PDAT - parse(mindate, False)).days + 1) * per_day
+    return range(min(first, total), min(last, total))
+
+
+def _article_xml(pmid: int) -> str:
+    """Synthetic PubmedArticle element for a PMID."""
+    year = 2000 + pmid % 25
+    return (
+        f"<PubmedArticle><MedlineCitation Status=\"MEDLINE\"><PMID Version=\"1\">{pmid}</PMID>"
+        f"<Article><Journal><Title>Journal of Synthetic Results {pmid % 40}</Title>"
+        f"<JournalIssue><PubDate><Year>{year}</Year><Month>Jan</Month></PubDate></JournalIssue></Journal>"
+        f"<ArticleTitle>Synthetic study {pmid} of gene regulation in model {pmid % 13}</ArticleTitle>"
+        f"<Abstract><AbstractText Label=\"BACKGROUND\">Background of study {pmid}. "
+        + "Gene expression and regulation were measured across conditions. " * 8
+        + f"</AbstractText><AbstractText Label=\"RESULTS\">Results of study {pmid}. "
+        + "Significant differences were observed in treated samples. " * 8
+        + "</AbstractText></Abstract><AuthorList>"
+        + "".join(
+            f"<Author><LastName>Author{i}</LastName><ForeName>A</ForeName>"
+            f"<AffiliationInfo><Affiliation>Institute {i}</Affiliation></AffiliationInfo></Author>"
+            for i in range(6)
+        )
+        + "</AuthorList><PublicationTypeList><PublicationType>Journal Article</PublicationType>"
+        "</PublicationTypeList></Article><MeshHeadingList><MeshHeading>"
+        "<DescriptorName MajorTopicYN=\"N\">Gene Expression Regulation</DescriptorName></MeshHeading>"
+        "</MeshHeadingList><KeywordList><Keyword>gene regulation</Keyword></KeywordList>"
+        f"</MedlineCitation><PubmedData><ArticleIdList><ArticleId IdType=\"pubmed\">{pmid}</ArticleId>"
+        f"<ArticleId IdType=\"doi\">10.5555/synthetic.{pmid}</ArticleId></ArticleIdList></PubmedData>"
+        "</PubmedArticle>"
+    )
+
+
+def _pmc_article_xml(uid: int) -> str:
+    """Synthetic JATS <article> for a PMC UID, with a large body."""
+    pmid = FIRST_PMID + uid - FIRST_PMCID
+    paragraph = "Full-text paragraph describing gene regulation methods and results in detail. " * 12
+    sections = "".join(
+        f"<sec><title>Section {i}</title><p>{paragraph}<xref ref-type=\"bibr\">[{i}]</xref></p>"
+        f"<sec><title>Subsection {i}.1</title><p>{paragraph}</p></sec>"
+        f"<fig><caption><title>Figure {i}</title><p>Figure legend {i}.</p></caption></fig>"
+        f"<table-wrap><table><tr><td>cell {i}</td></tr></table></table-wrap></sec>"
+        for i in range(1, PMC_SECTIONS + 1)
+    )
+    return (
+        "<article article-type=\"research-article\"><front><journal-meta><journal-title-group>"
+        f"<journal-title>Journal of Synthetic Results {pmid % 40}</journal-title></journal-title-group></journal-meta>"
+        f"<article-meta><article-id pub-id-type=\"pmid\">{pmid}</article-id>"
+        f"<article-id pub-id-type=\"pmc\">{uid}</article-id>"
+        f"<article-id pub-id-type=\"doi\">10.5555/synthetic.{pmid}</article-id>"
+        f"<title-group><article-title>Synthetic study {pmid} of gene regulation in model {pmid % 13}</article-title></title-group>"
+        f"<pub-date pub-type=\"epub\"><year>{2000 + pmid % 25}</year></pub-date>"
+        f"<abstract><p>Abstract of full-text study {pmid}.</p></abstract></article-meta></front>"
+        f"<body>{sections}</body><back><ref-list><ref><mixed-citation>Reference</mixed-citation></ref></ref-list></back>"
+        "</article>"
+    )
+
+
+def _mesh_summary(uid: int) -> dict:
+    """Synthetic esummary entry of the MeSH database."""
+    return {
+        "uid": str(uid),
+        "ds_meshui": f"D{uid % 1000000:06d}",
+        "ds_meshterms": [f"Synthetic Descriptor {uid}", f"Synonym {uid} A", f"Synonym {uid} B"],
+        "ds_scopenote": f"Scope note of synthetic descriptor {uid}.",
+        "ds_idxlinks": [{"parent": 0, "treenum": f"C{uid % 25:02d}.{uid % 1000:03d}", "children": []}],
+    }
+
+
+class MockEUtilsHandler(BaseHTTPRequestHandler):
+    """Request handler; behaviour is configured through attributes on the server."""
+
+    protocol_version = "HTTP/1.1"  # Keep-alive, so client connection reuse is observable
+    disable_nagle_algorithm = True  # Headers and body are separate writes; avoid delayed-ACK stalls
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self.server.count_request("HEAD")
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self):
+        self._handle(parse_qs(urlparse(self.path).query))
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self._handle(parse_qs(self.rfile.read(length).decode("utf-8")))
+
+    def _handle(self, query):
+        params = {name: values[0] for name, values in query.items()}
+        endpoint = urlparse(self.path).path.rsplit("/", 1)[-1]
+        self.server.count_request(endpoint)
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        db = params.get("db", "pubmed")
+
+        if endpoint == "esearch.fcgi" and db == "mesh":
+            size = int(params.get("retmax", 20))
+            first = 68000000 + zlib.crc32(params.get("term", "").encode("utf-8")) % 1000
+            result = {"count": "3", "retstart": "0", "idlist": [str(first + i) for i in range(min(3, size))]}
+            self._send(json.dumps({"esearchresult": result}).encode("utf-8"), "application/json")
+
+        elif endpoint == "esearch.fcgi":
+            start = int(params.get("retstart", 0))
+            size = int(params.get("retmax", 20))
+            first = FIRST_PMID
+            if self.server.vary_by_term:
+                # Different queries get different (overlapping) result sets
+                first += zlib.crc32(params.get("term", "").encode("utf-8")) % 1000000 * 10
+            hits = range(self.server.total_hits)
+            if params.get("mindate") and params.get("datetype") == "pdat":
+                hits = _window(params["mindate"], params["maxdate"], self.server.total_hits, self.server.hits_per_day)
+            ids = [str(first + i) for i in hits[start:min(start + size, ESEARCH_MAX_RETSTART)]]
+            result = {"count": str(len(hits)), "retstart": str(start), "idlist": ids}
+            if params.get("datetype") == "edat":
+                # A few records "added" after the regular result set
+                ids = [str(FIRST_PMID + TOTAL_HITS + i) for i in range(NEW_HITS)]
+                result = {"count": str(NEW_HITS), "retstart": "0", "idlist": ids[start:start + size]}
+            elif params.get("datetype") == "mdat":
+                ids = [str(FIRST_PMID + i) for i in range(MODIFIED_HITS)]
+                result = {"count": str(MODIFIED_HITS), "retstart": "0", "idlist": ids[start:start + size]}
+            if params.get("usehistory") == "y":
+                result.update({"webenv": "MOCK_WEBENV", "querykey": "1"})
+            if params.get("rettype") == "count":
+                result = {"count": str(TOTAL_HITS // (1 + len(params.get("term", "")) % 7))}
+            self._send(json.dumps({"esearchresult": result}).encode("utf-8"), "application/json")
+
+        elif endpoint == "esummary.fcgi" and db == "mesh":
+            ids = params.get("id", "").split(",")
+            result = {"uids": ids}
+            for uid in ids:
+                result[uid] = _mesh_summary(int(uid))
+            self._send(json.dumps({"result": result}).encode("utf-8"), "application/json")
+
+        elif endpoint == "esummary.fcgi":
+            ids = params.get("id", "").split(",")
+            result = {"uids": ids}
+            for pmid in ids:
+                result[pmid] = {
+                    "uid": pmid,
+                    "title": f"Synthetic study {pmid}",
+                    "authors": [{"name": f"Author{i} A", "authtype": "Author"} for i in range(6)],
+                    "fulljournalname": f"Journal of Synthetic Results {int(pmid) % 40}",
+                    "pubdate": f"{2000 + int(pmid) % 25} Jan",
+                    "articleids": [{"idtype": "doi", "value": f"10.5555/synthetic.{pmid}"}],
+                }
+            self._send(json.dumps({"result": result}).encode("utf-8"), "application/json")
+
+        elif endpoint == "efetch.fcgi" and db == "pmc":
+            ids = [int(uid) for uid in params.get("id", "").split(",") if uid]
+            body = "<?xml version=\"1.0\"?><pmc-articleset>" + "".join(_pmc_article_xml(uid) for uid in ids) + "</pmc-articleset>"
+            self._send(body.encode("utf-8"), "text/xml")
+
+        elif endpoint == "efetch.fcgi":
+            if "id" in params:
+                ids = [int(pmid) for pmid in params["id"].split(",") if pmid]
+            else:
+                start = int(params.get("retstart", 0))
+                ids = range(FIRST_PMID + start, FIRST_PMID + min(TOTAL_HITS, start + int(params.get("retmax", 20))))
+            body = "<?xml version=\"1.0\"?><PubmedArticleSet>" + "".join(_article_xml(pmid) for pmid in ids) + "</PubmedArticleSet>"
+            self._send(body.encode("utf-8"), "text/xml")
+
+        elif endpoint == "elink.fcgi":
+            pmid = int(params.get("id", FIRST_PMID))
+            links = [str(FIRST_PMID + (pmid * 7 + i) % TOTAL_HITS) for i in range(1, 21)]
+            if params.get("linkname") == "pubmed_pmc":
+                links = [str(FIRST_PMCID + pmid - FIRST_PMID)] if pmid % 3 != 2 else []
+            body = {"linksets": [{"ids": [str(pmid)], "linksetdbs": [{"linkname": params.get("linkname", ""), "links": links}]}]}
+            self._send(json.dumps(body).encode("utf-8"), "application/json")
+
+        else:
+            self.send_error(404)
+
+    def _send(self, body: bytes, content_type: str):
+        etag = f'"{zlib.crc32(body):08x}"'
+        if self.server.validators and (
+            self.headers.get("If-None-Match") == etag
+            or (not self.headers.get("If-None-Match") and self.headers.get("If-Modified-Since") == LAST_MODIFIED)
+        ):
+            self.server.count_request("not_modified")
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        gzipped = "gzip" in self.headers.get("Accept-Encoding", "")
+        if gzipped:
+            body = gzip.compress(body, compresslevel=1)
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        if gzipped:
+            self.send_header("Content-Encoding", "gzip")
+        if self.server.validators:
+            self.send_header("ETag", etag)
+            self.send_header("Last-Modified", LAST_MODIFIED)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class MockEUtilsServer(ThreadingHTTPServer):
+    """Threaded mock server with per-endpoint request and TCP connection counters."""
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        port: int = 0,
+        latency: float = 0.0,
+        vary_by_term: bool = False,
+        validators: bool = False,
+        total_hits: int = TOTAL_HITS
+    ):
+        super().__init__(("127.0.0.1", port), MockEUtilsHandler)
+        self.total_hits = total_hits
+        self.hits_per_day = HITS_PER_DAY
+        self.latency = latency
+        self.vary_by_term = vary_by_term
+        self.validators = validators
+        self.requests = {}
+        self.connections = 0
+        self._lock = threading.Lock()
+
+    def process_request(self, request, client_address):
+        with self._lock:
+            self.connections += 1
+        super().process_request(request, client_address)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_port}/entrez/eutils"
+
+    def count_request(self, endpoint: str):
+        with self._lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+
+    def start(self) -> "MockEUtilsServer":
+        threading.Thread(target=self.serve_forever, name="mock-eutils", daemon=True).start()
+        return self
+
+
+def point_tool_at(tool, base_url: str):
+    """Redirect every E-utilities URL of a Tools instance to the mock server."""
+    for name in dir(tool):
+        if name.startswith("base_url"):
+            endpoint = getattr(tool, name).rsplit("/", 1)[-1]
+            setattr(tool, name, f"{base_url}/{endpoint}")
+    return tool
+
+
+if __name__ == "__main__":
+    server = MockEUtilsServer(port=8765)
+    print(f"Mock E-utilities listening on {server.base_url}")
+    server.serve_forever()
@@ -4,11 +4,17 @@ Test script for PubMed Search Tool
 This script tests all the filtering capabilities of the PubMed search tool.
 """
 
+import gzip
+import json
+import os
+import re
 import sys
+import tempfile
+import threading
 import time
 sys.path.insert(0, '/app/sandbox/session_20260129_164406_e8f5692b459a/results')
 
-from pubmed_search_tool import Tools
+from pubmed_search_tool import Tools, _QueryPlan, _AdaptiveBatchSizer, _RequestScheduler, _SQLiteBackend, _PubMedStreamParser, _VectorIndex, np
 
 # Delay between tests to avoid rate limiting
 TEST_DELAY = 1.5
@@ -152,6 +158,944 @@ def test_abstract_retrieval():
     return True
 
 
+def test_metadata_only_search():
+    """Verify metadata-only results come from esummary without abstracts."""
+    print("\n" + "=" * 60)
+    print("TEST 8: Metadata-Only Search (esummary)")
+    print("=" * 60)
+
+    tool = Tools()
+    result = tool.search_pubmed(
+        query="heart failure treatment",
+        max_results=5,
+        detail_level="metadata"
+    )
+    print(result[:2000] + "..." if len(result) > 2000 else result)
+
+    assert "PubMed Search Results" in result
+    if "No articles found" not in result:
+        assert "**PMID**" in result, "PMID not found in metadata results"
+        assert "**Abstract**" not in result, "Abstract should be omitted in metadata mode"
+        print("\n[PASS] Metadata-only search omits abstracts")
+    else:
+        print("\n[SKIP] No results to verify metadata")
+    return True
+
+
+def test_get_abstracts():
+    """Verify abstracts can be expanded for PMIDs from a metadata-only search."""
+    print("\n" + "=" * 60)
+    print("TEST 9: Lazy Abstract Expansion (get_abstracts)")
+    print("=" * 60)
+
+    tool = Tools()
+    pmids = tool._search_pubmed(query="heart failure treatment", max_results=2)
+    if not pmids:
+        print("\n[SKIP] No PMIDs to expand")
+        return True
+
+    result = tool.get_abstracts(pmids)
+    print(result[:2000] + "..." if len(result) > 2000 else result)
+
+    assert "PubMed Abstracts" in result
+    assert "**Abstract**" in result, "Abstract section not found in results"
+    assert all(pmid in tool._record_cache for pmid in pmids), "Records were not cached"
+    print("\n[PASS] Abstracts expanded and cached")
+    return True
+
+
+def test_cursor_pagination():
+    """Verify a cursor returns the next page without repeating earlier hits."""
+    print("\n" + "=" * 60)
+    print("TEST 10: Cursor Pagination")
+    print("=" * 60)
+
+    tool = Tools()
+    first = tool.search_pubmed(
+        query="cancer immunotherapy",
+        max_results=3,
+        detail_level="metadata"
+    )
+    match = re.search(r'cursor="([^"]+)"', first)
+    assert match, "No next-page cursor in results"
+
+    time.sleep(TEST_DELAY)
+    second = tool.search_pubmed(query="", cursor=match.group(1))
+    print(second[:2000] + "..." if len(second) > 2000 else second)
+
+    assert "### 4." in second, "Second page should continue numbering"
+    first_pmids = set(re.findall(r"\*\*PMID\*\*: \[(\d+)\]", first))
+    second_pmids = set(re.findall(r"\*\*PMID\*\*: \[(\d+)\]", second))
+    assert not first_pmids & second_pmids, "Pages should not overlap"
+    print("\n[PASS] Cursor pagination returned the next page")
+    return True
+
+
+def test_citation_expansion():
+    """Verify citing articles are discovered via ELink."""
+    print("\n" + "=" * 60)
+    print("TEST 11: Citation Expansion (ELink)")
+    print("=" * 60)
+
+    tool = Tools()
+    # PMID 22745249: Jinek et al., Science 2012 (widely cited CRISPR-Cas9 paper)
+    result = tool.expand_citations(
+        pmids=["22745249"],
+        direction="cited_by",
+        depth=1,
+        max_per_node=5,
+        max_results=5
+    )
+    print(result[:2000] + "..." if len(result) > 2000 else result)
+
+    assert "PubMed Citation Expansion" in result
+    assert "Error" not in result
+    if "No linked articles found" not in result:
+        assert "**PMID**" in result
+        assert "[22745249]" not in result, "Seed article should not be listed"
+        print("\n[PASS] Citing articles discovered")
+    else:
+        print("\n[SKIP] No citing articles returned")
+    return True
+
+
+def test_query_canonicalization():
+    """Verify equivalent queries plan to the same canonical request (offline)."""
+    print("\n" + "=" * 60)
+    print("TEST 12: Query Canonicalization")
+    print("=" * 60)
+
+    plan_a = _QueryPlan("CRISPR[Title] AND (Cas9 OR cas12)", publication_type="Review", date_from="2023")
+    plan_b = _QueryPlan("(cas12  OR CAS9) AND crispr[ti] AND review[pt]", publication_type="review", date_from="2023")
+    print(f"Plan A: {plan_a.term} {plan_a.date_params}")
+    print(f"Plan B: {plan_b.term} {plan_b.date_params}")
+
+    assert plan_a.term == plan_b.term, "Equivalent queries should share one canonical term"
+    assert plan_a.cache_key == plan_b.cache_key
+    assert plan_a.term.count("review[pt]") == 1, "Duplicate clause should be dropped"
+    assert "2023" not in plan_a.term, "Dates belong in esearch params, not the term"
+    assert plan_a.date_params["mindate"] == "2023"
+    assert _QueryPlan("machine learning cancer").term == "machine learning cancer", "Phrases must stay intact"
+    print("\n[PASS] Queries canonicalized")
+    return True
+
+
+def test_near_duplicate_collapse():
+    """Verify errata and near-identical records collapse into one entry (offline)."""
+    print("\n" + "=" * 60)
+    print("TEST 13: Near-Duplicate Collapse")
+    print("=" * 60)
+
+    abstract = (
+        "We evaluated a deep learning model for the detection of diabetic retinopathy "
+        "in fundus photographs from three screening programmes and compared it with "
+        "retinal specialists across a prospective multicentre cohort of patients."
+    )
+    articles = [
+        {"pmid": "1", "title": "Deep learning for diabetic retinopathy screening", "abstract": abstract},
+        {"pmid": "2", "title": "Deep learning for diabetic retinopathy screening.", "abstract": abstract.replace("three", "four")},
+        {"pmid": "3", "title": "Erratum: Deep learning for diabetic retinopathy screening", "abstract": "No abstract available"},
+        {"pmid": "4", "title": "Gut microbiome composition in infants", "abstract": "An unrelated abstract about infant gut bacteria and diet."},
+    ]
+
+    tool = Tools()
+    collapsed, duplicates = tool._collapse_near_duplicates(articles)
+    print(f"Kept: {[a['pmid'] for a in collapsed]}, duplicates: {duplicates}")
+
+    assert [a["pmid"] for a in collapsed] == ["1", "4"]
+    assert sorted(duplicates["1"]) == ["2", "3"]
+    print("\n[PASS] Near-duplicates collapsed")
+    return True
+
+
+def test_rerank():
+    """Verify re-ranking returns only the requested number of results."""
+    print("\n" + "=" * 60)
+    print("TEST 14: Local BM25 Re-ranking")
+    print("=" * 60)
+
+    tool = Tools()
+    result = tool.search_pubmed(
+        query="CAR-T cell therapy lymphoma",
+        max_results=3,
+        rerank=True
+    )
+    print(result[:2000] + "..." if len(result) > 2000 else result)
+
+    assert "PubMed Search Results" in result
+    if "No articles found" not in result:
+        assert "**Re-ranked**" in result
+        assert "### 4." not in result, "Only max_results articles should be returned"
+        print("\n[PASS] Results re-ranked locally")
+    else:
+        print("\n[SKIP] No results to re-rank")
+    return True
+
+
+def test_find_similar_papers():
+    """Verify semantic search over locally indexed records needs no new search."""
+    print("\n" + "=" * 60)
+    print("TEST 15: Semantic Search over Local Index")
+    print("=" * 60)
+
+    tool = Tools()
+    tool.search_pubmed(query="CRISPR base editing", max_results=10)
+    result = tool.find_similar_papers(text="base editors correcting point mutations", max_results=3)
+    print(result[:2000] + "..." if len(result) > 2000 else result)
+
+    assert "Similar Papers" in result
+    if "index is empty" not in result and "NumPy" not in result:
+        assert "**PMID**" in result
+        assert "similarity" in result
+        print("\n[PASS] Similar papers found locally")
+    else:
+        print("\n[SKIP] Local index unavailable")
+    return True
+
+
+def test_columnar_store():
+    """Verify the memory-mapped columnar store round-trips, filters and backs count_pubmed collections."""
+    print("\n" + "=" * 60)
+    print("TEST 16: Columnar Article Store")
+    print("=" * 60)
+
+    tool = Tools()
+    tool._cache_dir = tempfile.mkdtemp()
+    articles = [
+        {
+            "pmid": str(1000 + i),
+            "title": f"Article {i}",
+            "abstract": "Résumé" if i % 2 else "",
+            "authors": ["Smith J", "Doe A"],
+            "journal": "Nature" if i % 3 == 0 else "Cell",
+            "pub_date": f"{2015 + i % 10} Mar",
+            "doi": f"10.1000/{i}",
+        }
+        for i in range(100)
+    ]
+    tool._write_columnar_store("test", articles[:60])
+    tool._write_columnar_store("test", articles[60:])
+    store = tool._open_columnar_store("test")
+
+    rows = store.filter(year_from=2020, journals=["nature"])
+    print(f"Rows: {len(store)}, Nature since 2020: {len(rows)}")
+
+    assert len(store) == 100
+    assert store.record(store.rows_for_pmids(["1001"])[0])["abstract"] == "Résumé"
+    assert len(rows) == sum(1 for a in articles if a["journal"] == "Nature" and int(a["pub_date"][:4]) >= 2020)
+    assert sum(store.year_counts().values()) == 100
+
+    # Tool path: a completed export becomes a collection that count_pubmed reads locally
+    from mock_eutils import MockEUtilsServer, point_tool_at
+
+    server = MockEUtilsServer().start()
+    point_tool_at(tool, server.base_url)
+    exported = tool.export_records(query="gene regulation", max_records=400)
+    job_id = re.search(r"\*\*Job\*\*: (\S+)", exported).group(1)
+    requests_before = dict(server.requests)
+    counts = tool.count_pubmed(query="", collection=job_id, facet="year", date_from="2010", date_to="2014")
+    print(counts)
+    assert "local, 400 articles" in counts, "Export should be stored as a local collection"
+    assert "**Total matching**: 80 articles" in counts, "Year filter should run on the collection"
+    assert server.requests == requests_before, "Counting a collection must not contact PubMed"
+    server.shutdown()
+    print("\n[PASS] Columnar store round-trip and filters work")
+    return True
+
+
+def test_adaptive_batch_sizing():
+    """Verify efetch batch sizes grow additively and shrink multiplicatively (offline)."""
+    print("\n" + "=" * 60)
+    print("TEST 17: Adaptive efetch Batch Sizing")
+    print("=" * 60)
+
+    sizer = _AdaptiveBatchSizer(initial=50, step=10, maximum=200, target_seconds=8.0)
+    sizer.record_success(50, seconds=1.0, nbytes=200_000)
+    assert sizer.size == 60, "Fast responses should grow the batch additively"
+    sizer.record_success(60, seconds=12.0, nbytes=200_000)
+    assert sizer.size == 30, "Slow responses should halve the batch"
+    sizer.record_failure()
+    assert sizer.size == 15, "Failures should halve the batch"
+    for _ in range(100):
+        sizer.record_success(sizer.size, seconds=0.5, nbytes=100_000)
+    assert sizer.size == 200, "Batch size must stay within NCBI's 200-ID limit"
+    assert 15 <= sizer.timeout(200) <= 120
+    print(f"Final size: {sizer.size}, timeout for 200: {sizer.timeout(200):.1f}s")
+    print("\n[PASS] AIMD batch sizing behaves as expected")
+    return True
+
+
+def test_request_scheduler():
+    """Verify interactive requests jump ahead of queued batch work (offline)."""
+    print("\n" + "=" * 60)
+    print("TEST 18: Prioritized Request Scheduler")
+    print("=" * 60)
+
+    scheduler = _RequestScheduler()
+    order = []
+
+    def worker(priority, tenant, count):
+        for _ in range(count):
+            scheduler.acquire(0.02, priority=priority, tenant=tenant)
+            order.append((priority, tenant))
+
+    bulk = threading.Thread(target=worker, args=("batch", "bulk", 15))
+    bulk.start()
+    time.sleep(0.1)
+    users = [threading.Thread(target=worker, args=("interactive", user, 3)) for user in ("alice", "bob")]
+    for thread in users:
+        thread.start()
+    for thread in [bulk] + users:
+        thread.join()
+
+    first_interactive = order.index(next(item for item in order if item[0] == "interactive"))
+    interactive = order[first_interactive:first_interactive + 6]
+    print(f"Grant order: {order}")
+
+    assert all(priority == "interactive" for priority, _ in interactive), "Interactive requests should not wait behind batch"
+    assert [tenant for _, tenant in interactive[:2]] in (["alice", "bob"], ["bob", "alice"]), "Tenants should alternate"
+
+    scheduler.acquire(10, priority="batch")
+    try:
+        scheduler.acquire(10, priority="batch", deadline=time.monotonic() + 0.05)
+        raise AssertionError("Expired deadline should raise TimeoutError")
+    except TimeoutError:
+        pass
+    print("\n[PASS] Scheduler prioritizes, shares fairly and honours deadlines")
+    return True
+
+
+def test_shared_backend():
+    """Verify worker processes share limiter slots, locks and cached values (offline)."""
+    print("\n" + "=" * 60)
+    print("TEST 19: Shared Coordination Backend")
+    print("=" * 60)
+
+    # Two backend objects on one file behave like two worker processes
+    path = os.path.join(tempfile.mkdtemp(), "coordination.sqlite3")
+    workers = [_SQLiteBackend(path), _SQLiteBackend(path)]
+    slots = []
+
+    def reserve(backend):
+        for _ in range(5):
+            backend.reserve_slot("eutils", 0.05)
+            slots.append(time.time())
+
+    threads = [threading.Thread(target=reserve, args=(backend,)) for backend in workers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    slots.sort()
+    # Late thread wake-ups can shrink single gaps, but never the span of all ten slots
+    print(f"Span of 10 slots: {(slots[-1] - slots[0]) * 1000:.1f} ms")
+    assert slots[-1] - slots[0] >= 9 * 0.05 * 0.9, "Slots from different workers should be spaced by the interval"
+
+    token = workers[0].acquire_lock("flight:key", 5)
+    assert token and workers[1].acquire_lock("flight:key", 5) is None, "Lock should be exclusive"
+    workers[0].release_lock("flight:key", token)
+    assert workers[1].acquire_lock("flight:key", 5), "Released lock should be available"
+
+    workers[0].set("record:1", b"payload", 60)
+    assert workers[1].get("record:1") == b"payload", "Values should be visible to other workers"
+    print("\n[PASS] Limiter slots, locks and values are shared across workers")
+    return True
+
+
+def test_saved_search_delta():
+    """Verify saved searches fetch only new and modified records (mock server)."""
+    print("\n" + "=" * 60)
+    print("TEST 20: Saved Search Delta Fetching")
+    print("=" * 60)
+
+    from mock_eutils import MockEUtilsServer, point_tool_at, NEW_HITS, MODIFIED_HITS, TOTAL_HITS
+
+    server = MockEUtilsServer().start()
+    tool = point_tool_at(Tools(), server.base_url)
+    tool._cache_dir = tempfile.mkdtemp()
+    user = {"id": "watcher"}
+
+    baseline = tool.watch_topic("gene-reg", query="gene regulation", max_results=3, detail_level="metadata", __user__=user)
+    print(baseline[-200:])
+    assert f"**Tracking**: {TOTAL_HITS} articles" in baseline, "Baseline should track every matching PMID"
+    assert server.requests["efetch.fcgi"] == 1, "Baseline should fetch only the listed records"
+
+    delta = tool.watch_topic("gene-reg", max_results=10, detail_level="metadata", __user__=user)
+    print(delta[-200:])
+    assert f"**New**: {NEW_HITS}, **updated**: {MODIFIED_HITS}" in delta, "Delta counts are wrong"
+    assert delta.count("### ") == NEW_HITS, "Only new articles should be listed"
+
+    # Only the listed slice is fetched interactively; the rest follows in the background
+    fresh = point_tool_at(Tools(), server.base_url)
+    fresh._cache_dir = tempfile.mkdtemp()
+    fresh.watch_topic("gene-reg", query="gene regulation", max_results=3, detail_level="metadata", __user__=user)
+    path = fresh._saved_search_path("gene-reg", user)
+    saved = fresh._load_saved_search(path)
+    saved["last_run"] = "2000/01/01"
+    fresh._store_saved_search(path, saved)
+    release = threading.Event()
+    fresh._prefetcher.submit("blocker", lambda cancel: release.wait(10))  # Holds the single prefetch worker
+    fetches = server.requests["efetch.fcgi"]
+    delta = fresh.watch_topic("gene-reg", max_results=1, __user__=user)
+    assert delta.count("### ") == 1 and server.requests["efetch.fcgi"] == fetches + 1, "Only the listed record should be fetched interactively"
+    release.set()
+    fresh._prefetcher.drain()
+    assert server.requests["efetch.fcgi"] > fetches + 1, "The unlisted delta should be fetched in the background"
+    background = [str(30000000 + i) for i in range(MODIFIED_HITS)] + [str(30000000 + TOTAL_HITS + i) for i in range(1, NEW_HITS)]
+    assert all(pmid in fresh._record_cache for pmid in background), "Updated and unlisted records should be fetched in the background"
+
+    other_user = tool.watch_topic("gene-reg", __user__={"id": "someone-else"})
+    assert "No saved search" in other_user, "Saved searches should be per user"
+    server.shutdown()
+    print("\n[PASS] Saved search refresh fetched only the delta")
+    return True
+
+
+def test_lazy_record_fields():
+    """Verify extended record fields are extracted lazily from the retained XML (offline)."""
+    print("\n" + "=" * 60)
+    print("TEST 21: Lazy Extended Record Fields")
+    print("=" * 60)
+
+    from mock_eutils import _article_xml
+
+    xml = "<PubmedArticleSet>" + "".join(_article_xml(30000000 + i) for i in range(3)) + "</PubmedArticleSet>"
+    articles = Tools()._parse_pubmed_xml(xml.encode("utf-8"))
+    record = articles[0]
+
+    assert "mesh_terms" not in record, "Extended fields should not be parsed eagerly"
+    assert record["authors"][-1] == "et al.", "Display author list should stay truncated"
+    print(f"MeSH: {record['mesh_terms']}")
+    print(f"Keywords: {record.get('keywords')}")
+
+    assert record["mesh_terms"][0]["descriptor"] == "Gene Expression Regulation", "MeSH heading missing"
+    assert record["keywords"] == ["gene regulation"], "Keywords missing"
+    assert record["publication_types"] == ["Journal Article"], "Publication types missing"
+    assert len(record["all_authors"]) == 6, "Full author list should not be truncated"
+    assert record["affiliations"][0] == "Institute 0", "Affiliations missing"
+
+    restored = type(record).from_json(json.loads(json.dumps(articles[1].to_json())))
+    assert restored["keywords"] == ["gene regulation"], "Lazy fields should survive serialization"
+    print("\n[PASS] Extended fields extracted on first access")
+    return True
+
+
+def test_facet_counts():
+    """Verify facet counts use only esearch count requests (mock server)."""
+    print("\n" + "=" * 60)
+    print("TEST 22: Facet Counts without efetch")
+    print("=" * 60)
+
+    from mock_eutils import MockEUtilsServer, point_tool_at
+
+    server = MockEUtilsServer().start()
+    tool = point_tool_at(Tools(), server.base_url)
+    tool._cache_dir = tempfile.mkdtemp()
+
+    result = tool.count_pubmed(
+        query="semaglutide",
+        facet="year",
+        date_from="2015",
+        date_to="2020",
+        publication_type="Randomized Controlled Trial"
+    )
+    print(result)
+    rows = [line for line in result.splitlines() if re.match(r"\| \d{4} \|", line)]
+    assert len(rows) == 6, "Expected one row per year"
+    assert "**Total matching**" in result, "Missing total"
+    assert server.requests.get("esearch.fcgi") == 7, "Expected one count request per bucket plus the total"
+    assert "efetch.fcgi" not in server.requests, "Counting must not fetch records"
+    server.shutdown()
+    print("\n[PASS] Facet counts returned without fetching records")
+    return True
+
+
+def test_resumable_export():
+    """Verify an interrupted export resumes without re-fetching finished chunks (mock server)."""
+    print("\n" + "=" * 60)
+    print("TEST 23: Resumable Export Job")
+    print("=" * 60)
+
+    from mock_eutils import MockEUtilsServer, point_tool_at
+
+    server = MockEUtilsServer(latency=0.05).start()
+    cache_dir = tempfile.mkdtemp()
+    tool = point_tool_at(Tools(), server.base_url)
+    tool._cache_dir = cache_dir
+    tool._export_time_budget = 0.2  # Stop early to leave the job unfinished
+
+    first = tool.export_records(query="gene regulation", max_records=2000)
+    print(first)
+    assert "in progress" in first, "Expected a partial export"
+    job_id = re.search(r"\*\*Job\*\*: (\S+)", first).group(1)
+    output_path = re.search(r"\*\*Output\*\*: (.+)", first).group(1).strip()
+    fetched_first = server.requests["efetch.fcgi"]
+    with open(output_path, "ab") as handle:
+        handle.write(b'{"pmid": "half-written')  # Simulate a crash in the middle of a chunk
+
+    # A fresh instance (e.g., after a restart) continues the same job
+    resumed = point_tool_at(Tools(), server.base_url)
+    resumed._cache_dir = cache_dir
+    second = resumed.export_records(job_id=job_id)
+    print(second)
+    assert "complete" in second, "Export should complete when resumed"
+    assert server.requests["efetch.fcgi"] == 10, "Finished chunks must not be fetched again"
+    assert fetched_first < 10, "First call should have stopped early"
+
+    with open(output_path, "r", encoding="utf-8") as handle:
+        pmids = [json.loads(line)["pmid"] for line in handle]
+    assert len(pmids) == 2000 and len(set(pmids)) == 2000, "Each record should be exported exactly once"
+
+    # A new job can be started under a caller-chosen id and continued by it
+    named = resumed.export_records(query="gene regulation", max_records=300, job_id="my review")
+    print(named)
+    assert "**Job**: my_review" in named and "**Records**: 300" in named, "Named job should be created from the query"
+    assert "**Records**: 300" in resumed.export_records(job_id="my review"), "Named job should be found again"
+    server.shutdown()
+
+    # esearch stops at 10,000 PMIDs; larger exports are collected over date windows
+    server = MockEUtilsServer(total_hits=25000).start()
+    large = point_tool_at(Tools(), server.base_url)
+    large._cache_dir = cache_dir
+    large._export_time_budget = 0.2
+    started = large.export_records(query="gene regulation", max_records=25000)
+    assert "**Records**: 25,000" in started, started
+    directory = os.path.dirname(re.search(r"\*\*Output\*\*: (.+)", started).group(1).strip())
+    with open(os.path.join(directory, "ids.txt"), encoding="utf-8") as handle:
+        ids = handle.read().split()
+    assert ids == [str(30000000 + i) for i in range(25000)], "PMIDs should be complete, unique and newest first"
+    dated = large.export_records(query="gene regulation", date_from="2024", max_records=25000)
+    assert "**Date range**: 2024 to 3000" in dated and "**Records**: 3,660" in dated, dated
+
+    # A single day with more than 10,000 records cannot be split further
+    server.hits_per_day = 20000
+    crowded = point_tool_at(Tools(), server.base_url)
+    crowded._cache_dir = tempfile.mkdtemp()
+    failed = crowded.export_records(query="gene regulation", max_records=15000)
+    assert "Export Error" in failed and "More than 10,000 records" in failed, failed
+    assert not os.path.exists(os.path.join(crowded._cache_dir, "exports")), "No job should be saved with a short PMID list"
+    server.shutdown()
+    print("\n[PASS] Export resumed from its checkpoint")
+    return True
+
+
+def test_fragment_cache():
+    """Verify rendered fragments are reused and invalidated by record refreshes (offline)."""
+    print("\n" + "=" * 60)
+    print("TEST 24: Markdown Fragment Cache")
+    print("=" * 60)
+
+    from mock_eutils import _article_xml
+
+    tool = Tools()
+    tool._cache_dir = tempfile.mkdtemp()
+    xml = ("<PubmedArticleSet>" + _article_xml(30000000) + "</PubmedArticleSet>").encode("utf-8")
+    articles = tool._parse_pubmed_xml(xml)
+    tool._cache_records(articles, share=False)
+
+    first = tool._format_results(articles, "test")
+    assert ("30000000", "full") in tool._fragment_cache, "Fragment should be cached"
+    second = tool._format_results(articles, "test", start_index=7)
+    assert "### 7. Synthetic study 30000000" in second, "Cached fragment should be renumbered"
+    assert first.split("---", 1)[1].replace("### 1.", "### 7.") == second.split("---", 1)[1], "Cached output differs"
+
+    refreshed = tool._parse_pubmed_xml(xml.replace(b"Synthetic study", b"Corrected study"))
+    tool._cache_records(refreshed, share=False)
+    third = tool._format_results(refreshed, "test")
+    print(third[:300])
+    assert "Corrected study 30000000" in third, "Refreshed record should be re-rendered"
+    print("\n[PASS] Fragments reused and invalidated correctly")
+    return True
+
+
+def test_speculative_prefetch():
+    """Verify prefetched follow-ups are served from cache and counted as hits (mock server)."""
+    print("\n" + "=" * 60)
+    print("TEST 25: Speculative Prefetch")
+    print("=" * 60)
+
+    from mock_eutils import MockEUtilsServer, point_tool_at
+
+    server = MockEUtilsServer().start()
+    tool = point_tool_at(Tools(), server.base_url)
+    tool._cache_dir = tempfile.mkdtemp()
+    tool._prefetch = True
+
+    result = tool.search_pubmed(query="gene regulation", max_results=5, detail_level="metadata")
+    tool._prefetcher.drain()
+    requests_after_prefetch = dict(server.requests)
+    print(f"Requests after prefetch: {requests_after_prefetch}")
+
+    pmids = re.findall(r"\*\*PMID\*\*: \[(\d+)\]", result)
+    cursor = re.search(r'cursor="([^"]+)"', result).group(1)
+    tool.get_abstracts(pmids[:3])
+    tool.search_pubmed(query="", cursor=cursor)
+    stats = tool._prefetcher.stats()
+    print(f"Prefetch stats: {stats}")
+
+    assert stats["requests"] <= tool._prefetch_budget, "Prefetch exceeded its budget"
+    assert server.requests == requests_after_prefetch, "Follow-ups should be served from prefetched caches"
+    assert stats["hits"] > 0 and stats["hit_rate"] > 0, "Hits should be counted"
+    server.shutdown()
+    print("\n[PASS] Follow-ups answered from prefetched caches")
+    return True
+
+
+def test_streaming_parse():
+    """Verify efetch XML parses identically whatever the chunk boundaries (offline)."""
+    print("\n" + "=" * 60)
+    print("TEST 26: Streaming efetch Parser")
+    print("=" * 60)
+
+    from mock_eutils import _article_xml
+
+    tool = Tools()
+    articles = "".join(_article_xml(30000000 + i) for i in range(5))
+    # One article with attributes on its tag, which the byte slicer cannot match
+    odd = _article_xml(30000005).replace("<PubmedArticle>", "<PubmedArticle Status=\"x\">", 1)
+    xml = f"<?xml version=\"1.0\"?>\n<PubmedArticleSet>\n{articles}\n{odd}\n</PubmedArticleSet>".encode("utf-8")
+    expected = [(a["pmid"], a["title"], a["abstract"], a["keywords"]) for a in tool._parse_pubmed_xml(xml)]
+    print(f"Parsed {len(expected)} records")
+    assert [pmid for pmid, *_ in expected] == [str(30000000 + i) for i in range(6)], "Records missing or out of order"
+
+    for chunk_size in (1, 7, 100, 4096):
+        parser = _PubMedStreamParser(tool._parse_article_element)
+        for offset in range(0, len(xml), chunk_size):
+            parser.feed(xml[offset:offset + chunk_size])
+        records = parser.close()
+        assert [(a["pmid"], a["title"], a["abstract"], a["keywords"]) for a in records] == expected, \
+            f"Chunk size {chunk_size} changed the result"
+        assert records[0].source.startswith(b"<PubmedArticle>") and records[0].source.endswith(b"</PubmedArticle>"), \
+            "Record should keep its own XML slice"
+
+    try:
+        tool._parse_pubmed_xml(xml[:-30])
+        assert False, "Truncated XML should be rejected"
+    except Exception as e:
+        print(f"Truncated body: {e}")
+        assert "Failed to parse PubMed XML" in str(e)
+    print("\n[PASS] Chunked parsing matches whole-document parsing")
+    return True
+
+
+def test_multi_database():
+    """Verify PMC full text and MeSH lookups share the E-utilities client (mock server)."""
+    print("\n" + "=" * 60)
+    print("TEST 27: PMC Full Text and MeSH Lookup")
+    print("=" * 60)
+
+    from mock_eutils import MockEUtilsServer, point_tool_at
+
+    server = MockEUtilsServer().start()
+    tool = point_tool_at(Tools(), server.base_url)
+    tool._cache_dir = tempfile.mkdtemp()
+
+    result = tool.get_full_text(["30000000", "30000002", "PMC7000001"], max_chars=5000)
+    print(result[:600])
+    assert "PMC7000000" in result and "PMC7000001" in result, "Full text missing"
+    assert "#### Section 1" in result and "##### Subsection 1.1" in result, "Section headings missing"
+    assert "Figure legend" not in result and "cell 1" not in result, "Figures and tables should be skipped"
+    assert "Text truncated" in result, "Body should be cut at max_chars"
+    assert "**No PMC record**: 30000002" in result, "PMID without PMC record should be reported"
+    assert server.requests["efetch.fcgi"] == 1, "Articles should be fetched in one efetch"
+
+    assert tool.get_full_text("30000000, 30000002, PMC7000001", max_chars=5000) == result
+    assert server.requests["efetch.fcgi"] == 1, "Repeated full text should come from the response cache"
+
+    mesh = tool.lookup_mesh("heart attack", max_results=2)
+    print(mesh)
+    assert "**MeSH UI**: D" in mesh and "[MeSH Terms]" in mesh, "MeSH descriptor missing"
+    assert "Synonym" in mesh, "Entry terms missing"
+    assert tool._scheduler.granted["interactive"] >= 5, "All databases should share one rate limiter"
+    server.shutdown()
+    print("\n[PASS] PMC and MeSH requests go through the shared client")
+    return True
+
+
+def test_mesh_expansion():
+    """Verify free-text terms are expanded through a local MeSH index."""
+    print("\n" + "=" * 60)
+    print("TEST 28: MeSH Query Expansion")
+    print("=" * 60)
+
+    descriptors = [
+        ("D009203", "Myocardial Infarction", ["Heart Attack", "Infarction, Myocardial"]),
+        ("D003924", "Diabetes Mellitus, Type 2", ["Type 2 Diabetes", "NIDDM"]),
+        ("D006321", "Heart", []),
+        ("D001241", "Aspirin", ["Acetylsalicylic Acid"]),
+    ]
+    records = "".join(
+        f"<DescriptorRecord><DescriptorUI>{ui}</DescriptorUI><DescriptorName><String>{name}</String></DescriptorName>"
+        "<ConceptList><Concept><TermList>"
+        + "".join(f"<Term><String>{term}</String></Term>" for term in [name] + terms)
+        + "</TermList></Concept></ConceptList></DescriptorRecord>"
+        for ui, name, terms in descriptors
+    )
+    directory = tempfile.mkdtemp()
+    source = os.path.join(directory, "desc.xml.gz")
+    with gzip.open(source, "wt", encoding="utf-8") as handle:
+        handle.write(f"<DescriptorRecordSet>{records}</DescriptorRecordSet>")
+
+    tool = Tools()
+    tool._cache_dir = directory
+    tool._mesh_expansion = True
+    tool._mesh_source = source
+    index = tool._get_mesh_index()
+    assert index is not None and index.count == 9, "Index should hold every name and entry term"
+
+    segments = index.segment("aspirin after a heart attack")
+    print(segments)
+    assert segments[-1] == ("heart attack", ["D009203", "Myocardial Infarction"]), "Longest entry term should win over Heart"
+    assert segments[1] == ("after a", None), "Unmatched words should stay together"
+
+    term = tool._build_search_query("Heart Attack", author="Smith J")
+    print(f"Expanded: {term}")
+    assert '"myocardial infarction"[mh]' in term and '"heart attack"[tiab]' in term, f"Unexpected expansion: {term}"
+    assert tool._build_search_query('"heart attack"') == '"heart attack"', "Quoted phrases should not be expanded"
+    assert tool._build_search_query("heart attack[ti]") == "heart attack[ti]", "Tagged terms should not be expanded"
+    assert "NOT aspirin" in tool._build_search_query("heart NOT aspirin"), "Excluded terms should not be broadened"
+    assert tool._build_search_query("type 2 diabetes").count("[tiab]") == 1, "Inverted headings should not be searched as text"
+
+    start = time.perf_counter()
+    for _ in range(1000):
+        index.segment("aspirin after a heart attack in type 2 diabetes")
+    print(f"Segmentation: {(time.perf_counter() - start) * 1000:.1f} us per query")
+
+    reopened = Tools()
+    reopened._cache_dir = directory
+    reopened._mesh_expansion = True
+    reopened._mesh_source = source
+    assert reopened._build_search_query("Heart Attack", author="Smith J") == term, "Built index should be reused"
+    print("\n[PASS] Free-text terms are expanded with MeSH descriptors")
+    return True
+
+
+def test_cache_valves_and_admin():
+    """Verify cache valves are applied and the admin cache tool reports and maintains caches (mock server)."""
+    print("\n" + "=" * 60)
+    print("TEST 29: Cache Valves and Admin Cache Tool")
+    print("=" * 60)
+
+    from mock_eutils import MockEUtilsServer, point_tool_at
+
+    server = MockEUtilsServer().start()
+    tool = point_tool_at(Tools(), server.base_url)
+    tool._min_request_interval = 0
+    cache_dir = tempfile.mkdtemp()
+    tool.valves = Tools.Valves(
+        CACHE_DIR=cache_dir,
+        RESPONSE_CACHE_MB=1,
+        STREAM_CHUNK_KB=8,
+        PARSER_BACKEND="buffered",
+        MAX_WORKERS=5
+    )
+
+    denied = tool.manage_cache("stats", __user__={"id": "u1", "role": "user"})
+    assert "only available to administrators" in denied, "Non-admins must be refused"
+
+    result = tool.search_pubmed(query="gene regulation", max_results=5)
+    assert "PubMed Search Results" in result, result
+    assert tool._cache_dir == cache_dir and tool._response_cache.max_bytes == 1024 * 1024, "Cache valves not applied"
+    assert tool._stream_chunk_size == 8192 and tool._parser_backend == "buffered" and tool._max_workers == 5
+    assert tool._min_request_interval == 0, "Unchanged valves must not override direct settings"
+    pmids = [str(30000000 + i) for i in range(20)]
+    buffered = tool._fetch_article_details(pmids)
+    tool._parser_backend = "streaming"
+    assert tool._fetch_article_details(pmids) == buffered, "Both parser backends should give the same records"
+
+    admin = {"id": "a1", "role": "admin"}
+    stats = tool.manage_cache("stats", __user__=admin)
+    print(stats)
+    assert re.search(r"\*\*Entries\*\*: [1-9]", stats) and "**Hit ratio**" in stats and "**Oldest entry**" in stats, "Response cache stats missing"
+    assert "**record**" in stats and "**response**" in stats, "Shared cache stats missing"
+    assert "**coordination**" in stats, "Disk usage missing"
+
+    assert "**Compacted**" in tool.manage_cache("compact", __user__=admin)
+    purged = tool.manage_cache("purge", __user__=admin)
+    assert re.search(r"\*\*Purged\*\*: [1-9]\d* responses, [1-9]\d* records", purged) and "**Entries**: 0" in purged, purged
+    warmed = tool.manage_cache("warm", __user__=admin)
+    assert "**Warmed**" in warmed and "rate_limiter" in warmed and server.requests.get("HEAD") == 1, "Warm-up should prime the limiter and open a connection"
+    assert "Unknown action" in tool.manage_cache("resize", __user__=admin)
+
+    requests_before = server.requests["esearch.fcgi"]
+    tool.search_pubmed(query="gene regulation", max_results=5)
+    assert server.requests["esearch.fcgi"] == requests_before + 1, "Purged responses should be fetched again"
+
+    # Without a record cache, fetched records must still be returned
+    tool.valves = Tools.Valves(**dict(tool.valves.model_dump(), RECORD_CACHE_SIZE=0))
+    abstracts = tool.get_abstracts(["30000001", "30000002"])
+    assert "Not found" not in abstracts and "30000002" in abstracts, abstracts
+    assert len(tool._record_cache) == 0
+
+    # Every tool method applies changed valves first; unrelated direct settings stay
+    tool._mesh_expansion = True
+    other_dir = tempfile.mkdtemp()
+    tool.valves = Tools.Valves(**dict(tool.valves.model_dump(), CACHE_DIR=other_dir))
+    similar = tool.find_similar_papers(text="gene regulation")
+    assert tool._cache_dir == other_dir and "index is empty" in similar, "find_similar_papers should use the new CACHE_DIR"
+    assert tool._mesh_expansion, "Changing CACHE_DIR must not reset MeSH expansion"
+    server.shutdown()
+
+    # warm_start=True runs the warm-up in the background on construction
+    assert not Tools()._warm_up_timings, "Warm-up must not run by default"
+    warmed = Tools(warm_start=True)
+    deadline = time.time() + 10
+    while "session" not in warmed._warm_up_timings and time.time() < deadline:
+        time.sleep(0.05)
+    assert "session" in warmed._warm_up_timings, "warm_start=True should start the background warm-up"
+    print("\n[PASS] Valves applied and caches managed by the admin tool")
+    return True
+
+
+def test_shared_vector_index():
+    """Verify semantic index appends from several workers keep PMIDs and vectors aligned (offline)."""
+    print("\n" + "=" * 60)
+    print("TEST 30: Semantic Index Shared by Workers")
+    print("=" * 60)
+
+    if np is None:
+        print("\n[SKIP] NumPy unavailable")
+        return True
+
+    directory = tempfile.mkdtemp()
+    vectors = np.eye(8, dtype=np.float32)
+    worker_a = _VectorIndex(directory, 8)
+    worker_b = _VectorIndex(directory, 8)  # Opened before A writes, like a second OpenWebUI worker
+    worker_a.add(["1"], vectors[[1]], [{"pmid": "1"}])
+    worker_b.add(["2", "1"], vectors[[2, 1]], [{"pmid": "2"}, {"pmid": "1"}])
+    worker_a.add(["3"], vectors[[3]], [{"pmid": "3"}])
+
+    for index in (worker_a, worker_b, _VectorIndex(directory, 8)):
+        for pmid in ("1", "2"):
+            assert index.vector(pmid) is not None and float(index.vector(pmid) @ vectors[int(pmid)]) == 1.0, f"PMID {pmid} points at another vector"
+    reopened = _VectorIndex(directory, 8)
+    print(f"Rows after reopening: {reopened._rows}")
+    assert reopened._rows == {"1": 0, "2": 1, "3": 2}, "Each PMID should be stored once, in append order"
+    assert reopened.search(vectors[3], 1) == [("3", 1.0)]
+    print("\n[PASS] Appends from several workers stay aligned")
+    return True
+
+
+def test_rerank_pagination():
+    """Verify paging through re-ranked results neither skips nor repeats candidates (mock server)."""
+    print("\n" + "=" * 60)
+    print("TEST 31: Re-ranked Pagination")
+    print("=" * 60)
+
+    from mock_eutils import MockEUtilsServer, point_tool_at
+
+    server = MockEUtilsServer().start()
+    tool = point_tool_at(Tools(), server.base_url)
+    tool._cache_dir = tempfile.mkdtemp()
+    tool._collapse_duplicates = False
+
+    result = tool.search_pubmed(query="gene regulation", max_results=3, rerank=True)
+    shown = []
+    for page in range(4):
+        pmids = re.findall(r"\*\*PMID\*\*: \[(\d+)\]", result)
+        showing = re.search(r"\*\*Showing\*\*: (\d+)-(\d+)", result)
+        print(f"Page {page + 1}: {pmids} ({showing.group(0)})")
+        assert len(pmids) == 3, "Each page should show max_results articles"
+        assert (int(showing.group(1)), int(showing.group(2))) == (3 * page + 1, 3 * page + 3), "Showing range should count displayed results"
+        assert f"### {3 * page + 1}." in result, "Numbering should continue across pages"
+        shown.extend(pmids)
+        cursor = re.search(r'cursor="([^"]+)"', result).group(1)
+        result = tool.search_pubmed(query="", cursor=cursor)
+
+    assert len(set(shown)) == len(shown), "No article should be shown twice"
+    # The first page over-fetched 15 candidates; the 12 shown so far all come from them
+    assert shown == [str(30000000 + i) for i in range(12)], "Candidates fetched but not shown must not be skipped"
+
+    # Cursors live in the shared backend, so another worker can serve the next page
+    cursor = re.search(r'cursor="([^"]+)"', result).group(1)
+    other = point_tool_at(Tools(), server.base_url)
+    other._cache_dir = tool._cache_dir
+    other._collapse_duplicates = False
+    assert "**Showing**: 16-18" in other.search_pubmed(query="", cursor=cursor), "Cursor should work on another worker"
+
+    # Without coordination they stay in the issuing process
+    local = point_tool_at(Tools(), server.base_url)
+    local.valves = Tools.Valves(CACHE_DIR=tool._cache_dir, COORDINATION="none")
+    local._collapse_duplicates = False
+    assert "unknown or has expired" in local.search_pubmed(query="", cursor=cursor)
+    result = local.search_pubmed(query="gene regulation", max_results=3, rerank=True)
+    cursor = re.search(r'cursor="([^"]+)"', result).group(1)
+    assert len(local._cursor_cache) == 1 and "**Showing**: 4-6" in local.search_pubmed(query="", cursor=cursor)
+    server.shutdown()
+    print("\n[PASS] Re-ranked pages continue with the unshown candidates")
+    return True
+
+
+def test_response_cache():
+    """Verify response cache hits, conditional revalidation, TTL expiry and byte-cap eviction (mock server)."""
+    print("\n" + "=" * 60)
+    print("TEST 32: Response Cache Revalidation and Eviction")
+    print("=" * 60)
+
+    from mock_eutils import MockEUtilsServer, point_tool_at
+
+    server = MockEUtilsServer(validators=True).start()
+    tool = point_tool_at(Tools(), server.base_url)
+    tool._cache_dir = tempfile.mkdtemp()
+    tool.valves = Tools.Valves(COORDINATION="none", RESPONSE_CACHE_MB=1)  # Local cache only
+    cache = tool._response_cache
+
+    first = tool.search_pubmed(query="gene regulation", max_results=5, detail_level="metadata")
+    assert server.requests["esearch.fcgi"] == 1 and server.requests["esummary.fcgi"] == 1
+    assert cache.misses == 2 and all(entry["etag"] and entry["last_modified"] for entry in cache._entries.values())
+
+    # Fresh entries are served without a request
+    tool.search_pubmed(query="gene regulation", max_results=5, detail_level="metadata")
+    assert server.requests["esearch.fcgi"] == 1 and cache.hits == 2, "Fresh responses should come from the cache"
+
+    # Stale entries with validators are revalidated: 304 reuses the cached body
+    tool.valves = Tools.Valves(**dict(tool.valves.model_dump(), RESPONSE_CACHE_TTL=0))
+    revalidated = tool.search_pubmed(query="gene regulation", max_results=5, detail_level="metadata")
+    assert server.requests["esearch.fcgi"] == 2 and server.requests.get("not_modified") == 2, "Stale entries should be revalidated"
+    assert cache.revalidations == 2 and cache.misses == 2, "A 304 must not count as a download"
+    assert re.findall(r"\*\*PMID\*\*: \[(\d+)\]", revalidated) == re.findall(r"\*\*PMID\*\*: \[(\d+)\]", first)
+
+    # Without validators an expired entry is downloaded again in full
+    server.validators = False
+    tool.search_pubmed(query="gene expression", max_results=5, detail_level="metadata")
+    tool.search_pubmed(query="gene expression", max_results=5, detail_level="metadata")
+    assert cache.misses == 6 and server.requests["not_modified"] == 2, "Expired entries without validators should be refetched"
+    assert tool.manage_cache("compact", __user__={"role": "admin"}).count("**Compacted**: 2 stale responses") == 1
+
+    # The byte cap from RESPONSE_CACHE_MB evicts least recently used entries
+    blob = os.urandom(300 * 1024)  # Incompressible, so each entry takes its full size
+    for key in ("a", "b", "c"):
+        cache.put_entry(key, cache.make_entry("gzip", blob, {}))
+    cache.get("a")  # Refresh "a"; "b" is now the least recently used
+    cache.put_entry("d", cache.make_entry("gzip", blob, {}))
+    stats = cache.stats()
+    print(f"Cache stats: {stats}")
+    assert cache.get("b") is None and cache.get("a") is not None and cache.get("d") is not None, "LRU entry should be evicted"
+    assert stats["bytes"] <= stats["max_bytes"] == 1024 * 1024 and stats["evictions"] >= 1
+
+    # Shared copies skip large bodies and are trimmed to the same byte budget
+    shared = point_tool_at(Tools(), server.base_url)
+    shared._cache_dir = tempfile.mkdtemp()
+    shared._shared_response_max_bytes = 4096
+    shared._response_cache.resize(3000)
+    backend = shared._get_shared_backend()
+    shared._fetch_article_details([str(30000000 + i) for i in range(200)])
+    assert "response" not in backend.stats(), "Responses above the per-entry limit should not be shared"
+    for i in range(20):
+        shared.search_pubmed(query=f"topic {i}", max_results=5, detail_level="metadata")
+    bucket = backend.stats()["response"]
+    print(f"Shared responses: {bucket}")
+    assert bucket["entries"] < 40 and bucket["bytes"] <= 3000 + 3000 // 16 + 4096, "Shared responses should be trimmed to the budget"
+    searches = server.requests["esearch.fcgi"]
+    other = point_tool_at(Tools(), server.base_url)
+    other._cache_dir = shared._cache_dir
+    other.search_pubmed(query="topic 19", max_results=5, detail_level="metadata")
+    assert server.requests["esearch.fcgi"] == searches, "The newest shared responses should be kept"
+    server.shutdown()
+    print("\n[PASS] Responses cached, revalidated, expired and evicted as configured")
+    return True
+
+
 def main():
     """Run all tests."""
     print("=" * 60)
@@ -166,6 +1110,31 @@ def main():
         test_publication_type_filter,
         test_combined_filters,
         test_abstract_retrieval,
+        test_metadata_only_search,
+        test_get_abstracts,
+        test_cursor_pagination,
+        test_citation_expansion,
+        test_query_canonicalization,
+        test_near_duplicate_collapse,
+        test_rerank,
+        test_find_similar_papers,
+        test_columnar_store,
+        test_adaptive_batch_sizing,
+        test_request_scheduler,
+        test_shared_backend,
+        test_saved_search_delta,
+        test_lazy_record_fields,
+        test_facet_counts,
+        test_resumable_export,
+        test_fragment_cache,
+        test_speculative_prefetch,
+        test_streaming_parse,
+        test_multi_database,
+        test_mesh_expansion,
+        test_cache_valves_and_admin,
+        test_shared_vector_index,
+        test_rerank_pagination,
+        test_response_cache,
     ]
 
     passed = 0